@@ -0,0 +1,297 @@
+# backend/admission.py
+
+import math
+import time
+import heapq
+import itertools
+import threading
+from contextlib import contextmanager
+
+from backend import metrics
+from backend.cancellation import GenerationCancelled
+from backend.generation_params import DRAFT_MODEL, resolve_request
+
+LANES = ("interactive", "batch")
+
+# Weight of a lane's estimated cost in the queue order
+DEFAULT_LANE_WEIGHTS = {"interactive": 1.0, "batch": 4.0}
+
+# How often a waiting thread re-checks its tokens
+POLL_SEC = 0.25
+
+
+class QueueFull(Exception):
+    """
+    Raised when admitting a request would exceed the queue bounds.
+    `retry_after` is the estimated number of seconds until there is room.
+    """
+
+    def __init__(self, retry_after):
+        super().__init__(f"Generation queue is full; retry in {retry_after}s")
+        self.retry_after = retry_after
+
+
+def estimate_cost(request, config):
+    """
+    Estimated decoding work of a generate_batch request, in seconds of
+    audio from the smallest model without guidance: the duration times
+    the model's relative_cost (config "models"), doubled with
+    classifier-free guidance, which decodes an unconditional row as well.
+    """
+    job = resolve_request(request, config)
+    if job["model"] == DRAFT_MODEL:
+        return 0.0
+
+    relative_cost = 1.0
+    for entry in config.get("models", {}).get("available", {}).values():
+        if entry.get("checkpoint") == job["model"]:
+            relative_cost = entry.get("relative_cost", 1.0)
+    guidance = 2 if job["cfg_coef"] > 1 else 1
+    return job["duration"] * relative_cost * guidance
+
+
+class Entry:
+    """
+    One queued request. It is abandoned once all of its `tokens` have
+    fired; `watch` are tokens whose deadlines should be checked while it
+    waits (reading `cancelled` is what fires a deadline).
+    """
+
+    def __init__(self, item, cost, lane, tokens, watch):
+        self.item = item
+        self.cost = cost
+        self.lane = lane
+        self.tokens = tuple(token for token in tokens if token is not None)
+        self.watch = tuple(token for token in watch if token is not None)
+        self.enqueued_at = time.monotonic()
+        self.removed = False
+
+    def expired(self):
+        for token in self.watch:
+            token.cancelled
+        return bool(self.tokens) and all(token.cancelled for token in self.tokens)
+
+    @property
+    def reason(self):
+        return self.tokens[0].reason if self.tokens else "cancelled"
+
+
+class AdmissionQueue:
+    """
+    Bounded queue of generation requests, served by estimated cost.
+
+    Shortest job first with aging: an entry's priority is
+    lane_weight * cost - aging_rate * seconds waited, so cheap requests
+    go first, "batch" lane requests count for lane_weight times their
+    cost, and a long request is never starved. All entries age at the
+    same rate, so the order only changes on insertion and the queue is a
+    heap on lane_weight * cost + aging_rate * enqueue time.
+
+    At most `max_queued` entries and `max_queued_cost` units of work are
+    held (an empty queue admits anything); push() raises QueueFull past
+    that, after first dropping entries whose tokens have fired. Not
+    thread-safe: callers serialize access (event loop or lock).
+    """
+
+    def __init__(self, max_queued=32, max_queued_cost=None, aging_rate=1.0,
+                 lane_weights=None, retry_after_max_sec=300):
+        self.max_queued = max_queued
+        self.max_queued_cost = max_queued_cost
+        self.aging_rate = aging_rate
+        self.lane_weights = dict(DEFAULT_LANE_WEIGHTS, **(lane_weights or {}))
+        self.retry_after_max_sec = retry_after_max_sec
+
+        self._heap = []
+        self._seq = itertools.count()
+        self._size = 0
+        self.queued_cost = 0.0
+
+        # Moving average of wall-clock seconds per unit of cost
+        self.sec_per_cost = None
+        self.rejected = 0
+        self.dropped = 0
+
+    def __len__(self):
+        return self._size
+
+    def check(self, cost, lane="interactive"):
+        """
+        Raise QueueFull (or ValueError for an unknown lane) unless a
+        request of `cost` would be queued now.
+        """
+        if lane not in self.lane_weights:
+            raise ValueError(f"Unknown lane: {lane}")
+
+        if self._full(cost):
+            self.drop_expired()
+        if self._full(cost):
+            self.rejected += 1
+            metrics.inc("admission_rejections_total", lane=lane)
+            raise QueueFull(self.retry_after(cost))
+
+    def push(self, item, cost, lane="interactive", tokens=(), watch=()):
+        self.check(cost, lane)
+        entry = Entry(item, cost, lane, tokens, watch)
+        priority = (self.lane_weights[lane] * cost
+                    + self.aging_rate * entry.enqueued_at)
+        heapq.heappush(self._heap, (priority, next(self._seq), entry))
+        self._size += 1
+        self.queued_cost += cost
+        return entry
+
+    def peek(self):
+        while self._heap and self._heap[0][2].removed:
+            heapq.heappop(self._heap)
+        return self._heap[0][2] if self._heap else None
+
+    def take(self, limit=1, group_key=None):
+        """
+        Remove and return the first entry plus up to limit - 1 more, in
+        queue order, with the same group_key(item) (a batch the model
+        can run as one call).
+        """
+        first = self.peek()
+        if first is None:
+            return []
+
+        taken = [first]
+        if limit > 1 and group_key is not None:
+            key = group_key(first.item)
+            for _, _, entry in sorted(self._heap):
+                if len(taken) >= limit:
+                    break
+                if (entry is not first and not entry.removed
+                        and group_key(entry.item) == key):
+                    taken.append(entry)
+
+        for entry in taken:
+            self.remove(entry)
+        return taken
+
+    def remove(self, entry):
+        if not entry.removed:
+            entry.removed = True
+            self._size -= 1
+            self.queued_cost -= entry.cost
+
+    def drop_expired(self):
+        """
+        Remove the entries whose tokens have all fired (their deadline
+        passed or every caller left) and return them.
+        """
+        dropped = [entry for _, _, entry in self._heap
+                   if not entry.removed and entry.expired()]
+        for entry in dropped:
+            self.remove(entry)
+            metrics.inc("admission_dropped_total", lane=entry.lane)
+        self.dropped += len(dropped)
+        return dropped
+
+    def record(self, cost, seconds):
+        """
+        Feed the measured time of `cost` units of work into sec_per_cost.
+        """
+        if cost <= 0:
+            return
+        rate = seconds / cost
+        self.sec_per_cost = (
+            rate if self.sec_per_cost is None
+            else 0.8 * self.sec_per_cost + 0.2 * rate
+        )
+
+    def retry_after(self, cost=0):
+        """
+        Whole seconds until a request of `cost` would likely fit: the
+        work that has to drain first at the measured rate.
+        """
+        backlog = min(
+            (entry.cost for _, _, entry in self._heap if not entry.removed),
+            default=0.0
+        )
+        if self.max_queued_cost is not None:
+            backlog = max(backlog, self.queued_cost + cost - self.max_queued_cost)
+        seconds = backlog * (self.sec_per_cost or 1.0)
+        return int(min(max(1, math.ceil(seconds)), self.retry_after_max_sec))
+
+    def _full(self, cost):
+        if self._size == 0:
+            return False
+        return (self.max_queued is not None and self._size >= self.max_queued) or (
+            self.max_queued_cost is not None
+            and self.queued_cost + cost > self.max_queued_cost
+        )
+
+    def stats(self):
+        return {
+            "queued": self._size,
+            "queued_cost": round(self.queued_cost, 1),
+            "rejected": self.rejected,
+            "dropped": self.dropped,
+            "sec_per_cost": (
+                round(self.sec_per_cost, 4) if self.sec_per_cost is not None else None
+            )
+        }
+
+
+class AdmissionGate:
+    """
+    Admission for generations run on the caller's thread (the pipeline,
+    streaming): at most `max_active` run at once and the rest wait in an
+    AdmissionQueue, which decides who goes next.
+
+    enqueue() takes a place or raises QueueFull; admitted(entry) then
+    blocks until the entry's turn, or raises GenerationCancelled once it
+    expired while waiting.
+    """
+
+    def __init__(self, max_active=1, **queue_options):
+        self.max_active = max_active
+        self.queue = AdmissionQueue(**queue_options)
+        self.active = 0
+        self._cond = threading.Condition()
+
+    def check(self, cost, lane="interactive"):
+        with self._cond:
+            self.queue.check(cost, lane)
+
+    def enqueue(self, cost, lane="interactive", tokens=(), watch=()):
+        with self._cond:
+            return self.queue.push(None, cost, lane, tokens, watch)
+
+    @contextmanager
+    def admitted(self, entry):
+        with self._cond:
+            try:
+                while True:
+                    if self.queue.drop_expired():
+                        self._cond.notify_all()
+                    if entry.removed:
+                        raise GenerationCancelled(entry.reason)
+                    if self.active < self.max_active and self.queue.peek() is entry:
+                        self.queue.remove(entry)
+                        self.active += 1
+                        break
+                    self._cond.wait(POLL_SEC)
+            except BaseException:
+                # Never leave an abandoned entry at the head of the queue
+                self.queue.remove(entry)
+                self._cond.notify_all()
+                raise
+
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            with self._cond:
+                self.active -= 1
+                self.queue.record(entry.cost, time.monotonic() - start)
+                self._cond.notify_all()
+
+    @contextmanager
+    def admit(self, cost, lane="interactive", tokens=(), watch=()):
+        with self.admitted(self.enqueue(cost, lane, tokens, watch)):
+            yield
+
+    def stats(self):
+        with self._cond:
+            return dict(self.queue.stats(), active=self.active)
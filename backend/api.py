@@ -1,12 +1,378 @@
-from fastapi import FastAPI
+import json
+import time
+import struct
+import asyncio
+from functools import partial
+from contextlib import asynccontextmanager
+from pathlib import Path
+
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import (
+    FileResponse, PlainTextResponse, Response, StreamingResponse
+)
 from pydantic import BaseModel
-from backend.main_service import generate_music_pipeline
+from backend.admission import LANES, QueueFull
+from backend.audio_serving import AudioFileServer, etag_matches
+from backend.batch_scheduler import BatchScheduler
+from backend.cancellation import (
+    DEADLINE_REASON, CancellationToken, GenerationCancelled
+)
+from backend.generation_params import (
+    DRAFT_MODEL, OVERRIDE_FIELDS, SAMPLING_FIELDS, quality_tier
+)
+from backend.job_queue import JobStore, JobWorkerPool
+from backend.main_service import (
+    STARTUP_REPORT,
+    admission_stats,
+    build_response,
+    cache_key,
+    cache_stats,
+    catalog_stats,
+    generate_audio_batch,
+    generation_request,
+    get_generator,
+    lookup_cache,
+    metrics_text,
+    model_stats,
+    output_history,
+    prepare_request_async,
+    record_latency,
+    request_cost,
+    require_generator,
+    serve_from_catalog,
+    stream_admission,
+    start_output_retention,
+    touch_output,
+    warm_up,
+)
+
+CONFIG_PATH = Path("config/generation_params.json")
+
+with open(CONFIG_PATH, "r") as f:
+    _config = json.load(f)
+    SCHEDULER_CONFIG = _config.get("scheduler", {})
+    JOBS_CONFIG = _config.get("jobs", {})
+    STARTUP_CONFIG = _config.get("startup", {})
+    AUDIO_SERVING_CONFIG = _config.get("audio_serving", {})
+    CANCELLATION_CONFIG = _config.get("cancellation", {})
+    COALESCING_CONFIG = _config.get("coalescing", {})
+    ADMISSION_CONFIG = _config.get("admission", {})
+
+# The API checks the cache itself before queueing, see generate_music();
+# files are awaited by the scheduler so encoding overlaps the next decode.
+# Identical requests are coalesced by the scheduler, keyed like the cache,
+# and admitted by its queue in order of estimated cost.
+scheduler = BatchScheduler(
+    partial(generate_audio_batch, check_cache=False, wait=False, coalesce=False),
+    key_fn=cache_key if COALESCING_CONFIG.get("enabled", True) else None,
+    cost_fn=request_cost,
+    admission=ADMISSION_CONFIG.get("queue"),
+    **SCHEDULER_CONFIG
+)
+
+audio_server = AudioFileServer(**AUDIO_SERVING_CONFIG)
+
+job_store = JobStore(JOBS_CONFIG.get("db_path", "outputs/jobs.sqlite"))
+job_workers = JobWorkerPool(
+    db_path=job_store.db_path,
+    workers=JOBS_CONFIG.get("workers", 1),
+    poll_interval_sec=JOBS_CONFIG.get("poll_interval_sec", 0.5),
+    warm_models=(
+        STARTUP_CONFIG.get("models") or []
+        if STARTUP_CONFIG.get("warm_up", False) else None
+    )
+)
 
-app = FastAPI()
+
+@asynccontextmanager
+async def lifespan(app):
+    if STARTUP_CONFIG.get("warm_up", False):
+        await run_in_threadpool(warm_up, STARTUP_CONFIG.get("models"))
+    await run_in_threadpool(start_output_retention)
+    await scheduler.start()
+    if job_workers.workers > 0:
+        job_workers.start()
+    yield
+    job_workers.stop()
+    await scheduler.stop()
+
+
+app = FastAPI(lifespan=lifespan)
 
 class MusicRequest(BaseModel):
     prompt: str
+    seed: int | None = None
+    model: str | None = None
+    # Deadline for the whole request; defaults to cancellation.request_timeout_sec
+    timeout_sec: float | None = None
+    # On cancellation, return the audio decoded so far instead of an error
+    keep_partial: bool = False
+    # Quality tier from config "tiers" (default tier if omitted) ...
+    tier: str | None = None
+    # ... and explicit overrides of its settings
+    duration: float | None = None
+    temperature: float | None = None
+    cfg_coef: float | None = None
+    top_k: int | None = None
+    top_p: float | None = None
+    # Answer with the nearest pre-rendered catalog track when one is
+    # close enough (config catalog.serve if omitted)
+    catalog: bool | None = None
+    # Admission lane: "interactive", or "batch" for work that can wait
+    lane: str = "interactive"
+
+def tier_options(req: MusicRequest):
+    """
+    (tier, overrides) of a request; 400 for an unknown tier.
+    """
+    try:
+        quality_tier(req.tier, _config)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return req.tier, {field: getattr(req, field) for field in OVERRIDE_FIELDS}
+
+def admission_lane(req: MusicRequest):
+    if req.lane not in LANES:
+        raise HTTPException(status_code=400, detail=f"Unknown lane: {req.lane}")
+    return req.lane
+
+def queue_full(e: QueueFull):
+    return HTTPException(status_code=429, detail=str(e),
+                         headers={"Retry-After": str(e.retry_after)})
+
+def cancellation_token(req: MusicRequest):
+    return CancellationToken(
+        deadline_sec=req.timeout_sec or CANCELLATION_CONFIG.get("request_timeout_sec"),
+        keep_partial=req.keep_partial
+    )
+
+async def cancel_on_disconnect(http_request: Request, token):
+    """
+    Fire `token` when the client goes away; run alongside the request.
+    """
+    poll = CANCELLATION_CONFIG.get("disconnect_poll_sec", 0.25)
+    while not token.cancelled:
+        if await http_request.is_disconnected():
+            token.cancel("client disconnected")
+            return
+        await asyncio.sleep(poll)
 
 @app.post("/generate")
-def generate_music(req: MusicRequest):
-    return generate_music_pipeline(req.prompt)
+async def generate_music(req: MusicRequest, http_request: Request):
+    # The first request builds the backend (and may load a model); that,
+    # the catalog lookup and the SQLite output record stay off the loop
+    await run_in_threadpool(require_generator, req.model)
+    tier, overrides = tier_options(req)
+    lane = admission_lane(req)
+    start = time.time()
+    token = cancellation_token(req)
+    watcher = asyncio.create_task(cancel_on_disconnect(http_request, token))
+
+    try:
+        params, enhanced_prompt = await prepare_request_async(req.prompt)
+        token.raise_if_cancelled()
+
+        audio_result = await run_in_threadpool(partial(
+            serve_from_catalog, params, enhanced_prompt, seed=req.seed,
+            model=req.model, tier=tier, overrides=overrides,
+            use_catalog=req.catalog
+        ))
+        if audio_result is not None:
+            response = await run_in_threadpool(
+                build_response, audio_result, params, enhanced_prompt
+            )
+            record_latency({"tier": "catalog"}, time.time() - start)
+            return response
+
+        request = generation_request(
+            params, enhanced_prompt, req.seed, req.model, cancel=token,
+            pending=scheduler.single_flight.in_flight(),
+            tier=tier, overrides=overrides
+        )
+
+        if request["model"] == DRAFT_MODEL:
+            # Drafts render in well under a second; queueing them behind
+            # MusicGen batches would defeat the point
+            audio_result = (await run_in_threadpool(generate_audio_batch, [request]))[0]
+        else:
+            audio_result = await run_in_threadpool(lookup_cache, request)
+            if audio_result is None:
+                audio_result = await scheduler.submit(request, lane=lane)
+
+        response = await run_in_threadpool(
+            build_response, audio_result, params, enhanced_prompt, request
+        )
+        record_latency(request, time.time() - start)
+        return response
+    except QueueFull as e:
+        raise queue_full(e)
+    except GenerationCancelled as e:
+        # 499 is what nginx logs for "client closed request"
+        status = 504 if e.reason == DEADLINE_REASON else 499
+        raise HTTPException(status_code=status, detail=f"Generation {e.reason}")
+    finally:
+        watcher.cancel()
+
+class StreamRequest(MusicRequest):
+    chunk_sec: float = 1.5
+
+@app.post("/generate/stream")
+async def generate_music_stream(req: StreamRequest):
+    """
+    Chunked audio/wav response that starts playing while MusicGen is
+    still decoding.
+    """
+    await run_in_threadpool(require_generator, req.model)
+    tier, overrides = tier_options(req)
+    lane = admission_lane(req)
+    params, enhanced_prompt = await prepare_request_async(req.prompt)
+    request = generation_request(params, enhanced_prompt, model=req.model,
+                                 tier=tier, overrides=overrides)
+
+    # A client that disconnects stops the decode through the streamer
+    # itself; the token adds the deadline
+    token = cancellation_token(req)
+    try:
+        admitted = stream_admission(request, lane, cancel=token)
+    except QueueFull as e:
+        raise queue_full(e)
+    generator = await run_in_threadpool(get_generator, request["model"])
+
+    def wav_stream():
+        yield wav_stream_header(generator.sample_rate)
+        # Streams run outside the scheduler; the wait for a turn at the
+        # admission gate happens once the response has started
+        with admitted():
+            for chunk in generator.generate_stream(
+                prompt=request["prompt"],
+                duration=request["duration"],
+                energy_level=request["energy_level"],
+                mood=request["mood"],
+                chunk_sec=req.chunk_sec,
+                cancel=token,
+                **{field: request[field] for field in SAMPLING_FIELDS
+                   if field in request}
+            ):
+                yield (chunk * 32767).astype("<i2").tobytes()
+
+    return StreamingResponse(wav_stream(), media_type="audio/wav")
+
+def wav_stream_header(sample_rate, channels=1, bits=16):
+    """
+    WAV header for a stream of unknown length (sizes set to the maximum,
+    which browsers and ffmpeg treat as "read until EOF").
+    """
+    byte_rate = sample_rate * channels * bits // 8
+    return (
+        b"RIFF" + struct.pack("<I", 0xFFFFFFFF) + b"WAVE"
+        + b"fmt " + struct.pack("<IHHIIHH", 16, 1, channels, sample_rate,
+                                byte_rate, channels * bits // 8, bits)
+        + b"data" + struct.pack("<I", 0xFFFFFFFF)
+    )
+
+@app.api_route("/audio/{path:path}", methods=["GET", "HEAD"])
+async def get_audio(path: str, request: Request):
+    """
+    Serve a generated file (the "url" in /generate responses).
+
+    FileResponse handles Range / If-Range for seeking and hands the file
+    to the server's sendfile path where available, so bytes never pass
+    through Python. ETags are content hashes; If-None-Match gets a 304.
+    """
+    found = await run_in_threadpool(audio_server.lookup, path)
+    if found is None:
+        raise HTTPException(status_code=404, detail="Audio not found")
+
+    file_path, stat_result, etag = found
+    await run_in_threadpool(touch_output, file_path)
+    headers = {"ETag": etag, "Cache-Control": audio_server.cache_control}
+
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+
+    return FileResponse(
+        file_path,
+        headers=headers,
+        media_type=audio_server.media_type(file_path),
+        stat_result=stat_result,
+        content_disposition_type="inline"
+    )
+
+@app.get("/outputs")
+def list_outputs(limit: int = 20, before: str | None = None):
+    """
+    Generation history, newest first. Follow "next" for older pages.
+    """
+    try:
+        return output_history(limit=min(max(limit, 1), 100), before=before)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid history cursor")
+
+@app.post("/jobs")
+def submit_job(req: MusicRequest):
+    """
+    Queue a generation and return immediately; poll GET /jobs/{id}.
+    """
+    tier, overrides = tier_options(req)
+    job_id = job_store.submit(
+        req.prompt,
+        options={"seed": req.seed, "model": req.model,
+                 "timeout_sec": req.timeout_sec, "keep_partial": req.keep_partial,
+                 "tier": tier, "overrides": overrides}
+    )
+    return {"job_id": job_id, "status": "queued"}
+
+@app.post("/jobs/{job_id}/cancel")
+def cancel_job(job_id: str):
+    """
+    Cancel a queued job, or ask the worker running it to stop.
+    """
+    status = job_store.cancel(job_id)
+    if status is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return {"job_id": job_id, "status": status}
+
+@app.get("/jobs/{job_id}")
+def get_job(job_id: str):
+    job = job_store.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+@app.get("/tiers")
+def list_tiers():
+    """
+    Configured quality tiers and the default one.
+    """
+    return _config.get("tiers", {})
+
+@app.get("/scheduler/stats")
+def scheduler_stats():
+    return dict(scheduler.stats(), gate=admission_stats())
+
+@app.get("/models")
+def models():
+    return model_stats()
+
+@app.get("/cache/stats")
+def get_cache_stats():
+    return cache_stats()
+
+@app.get("/catalog/stats")
+def get_catalog_stats():
+    return catalog_stats()
+
+@app.get("/startup")
+def startup_report():
+    return STARTUP_REPORT
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def get_metrics():
+    """
+    Stage latency histograms and pipeline counters in Prometheus text
+    format. Covers this process only (not the job worker processes).
+    """
+    return PlainTextResponse(
+        metrics_text(), media_type="text/plain; version=0.0.4"
+    )
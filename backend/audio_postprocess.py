@@ -0,0 +1,257 @@
+# backend/audio_postprocess.py
+
+import os
+import math
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import numpy as np
+import soundfile as sf
+from scipy.signal import lfilter, resample_poly
+
+from backend import metrics
+
+# format -> (file extension, soundfile format, soundfile subtype)
+FORMATS = {
+    "wav": (".wav", "WAV", "PCM_16"),
+    "flac": (".flac", "FLAC", "PCM_16"),
+    "ogg": (".ogg", "OGG", "VORBIS"),
+    "opus": (".opus", "OGG", "OPUS"),
+    "mp3": (".mp3", "MP3", "MPEG_LAYER_III"),
+}
+
+# Opus only supports these rates; anything else is resampled to 48 kHz
+OPUS_RATES = (8000, 12000, 16000, 24000, 48000)
+
+# BS.1770 gating
+BLOCK_SEC = 0.4
+BLOCK_STEP_SEC = 0.1
+ABSOLUTE_GATE_LUFS = -70.0
+RELATIVE_GATE_LU = -10.0
+
+
+# --------------------------------------------------
+# DSP (all functions work on (batch, samples) arrays)
+# --------------------------------------------------
+def k_weighting(sample_rate):
+    """
+    BS.1770 K-weighting as two biquads (high shelf + high pass), designed
+    for `sample_rate` rather than the 48 kHz coefficient table.
+    """
+    # Stage 1: high shelf, +4 dB above ~1.7 kHz
+    gain_db, q, fc = 3.999843853973347, 0.7071752369554196, 1681.974450955533
+    a_gain = 10 ** (gain_db / 40)
+    w0 = 2 * math.pi * fc / sample_rate
+    alpha = math.sin(w0) / (2 * q)
+    cos_w0, sqrt_a = math.cos(w0), math.sqrt(a_gain)
+
+    shelf_b = [
+        a_gain * ((a_gain + 1) + (a_gain - 1) * cos_w0 + 2 * sqrt_a * alpha),
+        -2 * a_gain * ((a_gain - 1) + (a_gain + 1) * cos_w0),
+        a_gain * ((a_gain + 1) + (a_gain - 1) * cos_w0 - 2 * sqrt_a * alpha),
+    ]
+    shelf_a = [
+        (a_gain + 1) - (a_gain - 1) * cos_w0 + 2 * sqrt_a * alpha,
+        2 * ((a_gain - 1) - (a_gain + 1) * cos_w0),
+        (a_gain + 1) - (a_gain - 1) * cos_w0 - 2 * sqrt_a * alpha,
+    ]
+
+    # Stage 2: high pass at ~38 Hz
+    q, fc = 0.5003270373238773, 38.13547087602444
+    w0 = 2 * math.pi * fc / sample_rate
+    alpha = math.sin(w0) / (2 * q)
+    cos_w0 = math.cos(w0)
+
+    highpass_b = [(1 + cos_w0) / 2, -(1 + cos_w0), (1 + cos_w0) / 2]
+    highpass_a = [1 + alpha, -2 * cos_w0, 1 - alpha]
+
+    return [(shelf_b, shelf_a), (highpass_b, highpass_a)]
+
+
+def integrated_loudness(audio, lengths, sample_rate):
+    """
+    Gated integrated loudness (LUFS, BS.1770-4) of each row of `audio`,
+    ignoring samples past each row's length. Returns a (batch,) array;
+    silent rows are -inf.
+    """
+    weighted = audio
+    for b, a in k_weighting(sample_rate):
+        weighted = lfilter(b, a, weighted, axis=1)
+
+    lengths = np.asarray(lengths)
+    valid = np.arange(audio.shape[1])[None, :] < lengths[:, None]
+    energy = np.concatenate(
+        [np.zeros((audio.shape[0], 1)), np.cumsum(weighted ** 2 * valid, axis=1)],
+        axis=1
+    )
+
+    block = int(BLOCK_SEC * sample_rate)
+    step = int(BLOCK_STEP_SEC * sample_rate)
+
+    if audio.shape[1] < block:
+        # Shorter than one gating block: plain mean square
+        mean_square = energy[:, -1] / np.maximum(lengths, 1)
+        with np.errstate(divide="ignore"):
+            return -0.691 + 10 * np.log10(mean_square)
+
+    starts = np.arange(0, audio.shape[1] - block + 1, step)
+    block_power = (energy[:, starts + block] - energy[:, starts]) / block
+    in_range = starts[None, :] + block <= np.maximum(lengths, block)[:, None]
+
+    with np.errstate(divide="ignore"):
+        block_loudness = -0.691 + 10 * np.log10(block_power)
+
+    gated = in_range & (block_loudness > ABSOLUTE_GATE_LUFS)
+    relative_gate = _gated_loudness(block_power, gated) + RELATIVE_GATE_LU
+    gated &= block_loudness > relative_gate[:, None]
+
+    return _gated_loudness(block_power, gated)
+
+
+def _gated_loudness(block_power, mask):
+    count = mask.sum(axis=1)
+    mean_power = np.where(
+        count > 0, (block_power * mask).sum(axis=1) / np.maximum(count, 1), 0.0
+    )
+    with np.errstate(divide="ignore"):
+        return -0.691 + 10 * np.log10(mean_power)
+
+
+def resample(audio, lengths, source_rate, target_rate):
+    if source_rate == target_rate:
+        return audio, np.asarray(lengths)
+    g = math.gcd(source_rate, target_rate)
+    up, down = target_rate // g, source_rate // g
+    resampled = resample_poly(audio, up, down, axis=1).astype(np.float32)
+    return resampled, np.asarray(lengths) * up // down
+
+
+class AudioPostProcessor:
+    """
+    Post-processing and encoding of decoded audio.
+
+    process() works on a whole (batch, samples) array at once: loudness
+    normalization to `target_lufs` (or peak normalization), a ceiling at
+    `peak_ceiling_db`, fade-in/out and optional resampling. Each row is
+    then encoded to `format` (wav / flac / ogg / opus / mp3) on a small
+    thread pool, so encoding overlaps with the next decode.
+    """
+
+    def __init__(self, sample_rate, normalization="lufs", target_lufs=-14.0,
+                 peak_ceiling_db=-1.0, max_gain_db=30.0, fade_in_sec=0.01,
+                 fade_out_sec=0.25, output_sample_rate=None, format="wav",
+                 encode_workers=2):
+        if format not in FORMATS:
+            raise ValueError(f"Unknown audio format {format!r}, expected one of {list(FORMATS)}")
+
+        self.sample_rate = sample_rate
+        self.normalization = normalization
+        self.target_lufs = target_lufs
+        self.peak_ceiling = 10 ** (peak_ceiling_db / 20)
+        self.max_gain_db = max_gain_db
+        self.fade_in_sec = fade_in_sec
+        self.fade_out_sec = fade_out_sec
+        self.format = format
+
+        self.output_sample_rate = output_sample_rate or sample_rate
+        if format == "opus" and self.output_sample_rate not in OPUS_RATES:
+            self.output_sample_rate = 48000
+
+        self._executor = ThreadPoolExecutor(
+            max_workers=encode_workers, thread_name_prefix="encode"
+        )
+
+    @property
+    def extension(self):
+        return FORMATS[self.format][0]
+
+    def process(self, audio, lengths):
+        """
+        Returns (processed float32 array, lengths) at output_sample_rate.
+        Samples past each row's length are zeroed.
+        """
+        audio = np.asarray(audio, dtype=np.float64)
+        lengths = np.asarray(lengths)
+
+        with metrics.span("normalization"):
+            gain = self._normalization_gain(audio, lengths)
+            audio = audio * gain[:, None] * self._fades(audio.shape[1], lengths)
+
+        with metrics.span("resampling"):
+            return resample(audio.astype(np.float32), lengths,
+                            self.sample_rate, self.output_sample_rate)
+
+    def submit(self, audio_row, stem):
+        """
+        Encode one processed row to `stem` + extension in the background.
+        Returns (path, future); the future resolves to the path.
+        """
+        path = Path(f"{stem}{self.extension}")
+        return path, self._executor.submit(self._encode, audio_row, path)
+
+    def shutdown(self):
+        self._executor.shutdown(wait=True)
+
+    # --------------------------------------------------
+    # INTERNALS
+    # --------------------------------------------------
+    def _normalization_gain(self, audio, lengths):
+        peak = np.abs(audio).max(axis=1)
+
+        if self.normalization == "lufs":
+            loudness = integrated_loudness(audio, lengths, self.sample_rate)
+            gain_db = np.where(np.isfinite(loudness),
+                               self.target_lufs - loudness, 0.0)
+            gain = 10 ** (np.minimum(gain_db, self.max_gain_db) / 20)
+        else:
+            gain = np.ones(len(audio))
+
+        # Never push the sample peak above the ceiling
+        with np.errstate(divide="ignore"):
+            peak_limit = np.where(peak > 0, self.peak_ceiling / peak, 1.0)
+        if self.normalization == "peak":
+            return peak_limit
+        return np.minimum(gain, peak_limit)
+
+    def _fades(self, samples, lengths):
+        t = np.arange(samples)[None, :]
+        fade_in = max(1, int(self.fade_in_sec * self.sample_rate))
+        fade_out = max(1, int(self.fade_out_sec * self.sample_rate))
+        return (np.clip(t / fade_in, 0.0, 1.0)
+                * np.clip((lengths[:, None] - t) / fade_out, 0.0, 1.0))
+
+    def _encode(self, audio_row, path):
+        _, sf_format, subtype = FORMATS[self.format]
+        path.parent.mkdir(parents=True, exist_ok=True)
+
+        # Encode next to the target and rename, so readers never see a
+        # half-written file
+        tmp = path.with_name(f".{path.name}.{uuid.uuid4().hex}.tmp")
+        try:
+            with metrics.span("encoding", format=self.format):
+                if sf_format in sf.available_formats():
+                    sf.write(str(tmp), audio_row, self.output_sample_rate,
+                             format=sf_format, subtype=subtype)
+                else:
+                    _encode_with_pydub(audio_row, self.output_sample_rate, tmp,
+                                       self.format)
+            os.replace(tmp, path)
+        finally:
+            tmp.unlink(missing_ok=True)
+        return path
+
+
+def _encode_with_pydub(audio_row, sample_rate, path, fmt):
+    # Fallback for libsndfile builds without MP3 support (needs ffmpeg)
+    try:
+        from pydub import AudioSegment
+    except ImportError:
+        raise RuntimeError(
+            f"Encoding {fmt} needs libsndfile >= 1.1 or pydub + ffmpeg"
+        )
+
+    pcm = (np.clip(audio_row, -1.0, 1.0) * 32767).astype("<i2")
+    segment = AudioSegment(pcm.tobytes(), frame_rate=sample_rate,
+                           sample_width=2, channels=1)
+    segment.export(str(path), format=fmt)
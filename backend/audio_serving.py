@@ -0,0 +1,106 @@
+# backend/audio_serving.py
+
+import stat
+import hashlib
+import threading
+from collections import OrderedDict
+from pathlib import Path
+
+AUDIO_ROOT = Path("outputs")
+AUDIO_ROUTE = "/audio"
+
+# One entry per extension in audio_postprocess.FORMATS, plus the MIDI
+# files written by the draft engine
+MEDIA_TYPES = {
+    ".wav": "audio/wav",
+    ".flac": "audio/flac",
+    ".ogg": "audio/ogg",
+    ".opus": "audio/ogg",
+    ".mp3": "audio/mpeg",
+    ".mid": "audio/midi",
+}
+
+
+def audio_url(file, root=AUDIO_ROOT):
+    """
+    URL path under which the API serves `file`, or None when the file
+    is not below `root`.
+    """
+    try:
+        relative = Path(file).resolve().relative_to(Path(root).resolve())
+    except ValueError:
+        return None
+    return f"{AUDIO_ROUTE}/{relative.as_posix()}"
+
+
+def etag_matches(if_none_match, etag):
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    # Weak comparison, as RFC 9110 asks for If-None-Match
+    candidates = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+    return etag in candidates
+
+
+class AudioFileServer:
+    """
+    Maps /audio/<path> requests to audio files under `root` (generated
+    samples and generation cache entries).
+
+    Only files with a known audio extension inside `root` are served.
+    ETags are a SHA-256 of the file content, so a regenerated file under
+    the same name gets a new tag; digests are kept per (path, size,
+    mtime), so each file is hashed once.
+    """
+
+    def __init__(self, root=AUDIO_ROOT, cache_control="public, max-age=3600",
+                 max_etags=4096):
+        self.root = Path(root)
+        self.cache_control = cache_control
+        self.max_etags = max_etags
+
+        self._lock = threading.Lock()
+        self._etags = OrderedDict()
+
+    def lookup(self, relative):
+        """
+        Returns (path, stat_result, etag) for `relative`, or None when it
+        does not name a servable audio file.
+        """
+        root = self.root.resolve()
+        path = (root / relative).resolve()
+
+        if not path.is_relative_to(root) or path.suffix not in MEDIA_TYPES:
+            return None
+        try:
+            stat_result = path.stat()
+        except OSError:
+            return None
+        if not stat.S_ISREG(stat_result.st_mode):
+            return None
+
+        return path, stat_result, self.etag(path, stat_result)
+
+    def etag(self, path, stat_result):
+        key = (str(path), stat_result.st_size, stat_result.st_mtime_ns)
+
+        with self._lock:
+            etag = self._etags.get(key)
+            if etag is not None:
+                self._etags.move_to_end(key)
+                return etag
+
+        with open(path, "rb") as f:
+            digest = hashlib.file_digest(f, "sha256").hexdigest()
+        etag = f'"{digest[:32]}"'
+
+        with self._lock:
+            self._etags[key] = etag
+            while len(self._etags) > self.max_etags:
+                self._etags.popitem(last=False)
+        return etag
+
+    @staticmethod
+    def media_type(path):
+        return MEDIA_TYPES[Path(path).suffix]
@@ -0,0 +1,195 @@
+# backend/audio_streamer.py
+
+import queue
+import threading
+
+import numpy as np
+import torch
+from transformers import StoppingCriteria
+
+_END = object()
+
+
+class StreamClosed(Exception):
+    """Raised inside model.generate when the consumer stopped reading."""
+
+
+class StreamFinished(Exception):
+    """
+    Raised inside model.generate after the last step, once every frame
+    has been streamed, so generate never EnCodec-decodes the full track.
+    """
+
+
+class AudioChunkStreamer(StoppingCriteria):
+    """
+    Incrementally decodes MusicGen tokens into audio chunks.
+
+    Passed to model.generate as a stopping criterion (which, unlike the
+    `streamer` hook, sees every step on every transformers version) that
+    never asks to stop. MusicGen delays codebook k by k steps, so audio
+    frame t is complete once token t + k + 1 of every codebook k exists.
+
+    Every `chunk_frames` frames we EnCodec-decode only the new frames plus
+    `context_frames` of left context (discarded after decoding), holding
+    back `holdback_frames` at the right edge until their future context
+    exists. At step `max_new_tokens` the held-back frames are flushed from
+    the tokens already held and StreamFinished is raised: left to finish,
+    generate would decode the whole sequence once more. Decoding work and
+    memory are therefore bounded by the chunk size, not by the track
+    length.
+
+    A long stream is several generate calls (windows), each prompted with
+    the last codes of the one before; start_window() prepares the next
+    one. The prompt frames serve as decode context and the held-back
+    frames of a window are emitted by the next, so the seams decode as if
+    the track were one sequence.
+    """
+
+    def __init__(self, model, chunk_frames=75, context_frames=25,
+                 holdback_frames=5, max_queued_chunks=8, max_new_tokens=None):
+        self.audio_encoder = model.audio_encoder
+        self.num_codebooks = model.decoder.num_codebooks
+        self.samples_per_frame = int(
+            model.config.audio_encoder.sampling_rate
+            // model.config.audio_encoder.frame_rate
+        )
+
+        self.chunk_frames = chunk_frames
+        self.context_frames = context_frames
+        self.holdback_frames = holdback_frames
+        self.max_new_tokens = max_new_tokens
+
+        self.token_cache = None        # (num_codebooks, steps), ints only
+        self.prompt_codes = None       # (num_codebooks, frames) of the window
+        self.final = True
+        self.emitted_frames = 0
+        self.tokens_generated = 0
+
+        self.chunks = queue.Queue(maxsize=max_queued_chunks)
+        self.closed = threading.Event()
+
+    def start_window(self, max_new_tokens, prompt_codes=None, final=True):
+        """
+        Prepare for a generate call of `max_new_tokens` steps that
+        continues from `prompt_codes` (the frame_codes of the previous
+        window's tail). Frames are numbered from the start of the prompt.
+        A window that is not `final` keeps its held-back frames for the
+        next one.
+        """
+        pending = 0
+        if self.token_cache is not None:
+            pending = self.complete_frames() - self.emitted_frames
+
+        self.max_new_tokens = max_new_tokens
+        self.prompt_codes = prompt_codes
+        self.final = final
+        self.token_cache = None
+        self.tokens_generated = 0
+
+        prompt_frames = 0 if prompt_codes is None else prompt_codes.shape[-1]
+        self.emitted_frames = max(0, prompt_frames - pending)
+
+    # --------------------------------------------------
+    # GENERATE HOOKS (called from the generate thread)
+    # --------------------------------------------------
+    def __call__(self, input_ids, scores, **kwargs):
+        if self.closed.is_set():
+            raise StreamClosed()
+
+        if input_ids.shape[0] != self.num_codebooks:
+            raise ValueError("AudioChunkStreamer only supports batch size 1")
+
+        # generate builds a new ids tensor each step, so keeping a
+        # reference is enough - no copy of the history is made
+        self.token_cache = input_ids
+        self.tokens_generated += 1
+
+        if self.max_new_tokens is not None and self.tokens_generated >= self.max_new_tokens:
+            self._emit(self.complete_frames()
+                       - (0 if self.final else self.holdback_frames))
+            raise StreamFinished()
+
+        ready = self.complete_frames() - self.holdback_frames
+        if ready - self.emitted_frames >= self.chunk_frames:
+            self._emit(ready)
+
+        return torch.zeros(input_ids.shape[0], dtype=torch.bool,
+                           device=input_ids.device)
+
+    def end(self):
+        if self.token_cache is not None and not self.closed.is_set():
+            self._emit(self.complete_frames())
+        self._push(_END)
+
+    # --------------------------------------------------
+    # CONSUMER SIDE
+    # --------------------------------------------------
+    def fail(self, error):
+        self._push(error)
+
+    def __iter__(self):
+        try:
+            while True:
+                item = self.chunks.get()
+                if item is _END:
+                    return
+                if isinstance(item, BaseException):
+                    raise item
+                yield item
+        finally:
+            # Stops model.generate on its next step if the reader went away
+            self.closed.set()
+
+    # --------------------------------------------------
+    # DECODING
+    # --------------------------------------------------
+    def complete_frames(self):
+        # Position 0 holds BOS; codebook k is delayed by k steps
+        return max(0, self.token_cache.shape[-1] - self.num_codebooks)
+
+    def frame_codes(self, first, last):
+        """
+        Codes of frames [first, last) as a (num_codebooks, frames) tensor.
+        """
+        codes = torch.stack([
+            self.token_cache[k, first + k + 1:last + k + 1].cpu()
+            for k in range(self.num_codebooks)
+        ])
+        if self.prompt_codes is not None and first < self.prompt_codes.shape[-1]:
+            # generate applies the prompt through a mask on its inputs; the
+            # ids it keeps hold its own samples for the delayed codebooks
+            prompted = min(last, self.prompt_codes.shape[-1])
+            codes[:, :prompted - first] = self.prompt_codes[:, first:prompted]
+        return codes
+
+    def decode_frames(self, first, last):
+        """
+        Decode frames [first, last) to a float32 numpy array.
+        """
+        codes = self.frame_codes(first, last)
+        with torch.no_grad():
+            audio = self.audio_encoder.decode(
+                codes[None, None].to(self.audio_encoder.device),
+                audio_scales=[None]
+            ).audio_values
+        return audio[0, 0].float().cpu().numpy()
+
+    def _emit(self, last):
+        if last <= self.emitted_frames:
+            return
+
+        first = max(0, self.emitted_frames - self.context_frames)
+        audio = self.decode_frames(first, last)
+
+        skip = (self.emitted_frames - first) * self.samples_per_frame
+        self.emitted_frames = last
+        self._push(np.clip(audio[skip:], -1.0, 1.0))
+
+    def _push(self, item):
+        while not self.closed.is_set():
+            try:
+                self.chunks.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                continue
@@ -0,0 +1,224 @@
+# backend/batch_scheduler.py
+
+import time
+import asyncio
+import math
+import logging
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+from backend.admission import AdmissionQueue, QueueFull
+from backend.cancellation import GenerationCancelled
+from backend.single_flight import SingleFlight
+
+
+class BatchScheduler:
+    """
+    Async micro-batching dispatcher in front of a batched generate call.
+
+    Requests wait in a bounded AdmissionQueue ordered by estimated cost
+    (`cost_fn`, request -> cost; shortest job first with aging, per
+    priority lane). submit() raises QueueFull when it is full. Once the
+    first request has waited `window_ms` (or `max_batch_size` are
+    waiting), the request at the head of the queue is run together with
+    the next ones of its model and duration bucket, so that short tracks
+    are not padded out to long ones, as one call on a dedicated
+    single-threaded inference worker. Energy settings do not need their
+    own groups: MusicGenerator.generate_batch already applies temperature
+    and CFG per row.
+
+    With a `key_fn` (request -> key), requests with the same key that
+    overlap in time share one generation (see SingleFlight): only the
+    first is queued, the others wait for its result.
+
+    A request whose CancellationToken ("cancel") fires is answered with
+    GenerationCancelled right away, unless the token keeps partial audio,
+    in which case it waits for the partial result. The generation itself
+    is only stopped (or, while still queued, dropped from the queue) once
+    every request sharing it has gone away.
+    """
+
+    def __init__(self, run_batch, window_ms=50, max_batch_size=8,
+                 duration_bucket_sec=10, key_fn=None, cost_fn=None,
+                 admission=None):
+        self.run_batch = run_batch
+        self.key_fn = key_fn
+        self.cost_fn = cost_fn
+        # AdmissionQueue options
+        self.admission = admission or {}
+        self.window = window_ms / 1000
+        self.max_batch_size = max_batch_size
+        self.duration_bucket_sec = duration_bucket_sec
+
+        self._queue = None
+        self._arrived = None
+        self._task = None
+        self._deliveries = set()
+        self._executor = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="inference"
+        )
+        self.single_flight = SingleFlight()
+
+        self.batch_size_histogram = Counter()
+        self.queue_depth_histogram = Counter()
+        self.requests_served = 0
+
+    # --------------------------------------------------
+    # LIFECYCLE
+    # --------------------------------------------------
+    async def start(self):
+        self._queue = AdmissionQueue(**self.admission)
+        self._arrived = asyncio.Event()
+        self._task = asyncio.create_task(self._dispatch_loop())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        self._executor.shutdown(wait=False)
+
+    # --------------------------------------------------
+    # PUBLIC API
+    # --------------------------------------------------
+    async def submit(self, request, lane="interactive"):
+        """
+        Queue one generate_batch request dict in `lane` and wait for its
+        result. Raises QueueFull if the queue has no room for it.
+        """
+        if self._queue is None:
+            raise RuntimeError("BatchScheduler is not running")
+
+        loop = asyncio.get_running_loop()
+
+        # Without a key_fn every request gets a flight of its own
+        key = self.key_fn(request) if self.key_fn is not None else object()
+        token = request.get("cancel")
+        flight, waiter, leader = self.single_flight.join(key, token)
+
+        if leader:
+            cost = (self.cost_fn(request) if self.cost_fn is not None
+                    else request.get("duration", 30))
+            try:
+                # The queued request carries the flight's token, which
+                # fires once no caller is waiting for it any more
+                self._queue.push(
+                    (dict(request, cancel=flight.token), flight.future),
+                    cost, lane, tokens=[flight.token]
+                )
+            except QueueFull as e:
+                flight.future.set_exception(e)
+                raise
+            self._arrived.set()
+
+        timer = None
+        if token is not None and token.deadline is not None:
+            # Reading `cancelled` fires a token whose deadline passed
+            timer = loop.call_later(token.remaining(), lambda: token.cancelled)
+
+        try:
+            return await asyncio.wrap_future(waiter)
+        finally:
+            if timer is not None:
+                timer.cancel()
+
+    def stats(self):
+        return {
+            "queue_depth": len(self._queue) if self._queue is not None else 0,
+            "admission": self._queue.stats() if self._queue is not None else {},
+            "requests_served": self.requests_served,
+            "in_flight": self.single_flight.in_flight(),
+            "batches_run": sum(self.batch_size_histogram.values()),
+            "batch_size_histogram": dict(sorted(self.batch_size_histogram.items())),
+            "queue_depth_histogram": dict(sorted(self.queue_depth_histogram.items()))
+        }
+
+    # --------------------------------------------------
+    # DISPATCH
+    # --------------------------------------------------
+    async def _dispatch_loop(self):
+        while True:
+            while not len(self._queue):
+                self._arrived.clear()
+                await self._arrived.wait()
+
+            # Give the head of the queue up to `window` to gather a batch
+            deadline = self._queue.peek().enqueued_at + self.window
+            while len(self._queue) < self.max_batch_size:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                self._arrived.clear()
+                try:
+                    await asyncio.wait_for(self._arrived.wait(), timeout)
+                except asyncio.TimeoutError:
+                    break
+
+            self.queue_depth_histogram[len(self._queue)] += 1
+
+            # Flights every caller left while queued are not worth decoding
+            for entry in self._queue.drop_expired():
+                _, future = entry.item
+                if not future.done():
+                    future.set_exception(GenerationCancelled(entry.reason))
+
+            group = self._queue.take(self.max_batch_size, self._group_key)
+            if group:
+                await self._run_group(group)
+
+    def _group_key(self, item):
+        request, _ = item
+        bucket = math.ceil(request.get("duration", 30) / self.duration_bucket_sec)
+        return request.get("model"), bucket
+
+    async def _run_group(self, entries):
+        loop = asyncio.get_running_loop()
+        group = [entry.item for entry in entries]
+        requests = [request for request, _ in group]
+
+        self.batch_size_histogram[len(group)] += 1
+
+        start = time.monotonic()
+        try:
+            results = await loop.run_in_executor(
+                self._executor, self.run_batch, requests
+            )
+            self._queue.record(sum(entry.cost for entry in entries),
+                               time.monotonic() - start)
+        except Exception as e:
+            logging.error(f"Batched generation failed: {e}")
+            for _, future in group:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        # Files may still be encoding; deliver them off the dispatch path
+        # so the next batch can start decoding meanwhile
+        delivery = asyncio.create_task(self._deliver(group, results))
+        self._deliveries.add(delivery)
+        delivery.add_done_callback(self._deliveries.discard)
+
+    async def _deliver(self, group, results):
+        for (_, future), result in zip(group, results):
+            write = result.pop("write_future", None)
+            try:
+                if write is not None:
+                    await asyncio.wrap_future(write)
+            except Exception as e:
+                logging.error(f"Writing {result.get('file')} failed: {e}")
+                if not future.done():
+                    future.set_exception(e)
+                continue
+
+            if future.done():
+                continue
+            if result.get("file") is None and "cancelled" in result:
+                future.set_exception(GenerationCancelled(result["cancelled"]))
+            else:
+                future.set_result(result)
+
+        self.requests_served += len(group)
+
@@ -0,0 +1,323 @@
+# backend/bulk_generate.py
+
+import os
+import re
+import json
+import time
+import logging
+import argparse
+import itertools
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from pathlib import Path
+
+from backend.generation_params import DRAFT_MODEL, OVERRIDE_FIELDS, load_config
+
+BULK_DIR = Path("outputs/bulk")
+MANIFEST_NAME = "results.jsonl"
+
+
+def read_requests(path):
+    """
+    Yield (line number, request dict or None, error) for every non-empty
+    line of a JSONL file, one line at a time. A request needs a "prompt";
+    its optional "id" (or "request_id") names the output file.
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        for line_no, line in enumerate(f, start=1):
+            if not line.strip():
+                continue
+            try:
+                request = json.loads(line)
+            except json.JSONDecodeError as e:
+                yield line_no, None, f"invalid JSON: {e}"
+                continue
+            if not isinstance(request, dict) or not request.get("prompt"):
+                yield line_no, None, "missing prompt"
+                continue
+            yield line_no, request, None
+
+
+class Manifest:
+    """
+    Append-only JSONL record of finished items, one line per item.
+
+    Every record is flushed and fsynced as it is written, so after a
+    crash the manifest holds everything that finished, plus at most one
+    torn last line, which load() skips. Completed items are kept as a
+    bitmap of input line numbers: a few KB for a hundred thousand lines.
+    Failed items are not marked completed and are retried on restart.
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._completed = bytearray()
+        self.completed_count = 0
+        self.load()
+
+        self._file = open(self.path, "ab")
+        if self._file.tell() > 0 and not self._ends_with_newline():
+            # Terminate a line torn by a crash before appending
+            self._file.write(b"\n")
+
+    def load(self):
+        if not self.path.exists():
+            return
+        with open(self.path, "rb") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                if record.get("status") == "done":
+                    self._mark(record["line"])
+
+    def is_completed(self, line_no):
+        index = line_no >> 3
+        return index < len(self._completed) and bool(
+            self._completed[index] & (1 << (line_no & 7))
+        )
+
+    def append(self, record):
+        self._file.write(json.dumps(record).encode("utf-8") + b"\n")
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        if record.get("status") == "done":
+            self._mark(record["line"])
+
+    def close(self):
+        self._file.close()
+
+    def _mark(self, line_no):
+        index = line_no >> 3
+        if index >= len(self._completed):
+            self._completed.extend(bytes(index + 1 - len(self._completed)))
+        if not self._completed[index] & (1 << (line_no & 7)):
+            self._completed[index] |= 1 << (line_no & 7)
+            self.completed_count += 1
+
+    def _ends_with_newline(self):
+        with open(self.path, "rb") as f:
+            f.seek(-1, os.SEEK_END)
+            return f.read(1) == b"\n"
+
+
+def item_id(line_no, request):
+    """
+    Output name of the request on `line_no`: its id (sanitized) with the
+    line number appended, or "line-<n>" without one. The line number
+    keeps names unique, repeated ids included, without any per-item
+    state, and resumed runs assign the same names.
+    """
+    name = request.get("id") or request.get("request_id")
+    if not name:
+        return f"line-{line_no}"
+    return re.sub(r"[^\w.-]", "_", f"{name}-{line_no}")
+
+
+# --------------------------------------------------
+# WORKER PROCESSES
+# --------------------------------------------------
+def _generate_batch(batch, out_dir):
+    """
+    Runs in a worker process: InputProcessor -> PromptEnhancer ->
+    one batched generation for a list of (line number, request).
+    Finished files are moved to `out_dir` under the item's id.
+    Returns one manifest record per item.
+    """
+    from backend import main_service
+
+    main_service.init_backend()
+    # Library tracks are unique; copying them into the generation cache
+    # would only evict live entries
+    main_service.generation_cache = None
+
+    records, prepared = [], []
+    for line_no, request in batch:
+        record = {"line": line_no, "id": item_id(line_no, request)}
+        try:
+            params, enhanced_prompt = main_service.prepare_request(request["prompt"])
+            overrides = {field: request.get(field) for field in OVERRIDE_FIELDS}
+            generation = main_service.generation_request(
+                params, enhanced_prompt, seed=request.get("seed"),
+                model=request.get("model"), tier=request.get("tier"),
+                overrides=overrides
+            )
+        except Exception as e:
+            records.append(dict(record, status="failed", error=str(e)))
+            continue
+        prepared.append((record, request, params, enhanced_prompt, generation))
+
+    if not prepared:
+        return records
+
+    start = time.time()
+    try:
+        results = main_service.generate_audio_batch(
+            [generation for *_, generation in prepared],
+            # Identical requests without a seed are separate library tracks
+            check_cache=False, coalesce=False, lane="batch"
+        )
+    except Exception as e:
+        return records + [
+            dict(record, status="failed", error=str(e)) for record, *_ in prepared
+        ]
+    elapsed = time.time() - start
+
+    for (record, request, params, enhanced_prompt, _), result in zip(prepared, results):
+        # A draft fallback (MusicGen failed to load) is not the track
+        # that was asked for; leave the item for the next run
+        if result.get("file") is None or (
+                result.get("model") == DRAFT_MODEL
+                and request.get("model") != DRAFT_MODEL):
+            records.append(dict(record, status="failed",
+                                error=result.get("cancelled", "no audio generated")))
+            continue
+
+        files = {"file": _move(result["file"], out_dir, record["id"])}
+        if result.get("midi"):
+            files["midi"] = _move(result["midi"], out_dir, record["id"])
+        records.append(dict(
+            record, status="done", **files,
+            prompt=enhanced_prompt, params=params,
+            model=result.get("model"), duration=result.get("duration"),
+            generation_time_sec=round(elapsed / len(prepared), 3),
+            finished_at=time.time()
+        ))
+    return records
+
+
+def _move(file, out_dir, name):
+    source = Path(file)
+    target = Path(out_dir) / f"{name}{source.suffix}"
+    os.replace(source, target)
+    return str(target)
+
+
+# --------------------------------------------------
+# DRIVER
+# --------------------------------------------------
+def _batches(requests, manifest, batch_size, counts):
+    """
+    Group pending requests into batches, skipping completed items and
+    writing invalid lines to the manifest as failures (both tallied in
+    `counts`).
+    """
+    batch = []
+    for line_no, request, error in requests:
+        if manifest.is_completed(line_no):
+            counts["skipped"] += 1
+            continue
+        if error is not None:
+            manifest.append({"line": line_no, "id": f"line-{line_no}",
+                             "status": "failed", "error": error})
+            counts["invalid"] += 1
+            continue
+        batch.append((line_no, request))
+        if len(batch) == batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def run_bulk(input_path, out_dir=None, workers=1, batch_size=4,
+             report_interval_sec=10):
+    """
+    Generate every request of a JSONL file on a pool of `workers`
+    processes, `batch_size` requests per batched model call, appending
+    one record per item to `out_dir`/results.jsonl as it finishes.
+
+    The input is streamed: at most two batches per worker are in flight,
+    so memory stays flat however long the file is. Items already "done"
+    in the manifest are skipped, so a run that crashed or was
+    interrupted picks up where it stopped. Returns a summary dict.
+    """
+    input_path = Path(input_path)
+    out_dir = Path(out_dir or BULK_DIR / input_path.stem)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    manifest = Manifest(out_dir / MANIFEST_NAME)
+
+    with open(input_path, "rb") as f:
+        total = sum(1 for line in f if line.strip())
+    remaining = total - manifest.completed_count
+    logging.info(f"{total} requests, {manifest.completed_count} already done")
+
+    counts = {"skipped": 0, "invalid": 0}
+    batches = _batches(read_requests(input_path), manifest, batch_size, counts)
+    done = failed = 0
+    start = last_report = time.time()
+
+    # Same reason as JobWorkerPool: forking a parent with torch loaded is unsafe
+    ctx = multiprocessing.get_context("spawn")
+    try:
+        with ProcessPoolExecutor(max_workers=workers, mp_context=ctx) as pool:
+            pending = set()
+            while True:
+                for batch in itertools.islice(batches, 2 * workers - len(pending)):
+                    pending.add(pool.submit(_generate_batch, batch, str(out_dir)))
+                if not pending:
+                    break
+
+                finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    for record in future.result():
+                        manifest.append(record)
+                        if record["status"] == "done":
+                            done += 1
+                        else:
+                            failed += 1
+                            logging.warning(
+                                f"Item {record['id']} failed: {record['error']}"
+                            )
+
+                if time.time() - last_report >= report_interval_sec:
+                    last_report = time.time()
+                    _report(done, failed + counts["invalid"], remaining, start)
+    finally:
+        manifest.close()
+
+    failed += counts["invalid"]
+    _report(done, failed, remaining, start)
+    return {"total": total, "done": done, "failed": failed,
+            "skipped": counts["skipped"], "elapsed_sec": round(time.time() - start, 1),
+            "manifest": str(manifest.path)}
+
+
+def _report(done, failed, remaining, start):
+    elapsed = time.time() - start
+    rate = done / elapsed if elapsed > 0 else 0.0
+    left = max(remaining - done - failed, 0)
+    eta = f"{left / rate / 60:.1f} min" if rate > 0 else "unknown"
+    logging.info(
+        f"Bulk: {done} done, {failed} failed, {left} left | "
+        f"{rate * 60:.1f} items/min | ETA {eta}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Generate every request of a JSONL file, resumably."
+    )
+    parser.add_argument("input", help="JSONL file, one request per line")
+    parser.add_argument("--out-dir", help=f"default: {BULK_DIR}/<input name>")
+    parser.add_argument("--workers", type=int)
+    parser.add_argument("--batch-size", type=int)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO,
+                        format="%(asctime)s | %(levelname)s | %(message)s")
+    bulk_cfg = load_config().get("bulk", {})
+
+    summary = run_bulk(
+        args.input, args.out_dir,
+        workers=args.workers or bulk_cfg.get("workers", 1),
+        batch_size=args.batch_size or bulk_cfg.get("batch_size", 4),
+        report_interval_sec=bulk_cfg.get("report_interval_sec", 10)
+    )
+    print(json.dumps(summary, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+# backend/cancellation.py
+
+import time
+import threading
+
+from backend import metrics
+
+DEADLINE_REASON = "deadline exceeded"
+
+
+class GenerationCancelled(Exception):
+    """
+    Raised for a request whose CancellationToken fired before it
+    finished (and that did not keep partial audio).
+    """
+
+    def __init__(self, reason):
+        super().__init__(reason)
+        self.reason = reason
+
+
+class CancellationToken:
+    """
+    Cooperative cancellation for one generation request.
+
+    The token travels with the request dict ("cancel") down to
+    model.generate, where a stopping criterion checks it every decoding
+    step. It fires on cancel() or once `deadline_sec` has passed since it
+    was created. With `keep_partial`, the audio decoded so far is written
+    out and returned (marked "partial") instead of being discarded.
+    """
+
+    def __init__(self, deadline_sec=None, keep_partial=False):
+        self.deadline = (
+            time.monotonic() + deadline_sec if deadline_sec is not None else None
+        )
+        self.keep_partial = keep_partial
+        self.reason = None
+
+        # Seconds of audio rendered when generation noticed the token
+        self.stopped_at_sec = None
+
+        self._lock = threading.Lock()
+        self._event = threading.Event()
+        self._callbacks = []
+
+    def cancel(self, reason="cancelled"):
+        with self._lock:
+            if self._event.is_set():
+                return
+            self.reason = reason
+            self._event.set()
+            callbacks, self._callbacks = self._callbacks, []
+
+        metrics.inc("cancellations_total", reason=reason)
+        for callback in callbacks:
+            callback(self)
+
+    @property
+    def cancelled(self):
+        if not self._event.is_set() and self.remaining() == 0:
+            self.cancel(DEADLINE_REASON)
+        return self._event.is_set()
+
+    def remaining(self):
+        """
+        Seconds left before the deadline (None without one).
+        """
+        if self.deadline is None:
+            return None
+        return max(0.0, self.deadline - time.monotonic())
+
+    def add_callback(self, callback):
+        """
+        Call callback(token) on cancellation, from the cancelling thread
+        (immediately if already cancelled). Deadlines only fire once
+        something checks `cancelled`.
+        """
+        with self._lock:
+            if not self._event.is_set():
+                self._callbacks.append(callback)
+                return
+        callback(self)
+
+    def mark_stopped(self, rendered_sec):
+        if self.stopped_at_sec is None:
+            self.stopped_at_sec = rendered_sec
+
+    def raise_if_cancelled(self):
+        if self.cancelled:
+            raise GenerationCancelled(self.reason)
@@ -0,0 +1,449 @@
+# backend/catalog.py
+
+import os
+import re
+import json
+import time
+import zlib
+import hashlib
+import logging
+import sqlite3
+import argparse
+import itertools
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import numpy as np
+
+from backend.generation_params import DRAFT_MODEL, energy_score
+
+CATALOG_DIR = Path("outputs/catalog")
+CATALOG_DB = CATALOG_DIR / "catalog.sqlite"
+
+# Fixed structure hint, so every grid point has one reproducible prompt
+CATALOG_STRUCTURE = "loop-friendly structure"
+
+TEMPO_POSITION = {"slow": 0.0, "medium": 0.5, "fast": 1.0}
+
+# Weight of each param in the match distance (normalized to sum to 1)
+FIELD_WEIGHTS = {
+    "mood": 1.0, "tempo": 0.5, "energy": 0.5, "style": 0.4, "instruments": 0.4
+}
+
+EMBEDDING_DIMS = 256
+
+# How often a serving process checks the database for new entries
+RELOAD_INTERVAL_SEC = 30
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS catalog (
+    key         TEXT PRIMARY KEY,
+    mood        TEXT NOT NULL,
+    tempo       TEXT NOT NULL,
+    energy      INTEGER NOT NULL,
+    style       TEXT NOT NULL,
+    instruments TEXT NOT NULL,
+    duration    REAL NOT NULL,
+    prompt      TEXT NOT NULL,
+    model       TEXT,
+    file        TEXT NOT NULL,
+    format      TEXT,
+    embedding   BLOB NOT NULL,
+    created_at  REAL NOT NULL
+);
+"""
+
+
+def catalog_grid(grid, moods):
+    """
+    Every combination of the grid's values, as InputProcessor-style
+    params. `grid` holds lists for "tempos", "energies", "styles",
+    "instruments" (lists of lists) and "durations"; `moods` defaults to
+    grid["moods"].
+    """
+    moods = grid.get("moods") or moods
+    return [
+        {
+            "mood": mood, "tempo": tempo, "energy": energy, "style": style,
+            "instruments": list(instruments), "duration": duration
+        }
+        for mood, tempo, energy, style, instruments, duration in itertools.product(
+            moods, grid["tempos"], grid["energies"], grid["styles"],
+            grid["instruments"], grid["durations"]
+        )
+    ]
+
+
+def entry_key(params, model=None):
+    fields = {field: params[field] for field in
+              ("mood", "tempo", "energy", "style", "instruments", "duration")}
+    canonical = json.dumps(dict(fields, model=model), sort_keys=True)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()[:32]
+
+
+def prompt_embedding(text, dims=EMBEDDING_DIMS):
+    """
+    Unit-length hashed bag of words and word bigrams. crc32 rather than
+    hash(), which is salted per process.
+    """
+    words = re.findall(r"[a-z0-9]+", text.lower())
+    features = words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+
+    vector = np.zeros(dims, dtype=np.float32)
+    for feature in features:
+        h = zlib.crc32(feature.encode("utf-8"))
+        vector[h % dims] += 1.0 if h & 0x80000000 else -1.0
+
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm > 0 else vector
+
+
+class Catalog:
+    """
+    Pre-rendered tracks over the prompt-parameter grid, with
+    nearest-match retrieval.
+
+    Entries live in SQLite (one row per grid point, with its file under
+    `root`). Serving processes keep an in-memory index: one array per
+    param plus a matrix of prompt embeddings, so a lookup is a few
+    vectorized comparisons over the whole catalog. The distance mixes
+    the weighted param distance (categorical mismatch, tempo and energy
+    gaps, instrument Jaccard distance; all in [0, 1]) with the cosine
+    distance of the prompts, weighted by `prompt_weight`.
+    """
+
+    def __init__(self, db_path=CATALOG_DB, root=CATALOG_DIR, max_distance=0.2,
+                 prompt_weight=0.3, duration_tolerance_sec=5.0):
+        self.db_path = Path(db_path)
+        self.root = Path(root)
+        self.max_distance = max_distance
+        self.prompt_weight = prompt_weight
+        self.duration_tolerance_sec = duration_tolerance_sec
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(SCHEMA)
+
+        self._lock = threading.Lock()
+        self._index = None
+        self._index_version = None
+        self._checked_at = 0.0
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    # --------------------------------------------------
+    # ENTRIES
+    # --------------------------------------------------
+    def add(self, params, prompt, result, model=None):
+        """
+        Move a freshly rendered file into the catalog and index it under
+        the grid point and the model it was requested with.
+        """
+        key = entry_key(params, model)
+        source = Path(result["file"])
+        target = self.root / key[:2] / f"{key}{source.suffix}"
+        target.parent.mkdir(parents=True, exist_ok=True)
+        os.replace(source, target)
+
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO catalog (key, mood, tempo, energy, style, "
+                "instruments, duration, prompt, model, file, format, embedding, "
+                "created_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    key, params["mood"], params["tempo"], params["energy"],
+                    params["style"], json.dumps(params["instruments"]),
+                    params["duration"], prompt, result.get("model"), str(target),
+                    result.get("format"), prompt_embedding(prompt).tobytes(),
+                    time.time()
+                )
+            )
+        return key
+
+    def keys(self):
+        with self._connect() as conn:
+            return {row["key"] for row in conn.execute("SELECT key FROM catalog")}
+
+    def stats(self):
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT COUNT(*) AS entries, COUNT(DISTINCT mood) AS moods "
+                "FROM catalog"
+            ).fetchone()
+        return dict(row)
+
+    # --------------------------------------------------
+    # RETRIEVAL
+    # --------------------------------------------------
+    def nearest(self, params, prompt):
+        """
+        Closest entry to `params` (InputProcessor output; "energy" 1-10,
+        coerced with energy_score) and `prompt`, as (entry dict, distance), or None when the
+        catalog has nothing within max_distance and the duration
+        tolerance.
+        """
+        index = self._current_index()
+        if index is None:
+            return None
+
+        try:
+            duration = float(params.get("duration", 30))
+        except (TypeError, ValueError):
+            # Malformed params: generate live rather than guess
+            return None
+        usable = np.abs(index["duration"] - duration) <= self.duration_tolerance_sec
+        if not usable.any():
+            return None
+
+        wanted = set(params.get("instruments") or [])
+        query_instruments = np.array(
+            [name in wanted for name in index["instrument_names"]], dtype=np.float32
+        )
+        overlap = index["instruments"] @ query_instruments
+        union = index["instruments"].sum(axis=1) + query_instruments.sum() - overlap
+        jaccard = 1.0 - np.divide(overlap, union, out=np.ones_like(overlap),
+                                  where=union > 0)
+
+        w = {field: weight / sum(FIELD_WEIGHTS.values())
+             for field, weight in FIELD_WEIGHTS.items()}
+        param_distance = (
+            w["mood"] * (index["mood"] != params.get("mood"))
+            + w["style"] * (index["style"] != params.get("style"))
+            + w["tempo"] * np.abs(
+                index["tempo"] - TEMPO_POSITION.get(params.get("tempo"), 0.5))
+            + w["energy"] * np.abs(index["energy"] - energy_score(params.get("energy"))) / 9
+            + w["instruments"] * jaccard
+        )
+        prompt_distance = 1.0 - index["embeddings"] @ prompt_embedding(prompt)
+
+        distance = ((1 - self.prompt_weight) * param_distance
+                    + self.prompt_weight * prompt_distance)
+        distance = np.where(usable, distance, np.inf)
+
+        best = int(np.argmin(distance))
+        if distance[best] > self.max_distance:
+            return None
+        return index["entries"][best], float(distance[best])
+
+    def _current_index(self):
+        with self._lock:
+            now = time.monotonic()
+            if self._index_version is None or now - self._checked_at > RELOAD_INTERVAL_SEC:
+                self._checked_at = now
+                with self._connect() as conn:
+                    version = tuple(conn.execute(
+                        "SELECT COUNT(*), MAX(created_at) FROM catalog"
+                    ).fetchone())
+                if version != self._index_version:
+                    self._index = self._build_index()
+                    self._index_version = version
+            return self._index
+
+    def _build_index(self):
+        with self._connect() as conn:
+            rows = conn.execute("SELECT * FROM catalog ORDER BY key").fetchall()
+        if not rows:
+            return None
+
+        entries = []
+        for row in rows:
+            entry = dict(row)
+            entry["instruments"] = json.loads(entry["instruments"])
+            del entry["embedding"]
+            entries.append(entry)
+
+        names = sorted({name for entry in entries for name in entry["instruments"]})
+        column = {name: i for i, name in enumerate(names)}
+        instruments = np.zeros((len(entries), len(names)), dtype=np.float32)
+        for i, entry in enumerate(entries):
+            for name in entry["instruments"]:
+                instruments[i, column[name]] = 1.0
+
+        return {
+            "entries": entries,
+            "mood": np.array([e["mood"] for e in entries]),
+            "style": np.array([e["style"] for e in entries]),
+            "tempo": np.array([TEMPO_POSITION.get(e["tempo"], 0.5) for e in entries]),
+            "energy": np.array([e["energy"] for e in entries], dtype=np.float32),
+            "duration": np.array([e["duration"] for e in entries]),
+            "instrument_names": names,
+            "instruments": instruments,
+            "embeddings": np.stack([
+                np.frombuffer(row["embedding"], dtype=np.float32) for row in rows
+            ])
+        }
+
+
+# --------------------------------------------------
+# PRE-RENDERING
+# --------------------------------------------------
+def _render_batch(batch, model, seed):
+    """
+    Runs in a worker process: render one batch of grid points with the
+    regular pipeline. Returns [(params, prompt, result)].
+    """
+    from backend import main_service
+    from backend.prompt_enhancer import PromptEnhancer
+
+    main_service.init_backend()
+    # The files are moved into the catalog; copying them into the
+    # generation cache as well would only evict live entries
+    main_service.generation_cache = None
+    enhancer = PromptEnhancer()
+
+    prompts = [enhancer.enhance(params, structure=CATALOG_STRUCTURE)[0]
+               for params in batch]
+    requests = [
+        main_service.generation_request(params, prompt, seed=seed, model=model)
+        for params, prompt in zip(batch, prompts)
+    ]
+    results = main_service.generate_audio_batch(
+        requests, check_cache=False, coalesce=False
+    )
+    return list(zip(batch, prompts, results))
+
+
+def build_catalog(catalog, entries, model=None, seed=None, workers=1,
+                  batch_size=4, until=None):
+    """
+    Render every grid point in `entries` that the catalog does not have
+    yet, on a pool of `workers` processes, `batch_size` points per
+    batched model call. Stops submitting work at `until` (a datetime),
+    so a run can be confined to an off-peak window and resumed by the
+    next one. Returns {"rendered", "failed", "skipped", "remaining"}.
+    """
+    done = catalog.keys()
+    todo = [params for params in entries if entry_key(params, model) not in done]
+    skipped = len(entries) - len(todo)
+    batches = [todo[i:i + batch_size] for i in range(0, len(todo), batch_size)]
+
+    rendered = failed = 0
+    # Same reason as JobWorkerPool: forking a parent with torch loaded is unsafe
+    ctx = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=workers, mp_context=ctx) as pool:
+        pending = {}    # future -> number of grid points it renders
+        while batches or pending:
+            while (batches and len(pending) < workers
+                   and (until is None or datetime.now() < until)):
+                batch = batches.pop(0)
+                pending[pool.submit(_render_batch, batch, model, seed)] = len(batch)
+            if not pending:
+                break
+
+            finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in finished:
+                size = pending.pop(future)
+                try:
+                    for params, prompt, result in future.result():
+                        # A draft fallback (MusicGen failed to load) is no
+                        # catalog entry; the point stays open for the next run
+                        if result.get("file") is None or (
+                                result.get("model") == DRAFT_MODEL
+                                and model != DRAFT_MODEL):
+                            failed += 1
+                            continue
+                        catalog.add(params, prompt, result, model)
+                        rendered += 1
+                except Exception as e:
+                    logging.error(f"Catalog batch failed: {e}")
+                    failed += size
+
+            logging.info(f"Catalog: {rendered} rendered, {failed} failed, "
+                         f"{sum(map(len, batches))} left")
+
+    return {"rendered": rendered, "failed": failed, "skipped": skipped,
+            "remaining": sum(map(len, batches))}
+
+
+def off_peak_window(hours, now=None):
+    """
+    (start, end) of the current or next daily window [start_hour,
+    end_hour) in local time; the window may wrap past midnight.
+    """
+    now = now or datetime.now()
+    start_hour, end_hour = hours
+    start = now.replace(hour=start_hour, minute=0, second=0, microsecond=0)
+    end = now.replace(hour=end_hour, minute=0, second=0, microsecond=0)
+    if end <= start:
+        end += timedelta(days=1)
+    if now >= end:
+        start += timedelta(days=1)
+        end += timedelta(days=1)
+    elif end - timedelta(days=1) > now:
+        # Still inside yesterday's window when it wraps midnight
+        start -= timedelta(days=1)
+        end -= timedelta(days=1)
+    return start, end
+
+
+def open_catalog(config):
+    catalog_cfg = config.get("catalog", {})
+    return Catalog(
+        db_path=catalog_cfg.get("db_path", CATALOG_DB),
+        root=catalog_cfg.get("dir", CATALOG_DIR),
+        max_distance=catalog_cfg.get("max_distance", 0.2),
+        prompt_weight=catalog_cfg.get("prompt_weight", 0.3),
+        duration_tolerance_sec=catalog_cfg.get("duration_tolerance_sec", 5.0)
+    )
+
+
+def main():
+    from backend.generation_params import load_config
+
+    parser = argparse.ArgumentParser(
+        description="Pre-render the track catalog over the prompt-parameter grid."
+    )
+    parser.add_argument("command", choices=["build", "stats"])
+    parser.add_argument("--now", action="store_true",
+                        help="build immediately instead of waiting for the "
+                             "off-peak window")
+    parser.add_argument("--workers", type=int)
+    parser.add_argument("--limit", type=int, help="render at most this many points")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO,
+                        format="%(asctime)s | %(levelname)s | %(message)s")
+    config = load_config()
+    catalog_cfg = config.get("catalog", {})
+    catalog = open_catalog(config)
+
+    if args.command == "stats":
+        print(json.dumps(catalog.stats(), indent=2))
+        return
+
+    with open("data/mood_templates.json", "r", encoding="utf-8") as f:
+        moods = list(json.load(f))
+    entries = catalog_grid(catalog_cfg["grid"], moods)[:args.limit]
+
+    until = None
+    if not args.now and catalog_cfg.get("off_peak_hours"):
+        start, until = off_peak_window(catalog_cfg["off_peak_hours"])
+        if start > datetime.now():
+            logging.info(f"Waiting for the off-peak window at {start}")
+            time.sleep((start - datetime.now()).total_seconds())
+
+    summary = build_catalog(
+        catalog, entries,
+        model=catalog_cfg.get("model"),
+        seed=catalog_cfg.get("seed"),
+        workers=args.workers or catalog_cfg.get("workers", 1),
+        batch_size=catalog_cfg.get("batch_size", 4),
+        until=until
+    )
+    print(json.dumps(summary, indent=2))
+
+
+if __name__ == "__main__":
+    main()
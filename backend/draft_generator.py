@@ -0,0 +1,515 @@
+# backend/draft_generator.py
+
+import re
+import math
+import json
+import time
+import numpy as np
+import soundfile as sf
+from pathlib import Path
+from scipy.signal import oaconvolve
+
+from backend import metrics
+from backend.audio_postprocess import AudioPostProcessor
+from backend.generation_params import DRAFT_MODEL, energy_level_name
+from backend.midi_export import DRUM_CHANNEL, write_midi
+from backend.output_store import new_output_stem
+
+CONFIG_PATH = Path("config/generation_params.json")
+OUTPUT_DIR = Path("outputs/samples")
+
+SAMPLE_RATE = 32000
+WAVETABLE_SIZE = 2048
+RELEASE_SEC = 0.08
+
+# Notes are synthesized in batches of at most this many samples, which
+# bounds memory for long tracks
+CHUNK_SAMPLES = 2_000_000
+
+# --------------------------------------------------
+# ARRANGEMENT RULES
+# --------------------------------------------------
+MAJOR = (0, 2, 4, 5, 7, 9, 11)
+MINOR = (0, 2, 3, 5, 7, 8, 10)
+DORIAN = (0, 2, 3, 5, 7, 9, 10)
+HARMONIC_MINOR = (0, 2, 3, 5, 7, 8, 11)
+
+# mood -> (scale, tonic MIDI note, chord progression as scale degrees)
+MOODS = {
+    "calm": (MAJOR, 60, (0, 5, 3, 4)),
+    "happy": (MAJOR, 62, (0, 4, 5, 3)),
+    "romantic": (MAJOR, 65, (0, 2, 3, 4)),
+    "focus": (DORIAN, 62, (0, 3, 0, 6)),
+    "sad": (MINOR, 57, (0, 5, 2, 6)),
+    "energetic": (MINOR, 64, (0, 6, 5, 6)),
+    "dramatic": (HARMONIC_MINOR, 62, (0, 3, 4, 0)),
+}
+
+TEMPO_BPM = {"slow": 72, "medium": 100, "fast": 128}
+# Explicit BPMs are clamped to this range: a parsed "3 bpm" would not fit
+# a MIDI tempo event and "60000 bpm" would render hundreds of thousands of notes
+BPM_RANGE = (30, 300)
+MOOD_TEMPO = {
+    "calm": "slow", "sad": "slow", "romantic": "slow", "focus": "medium",
+    "happy": "medium", "dramatic": "medium", "energetic": "fast",
+}
+
+# instrument -> (General MIDI program, harmonic amplitudes, attack sec,
+# decay per sec). Plucked and struck sounds decay, sustained ones barely.
+INSTRUMENTS = {
+    "piano": (0, (1.0, 0.45, 0.2, 0.1, 0.05), 0.004, 2.5),
+    "guitar": (25, (1.0, 0.6, 0.3, 0.2, 0.1), 0.003, 3.0),
+    "ukulele": (24, (1.0, 0.5, 0.2), 0.003, 4.0),
+    "harp": (46, (1.0, 0.3, 0.1), 0.003, 2.0),
+    "sitar": (104, (1.0, 0.8, 0.6, 0.5, 0.4, 0.3), 0.003, 1.5),
+    "bells": (14, (1.0, 0.0, 0.6, 0.0, 0.3, 0.0, 0.0, 0.2), 0.002, 1.2),
+    "organ": (19, (1.0, 0.8, 0.0, 0.5, 0.0, 0.0, 0.0, 0.3), 0.01, 0.0),
+    "strings": (48, (1.0, 0.5, 0.33, 0.25, 0.2, 0.16), 0.12, 0.2),
+    "synth": (81, (1.0, 0.5, 0.33, 0.25, 0.2, 0.17, 0.14), 0.02, 0.5),
+    "brass": (61, (1.0, 0.8, 0.6, 0.4, 0.3), 0.05, 0.3),
+    "saxophone": (65, (1.0, 0.6, 0.5, 0.3, 0.2), 0.04, 0.3),
+    "flute": (73, (1.0, 0.2, 0.05), 0.06, 0.2),
+    "vocals": (52, (1.0, 0.5, 0.4, 0.1, 0.05), 0.1, 0.2),
+    "bass": (33, (1.0, 0.4, 0.1), 0.005, 1.5),
+}
+
+# Chords fall back to a pad that suits the mood when only one melodic
+# instrument was asked for
+PAD_FOR_MOOD = {"calm": "strings", "sad": "strings", "romantic": "strings"}
+
+# Mix level per part
+PART_GAIN = {"melody": 0.5, "chords": 0.22, "bass": 0.45, "drums": 0.6}
+
+# energy level -> (melody steps per beat, melody rest probability,
+# base velocity)
+ENERGY_FEEL = {
+    "low": (1, 0.3, 64),
+    "medium": (2, 0.2, 84),
+    "high": (2, 0.08, 104),
+}
+
+# Drum patterns on a 16-step bar: GM note -> steps
+DRUM_PATTERNS = {
+    "low": {36: (0,), 37: (8,), 42: (0, 4, 8, 12)},
+    "medium": {36: (0, 8), 38: (4, 12), 42: (0, 2, 4, 6, 8, 10, 12, 14)},
+    "high": {36: (0, 7, 8), 38: (4, 12), 42: tuple(range(16))},
+}
+
+
+class DraftGenerator:
+    """
+    Sub-second "instant draft" backend with MusicGenerator's contract.
+
+    Instead of a neural decode, the parsed params (mood, tempo or BPM,
+    instruments, energy) drive a rule-based arrangement: a chord
+    progression for the mood, a bass line, a seeded random-walk melody
+    and, at higher energy, a drum groove. The arrangement is rendered by
+    a NumPy wavetable synthesizer (each part in a few whole-array passes,
+    no per-note Python loop) and written both as audio, through the same
+    AudioPostProcessor as MusicGen output, and as a MIDI file.
+
+    Requests may carry "tempo", "bpm" and "instruments" from the parsed
+    params; otherwise they are read from the prompt text or derived from
+    the mood.
+    """
+
+    model_name = DRAFT_MODEL
+
+    def __init__(self, sample_rate=SAMPLE_RATE, write_midi=True, config=None):
+        if config is None:
+            with open(CONFIG_PATH, "r") as f:
+                config = json.load(f)
+        self.config = config
+        self.sample_rate = sample_rate
+        self.write_midi = write_midi
+
+        self.postprocessor = AudioPostProcessor(
+            sample_rate, **config.get("postprocess", {})
+        )
+        self._wavetables = {
+            name: _wavetable(harmonics)
+            for name, (_, harmonics, _, _) in INSTRUMENTS.items()
+        }
+        self._drum_hits = _drum_hits(sample_rate)
+
+    def warm_up(self):
+        # Nothing to load; kept for parity with MusicGenerator
+        return 0.0
+
+    def generate(self, prompt, duration=30, energy_level="medium", mood="calm"):
+        return self.generate_batch([{
+            "prompt": prompt,
+            "duration": duration,
+            "energy_level": energy_level,
+            "mood": mood
+        }])[0]
+
+    def generate_batch(self, requests, progress_callback=None, wait=True,
+                       keep_audio=False):
+        """
+        Same contract as MusicGenerator.generate_batch. Each request is
+        rendered on its own; progress_callback(parts_done, parts_total)
+        is called after each part of each arrangement.
+        """
+        results = []
+        for req in requests:
+            token = req.get("cancel")
+            if token is not None and token.cancelled:
+                results.append(self._cancelled_result(req))
+                continue
+
+            start_time = time.time()
+            with metrics.span("draft_render"):
+                arrangement = self.arrange(req)
+                audio = self.render(arrangement, progress_callback)
+
+            results.append(self._write(
+                req, arrangement, audio, round(time.time() - start_time, 3),
+                keep_audio
+            ))
+
+        if wait:
+            for result in results:
+                future = result.pop("write_future", None)
+                if future is not None:
+                    future.result()
+        return results
+
+    def generate_stream(self, prompt, duration=30, energy_level="medium",
+                        mood="calm", chunk_sec=1.5, output_file=None, cancel=None,
+                        **sampling):
+        """
+        MusicGenerator.generate_stream for drafts: the whole track renders
+        faster than the first chunk would play, so it is rendered once
+        and sliced. Sampling overrides do not apply and are ignored.
+        """
+        arrangement = self.arrange({
+            "prompt": prompt, "duration": duration,
+            "energy_level": energy_level, "mood": mood
+        })
+        audio = self.render(arrangement)
+        audio = audio / max(1.0, float(np.abs(audio).max()))
+
+        if output_file is not None:
+            sf.write(str(output_file), audio, self.sample_rate, subtype="PCM_16")
+
+        chunk = max(1, int(chunk_sec * self.sample_rate))
+        for start in range(0, len(audio), chunk):
+            if cancel is not None and cancel.cancelled:
+                return
+            yield audio[start:start + chunk].astype(np.float32)
+
+    # --------------------------------------------------
+    # ARRANGEMENT
+    # --------------------------------------------------
+    def arrange(self, req):
+        """
+        Turn a request into {"bpm", "duration", "parts": {role: (instrument,
+        notes)}}; notes are (start_beat, length_beats, pitch, velocity).
+        """
+        prompt = req.get("prompt", "").lower()
+        mood = req.get("mood", "calm")
+        if mood not in MOODS:
+            mood = "calm"
+        energy = energy_level_name(req.get("energy_level", "medium"))
+        duration = float(req.get("duration", 30))
+
+        # The tempo may come from an LLM answer; anything unknown falls
+        # back to the prompt or the mood
+        bpm = req.get("bpm") or TEMPO_BPM.get(req.get("tempo")) or TEMPO_BPM[
+            _prompt_tempo(prompt) or MOOD_TEMPO[mood]
+        ]
+        bpm = min(max(bpm, BPM_RANGE[0]), BPM_RANGE[1])
+        instruments = [
+            name for name in (req.get("instruments") or _prompt_instruments(prompt))
+            if name in INSTRUMENTS or name == "drums"
+        ]
+
+        seed = req.get("seed")
+        rng = np.random.default_rng(seed)
+
+        scale, tonic, progression = MOODS[mood]
+        bars = max(1, math.ceil(duration * bpm / 60 / 4))
+        # Every bar's chord root; the last bar resolves to the tonic
+        roots = [progression[bar % len(progression)] for bar in range(bars)]
+        roots[-1] = 0
+
+        melodic = [name for name in instruments if name not in ("bass", "drums")]
+        lead = melodic[0] if melodic else "piano"
+        pad = melodic[1] if len(melodic) > 1 else PAD_FOR_MOOD.get(mood, lead)
+
+        parts = {
+            "melody": (lead, self._melody(rng, scale, tonic, roots, energy)),
+            "chords": (pad, self._chords(scale, tonic - 12, roots, energy)),
+        }
+        if "bass" in instruments or energy != "low":
+            parts["bass"] = ("bass", self._bass(scale, tonic - 24, roots, energy))
+        if "drums" in instruments or energy == "high":
+            parts["drums"] = ("drums", self._drums(bars, energy))
+
+        # The last bar may run past the duration; its overhang is dropped
+        beats = duration * bpm / 60
+        parts = {
+            role: (instrument, [note for note in notes if note[0] < beats])
+            for role, (instrument, notes) in parts.items()
+        }
+
+        return {"bpm": bpm, "duration": duration, "mood": mood,
+                "energy": energy, "parts": parts}
+
+    def _melody(self, rng, scale, tonic, roots, energy):
+        steps, rest_p, velocity = ENERGY_FEEL[energy]
+        degree = 4
+        notes = []
+
+        # Bar 0 is an intro without melody
+        for bar in range(1, len(roots)):
+            chord_tones = {(roots[bar] + k) % 7 for k in (0, 2, 4)}
+            for step in range(4 * steps):
+                if rng.random() < rest_p:
+                    continue
+                degree = int(np.clip(degree + rng.choice((-2, -1, -1, 0, 1, 1, 2)), 0, 11))
+                # Strong beats land on a chord tone
+                if step % (2 * steps) == 0 and degree % 7 not in chord_tones:
+                    degree += 1 if (degree + 1) % 7 in chord_tones else -1
+                accent = 8 if step % steps == 0 else 0
+                notes.append((bar * 4 + step / steps, 0.95 / steps,
+                              _pitch(scale, tonic, degree), velocity + accent))
+
+        # End on the tonic
+        notes.append(((len(roots) - 1) * 4 + 2, 2.0, tonic, velocity))
+        return notes
+
+    def _chords(self, scale, base, roots, energy):
+        length = {"low": 4, "medium": 2, "high": 1}[energy]
+        velocity = ENERGY_FEEL[energy][2] - 10
+        notes = []
+        for bar, root in enumerate(roots):
+            for beat in range(0, 4, length):
+                for k in (0, 2, 4):
+                    notes.append((bar * 4 + beat, length * (0.95 if length > 1 else 0.5),
+                                  _pitch(scale, base, root + k), velocity))
+        return notes
+
+    def _bass(self, scale, base, roots, energy):
+        velocity = ENERGY_FEEL[energy][2]
+        notes = []
+        for bar, root in enumerate(roots):
+            pitch = _pitch(scale, base, root)
+            if energy == "high":
+                for step in range(8):
+                    notes.append((bar * 4 + step / 2, 0.45,
+                                  pitch + (12 if step % 2 else 0), velocity))
+            elif energy == "medium":
+                notes += [(bar * 4, 1.9, pitch, velocity),
+                          (bar * 4 + 2, 1.9, pitch, velocity)]
+            else:
+                notes.append((bar * 4, 3.9, pitch, velocity))
+        return notes
+
+    def _drums(self, bars, energy):
+        velocity = ENERGY_FEEL[energy][2]
+        notes = []
+        # Bar 0 is the intro; the groove starts after it
+        for bar in range(min(1, bars - 1), bars):
+            for pitch, steps in DRUM_PATTERNS[energy].items():
+                for step in steps:
+                    accent = 0 if step % 4 == 0 else -20
+                    notes.append((bar * 4 + step / 4, 0.25, pitch, velocity + accent))
+        return notes
+
+    # --------------------------------------------------
+    # SYNTHESIS
+    # --------------------------------------------------
+    def render(self, arrangement, progress_callback=None):
+        """
+        Mix the arrangement to a float64 mono array of exactly its
+        duration at self.sample_rate.
+        """
+        beat_sec = 60 / arrangement["bpm"]
+        total = int(arrangement["duration"] * self.sample_rate)
+        mix = np.zeros(total)
+
+        parts = arrangement["parts"]
+        for done, (role, (instrument, notes)) in enumerate(parts.items(), 1):
+            if notes:
+                if role == "drums":
+                    part = self._render_drums(notes, beat_sec, total)
+                else:
+                    part = self._render_notes(notes, instrument, beat_sec, total)
+                mix += PART_GAIN[role] * part
+            if progress_callback:
+                progress_callback(done, len(parts))
+
+        return mix
+
+    def _render_notes(self, notes, instrument, beat_sec, total):
+        _, _, attack, decay = INSTRUMENTS[instrument]
+        table = self._wavetables[instrument]
+        sr = self.sample_rate
+
+        notes = np.array(notes, dtype=np.float64)
+        starts = (notes[:, 0] * beat_sec * sr).astype(np.int64)
+        lengths = np.maximum(1, (notes[:, 1] * beat_sec * sr).astype(np.int64))
+        steps = 440.0 * 2 ** ((notes[:, 2] - 69) / 12) / sr * WAVETABLE_SIZE
+        gains = notes[:, 3] / 127
+
+        keep = starts < total
+        starts, lengths, steps, gains = starts[keep], lengths[keep], steps[keep], gains[keep]
+        release = int(RELEASE_SEC * sr)
+        spans = lengths + release
+
+        out = np.zeros(total)
+        for lo, hi in _batches(spans, CHUNK_SAMPLES):
+            span = spans[lo:hi]
+            # Sample index within its own note, for every sample of every note
+            t = np.arange(span.sum()) - np.repeat(np.cumsum(span) - span, span)
+
+            phase = (t * np.repeat(steps[lo:hi], span)).astype(np.int64)
+            wave = table[phase & (WAVETABLE_SIZE - 1)]
+
+            env = np.minimum(1.0, t / max(1.0, attack * sr)) * np.exp(-decay * t / sr)
+            env *= np.clip(1.0 - (t - np.repeat(lengths[lo:hi], span)) / release, 0.0, 1.0)
+
+            position = np.repeat(starts[lo:hi], span) + t
+            inside = position < total
+            out += np.bincount(
+                position[inside],
+                weights=(wave * env * np.repeat(gains[lo:hi], span))[inside],
+                minlength=total
+            )
+        return out
+
+    def _render_drums(self, notes, beat_sec, total):
+        out = np.zeros(total)
+        for pitch, hit in self._drum_hits.items():
+            hits = [(start, velocity) for start, _, p, velocity in notes if p == pitch]
+            if not hits:
+                continue
+            starts, velocities = np.array(hits).T
+            positions = (starts * beat_sec * self.sample_rate).astype(np.int64)
+            inside = positions < total
+            # One impulse per hit, convolved with the drum's one-shot
+            impulses = np.bincount(positions[inside], weights=velocities[inside] / 127,
+                                   minlength=total)
+            out += oaconvolve(impulses, hit)[:total]
+        return out
+
+    # --------------------------------------------------
+    # OUTPUT
+    # --------------------------------------------------
+    def _write(self, req, arrangement, audio, generation_time, keep_audio):
+        processed, lengths = self.postprocessor.process(audio[None, :], [len(audio)])
+        mood = arrangement["mood"]
+        energy = arrangement["energy"]
+
+        output_id, stem = new_output_stem(OUTPUT_DIR, f"{mood}_{energy}_draft")
+        file_path, future = self.postprocessor.submit(processed[0, :lengths[0]], stem)
+
+        result = {
+            "id": output_id,
+            "file": str(file_path),
+            "duration": arrangement["duration"],
+            "mood": mood,
+            "energy": energy,
+            "bpm": arrangement["bpm"],
+            "format": self.postprocessor.format,
+            "sample_rate": self.postprocessor.output_sample_rate,
+            "generation_time_sec": generation_time,
+            "batch_size": 1,
+            "model": DRAFT_MODEL,
+            "draft": True,
+            "write_future": future
+        }
+
+        if self.write_midi:
+            tracks = []
+            for channel, (role, (instrument, notes)) in enumerate(arrangement["parts"].items()):
+                if role == "drums":
+                    tracks.append((role, DRUM_CHANNEL, 0, notes))
+                else:
+                    tracks.append((role, channel, INSTRUMENTS[instrument][0], notes))
+            result["midi"] = str(write_midi(f"{stem}.mid", tracks, arrangement["bpm"]))
+
+        if keep_audio:
+            result["audio"] = audio.astype(np.float32)
+        return result
+
+    def _cancelled_result(self, req):
+        return {
+            "file": None,
+            "cancelled": req["cancel"].reason,
+            "mood": req.get("mood", "calm"),
+            "energy": energy_level_name(req.get("energy_level", "medium")),
+            "batch_size": 1,
+            "model": DRAFT_MODEL
+        }
+
+
+# --------------------------------------------------
+# HELPERS
+# --------------------------------------------------
+def _pitch(scale, tonic, degree):
+    octave, step = divmod(degree, len(scale))
+    return tonic + 12 * octave + scale[step]
+
+
+def _prompt_tempo(prompt):
+    if re.search(r"\b(slow|relaxed|gentle)\b", prompt):
+        return "slow"
+    if re.search(r"\b(fast|upbeat|driving)\b", prompt):
+        return "fast"
+    return None
+
+
+def _prompt_instruments(prompt):
+    names = list(INSTRUMENTS) + ["drums"]
+    return [name for name in names if re.search(rf"\b{name}\b", prompt)]
+
+
+def _wavetable(harmonics):
+    x = np.arange(WAVETABLE_SIZE) / WAVETABLE_SIZE
+    table = sum(a * np.sin(2 * np.pi * (k + 1) * x) for k, a in enumerate(harmonics))
+    return table / np.abs(table).max()
+
+
+def _drum_hits(sample_rate):
+    """
+    One-shot samples for kick (36), side stick (37), snare (38) and
+    closed hi-hat (42).
+    """
+    rng = np.random.default_rng(0)
+
+    def seconds(length):
+        return np.arange(int(length * sample_rate)) / sample_rate
+
+    t = seconds(0.3)
+    sweep = 50 + 100 * np.exp(-t * 30)
+    kick = np.sin(2 * np.pi * np.cumsum(sweep) / sample_rate) * np.exp(-t * 12)
+
+    t = seconds(0.2)
+    snare = (0.6 * rng.standard_normal(len(t)) * np.exp(-t * 25)
+             + 0.4 * np.sin(2 * np.pi * 180 * t) * np.exp(-t * 20))
+
+    t = seconds(0.05)
+    stick = np.sin(2 * np.pi * 800 * t) * np.exp(-t * 90)
+
+    t = seconds(0.08)
+    # First difference of white noise leaves mostly the highs
+    hat = 0.35 * np.diff(rng.standard_normal(len(t) + 1)) * np.exp(-t * 80)
+
+    return {36: kick, 37: stick, 38: 0.7 * snare, 42: hat}
+
+
+def _batches(spans, limit):
+    """
+    Split note indices into consecutive (lo, hi) ranges whose spans sum
+    to at most `limit` (a single longer note gets a range of its own).
+    """
+    ends = np.cumsum(spans)
+    lo = 0
+    while lo < len(spans):
+        base = ends[lo - 1] if lo else 0
+        hi = max(lo + 1, int(np.searchsorted(ends, base + limit, side="right")))
+        yield lo, hi
+        lo = hi
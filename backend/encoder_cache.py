@@ -0,0 +1,113 @@
+# backend/encoder_cache.py
+
+import os
+import uuid
+import hashlib
+import threading
+from collections import OrderedDict
+from pathlib import Path
+
+import torch
+
+from backend import metrics
+
+
+class EncoderOutputCache:
+    """
+    Bounded LRU of T5 encoder hidden states, keyed by (model, mode, prompt).
+
+    Each entry is the unpadded (tokens, hidden_size) float32 tensor of one
+    prompt on the CPU; its attention mask is all ones by construction.
+    With `spill_dir`, entries evicted from memory are written there and
+    read back on a later miss (the directory keeps at most
+    `max_disk_entries` files, oldest first out), so they survive restarts.
+    """
+
+    def __init__(self, max_entries=512, spill_dir=None, max_disk_entries=4096):
+        self.max_entries = max_entries
+        self.spill_dir = Path(spill_dir) if spill_dir else None
+        self.max_disk_entries = max_disk_entries
+
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+        if self.spill_dir is not None:
+            self.spill_dir.mkdir(parents=True, exist_ok=True)
+
+    def get(self, key):
+        with self._lock:
+            state = self._entries.get(key)
+            if state is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                metrics.inc("encoder_cache_total", result="hit")
+                return state
+
+        state = self._load(key)
+        if state is None:
+            self.misses += 1
+            metrics.inc("encoder_cache_total", result="miss")
+            return None
+
+        self.disk_hits += 1
+        metrics.inc("encoder_cache_total", result="disk_hit")
+        self.put(key, state)
+        return state
+
+    def put(self, key, state):
+        evicted = []
+        with self._lock:
+            self._entries[key] = state
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                evicted.append(self._entries.popitem(last=False))
+
+        for old_key, old_state in evicted:
+            self._spill(old_key, old_state)
+
+    def stats(self):
+        return {
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "entries": len(self._entries),
+            "max_entries": self.max_entries
+        }
+
+    # --------------------------------------------------
+    # DISK SPILL
+    # --------------------------------------------------
+    def _path(self, key):
+        digest = hashlib.sha256(repr(key).encode("utf-8")).hexdigest()
+        return self.spill_dir / f"{digest}.pt"
+
+    def _load(self, key):
+        if self.spill_dir is None:
+            return None
+        try:
+            return torch.load(self._path(key), weights_only=True)
+        except (OSError, RuntimeError):
+            return None
+
+    def _spill(self, key, state):
+        if self.spill_dir is None:
+            return
+
+        path = self._path(key)
+        if not path.exists():
+            tmp = path.with_name(f".{path.name}.{uuid.uuid4().hex}.tmp")
+            torch.save(state, tmp)
+            os.replace(tmp, path)
+
+        try:
+            files = sorted(self.spill_dir.glob("*.pt"),
+                           key=lambda p: p.stat().st_mtime)
+            for old in files[:max(0, len(files) - self.max_disk_entries)]:
+                old.unlink(missing_ok=True)
+        except OSError:
+            # Another process is pruning the same directory
+            pass
@@ -0,0 +1,203 @@
+# backend/generation_cache.py
+
+import os
+import json
+import uuid
+import shutil
+import hashlib
+import threading
+from collections import OrderedDict
+from pathlib import Path
+
+CACHE_DIR = Path("outputs/cache")
+META_FILE = "meta.json"
+
+# Fields of a resolved generation request that determine the audio
+KEY_FIELDS = ("prompt", "duration", "temperature", "cfg_coef", "seed")
+
+# Also part of the key, but only when set, so keys of requests that
+# leave them at the model default stay unchanged
+OPTIONAL_KEY_FIELDS = ("top_k", "top_p")
+
+# AudioPostProcessor settings that change the file written; encode_workers
+# only changes how fast it is written
+NON_OUTPUT_SETTINGS = ("encode_workers",)
+
+
+def generation_key(model_name, job, postprocess=None):
+    """
+    Canonical hash of everything the generated audio depends on.
+
+    `job` is a request resolved by MusicGenerator.resolve_request, so the
+    energy level has already been turned into concrete sampling params.
+    `postprocess` is the AudioPostProcessor config (loudness, fades,
+    sample rate, output format), so a config change misses the cache
+    instead of serving files in the old format or loudness.
+    """
+    payload = {"model": model_name}
+    if postprocess is not None:
+        payload["postprocess"] = {
+            name: value for name, value in postprocess.items()
+            if name not in NON_OUTPUT_SETTINGS
+        }
+    payload.update({field: job.get(field) for field in KEY_FIELDS})
+    payload.update({
+        field: job[field] for field in OPTIONAL_KEY_FIELDS
+        if job.get(field) is not None
+    })
+
+    canonical = json.dumps(payload, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+class GenerationCache:
+    """
+    Content-addressed store of generated audio with LRU eviction.
+
+    Entries live in sharded directories (<root>/<key[:2]>/<key>/) holding the
+    audio file and a meta.json with the original result dict. meta.json is
+    written last, so an entry without it is treated as incomplete. Recency
+    is tracked through the meta.json mtime, which survives restarts.
+
+    Several processes (API, job workers) may share one root. A key missing
+    from this process's index is looked up on disk and adopted, and the
+    index is rebuilt from disk before evicting, so the byte budget and the
+    LRU order cover entries written by every process.
+    """
+
+    def __init__(self, root=CACHE_DIR, max_bytes=2 * 1024 ** 3):
+        self.root = Path(root)
+        self.max_bytes = max_bytes
+        self.root.mkdir(parents=True, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()   # key -> size in bytes, oldest first
+        self._bytes = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        with self._lock:
+            self._load_index()
+            self._evict()
+
+    # --------------------------------------------------
+    # PUBLIC API
+    # --------------------------------------------------
+    def get(self, key):
+        """
+        Return the cached result dict for `key`, or None on a miss.
+        """
+        entry_dir = self._entry_dir(key)
+
+        with self._lock:
+            if key not in self._entries:
+                # Possibly written by another process sharing the root
+                try:
+                    self._entries[key] = self._entry_size(entry_dir)
+                    self._bytes += self._entries[key]
+                except OSError:
+                    self.misses += 1
+                    return None
+
+            try:
+                with open(entry_dir / META_FILE, "r") as f:
+                    result = json.load(f)
+                os.utime(entry_dir / META_FILE)
+            except OSError:
+                # Removed behind our back; forget it
+                self._bytes -= self._entries.pop(key)
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+
+        result["file"] = str(entry_dir / result["file"])
+        result["cached"] = True
+        return result
+
+    def put(self, key, result):
+        """
+        Store a copy of result["file"] plus the result dict under `key`.
+        Returns the cached result dict.
+        """
+        source = Path(result["file"])
+        entry_dir = self._entry_dir(key)
+        entry_dir.mkdir(parents=True, exist_ok=True)
+
+        audio_name = "audio" + source.suffix
+        meta = dict(result, file=audio_name)
+
+        self._atomic_copy(source, entry_dir / audio_name)
+        self._atomic_write(entry_dir / META_FILE, json.dumps(meta))
+
+        with self._lock:
+            # Other processes' entries count against the same budget; a
+            # rescan per put is cheap next to the generation it caches
+            self._load_index()
+            self._evict()
+
+        return dict(result, file=str(entry_dir / audio_name))
+
+    def stats(self):
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "max_bytes": self.max_bytes
+        }
+
+    # --------------------------------------------------
+    # INTERNALS
+    # --------------------------------------------------
+    def _entry_dir(self, key):
+        return self.root / key[:2] / key
+
+    def _load_index(self):
+        """
+        Rebuild the index from disk, oldest entry first.
+        """
+        entries = []
+        for meta_path in self.root.glob(f"*/*/{META_FILE}"):
+            entry_dir = meta_path.parent
+            try:
+                entries.append((meta_path.stat().st_mtime, entry_dir.name,
+                                self._entry_size(entry_dir)))
+            except OSError:
+                # Evicted by another process meanwhile
+                continue
+
+        self._entries = OrderedDict(
+            (key, size) for _, key, size in sorted(entries)
+        )
+        self._bytes = sum(self._entries.values())
+
+    def _evict(self):
+        while self._bytes > self.max_bytes and len(self._entries) > 1:
+            key, size = self._entries.popitem(last=False)
+            shutil.rmtree(self._entry_dir(key), ignore_errors=True)
+            self._bytes -= size
+            self.evictions += 1
+
+    @staticmethod
+    def _entry_size(entry_dir):
+        return sum(p.stat().st_size for p in entry_dir.iterdir() if p.is_file())
+
+    @staticmethod
+    def _atomic_copy(source, target):
+        tmp = target.with_name(f".{target.name}.{uuid.uuid4().hex}.tmp")
+        shutil.copyfile(source, tmp)
+        os.replace(tmp, target)
+
+    @staticmethod
+    def _atomic_write(target, text):
+        tmp = target.with_name(f".{target.name}.{uuid.uuid4().hex}.tmp")
+        with open(tmp, "w") as f:
+            f.write(text)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, target)
@@ -0,0 +1,149 @@
+# backend/generation_params.py
+
+import json
+import math
+from pathlib import Path
+
+CONFIG_PATH = Path("config/generation_params.json")
+
+DEFAULT_MODEL = "musicgen-small"
+
+# Model name of the symbolic draft engine (backend/draft_generator.py)
+DRAFT_MODEL = "draft"
+
+# Sampling settings a quality tier or an explicit override may set
+SAMPLING_FIELDS = ("temperature", "cfg_coef", "top_k", "top_p")
+
+# Per-request overrides accepted on top of a tier
+OVERRIDE_FIELDS = ("duration",) + SAMPLING_FIELDS
+
+
+def load_config(path=CONFIG_PATH):
+    with open(path, "r") as f:
+        return json.load(f)
+
+
+# Score standing for each energy level name, mid-band
+ENERGY_LEVEL_SCORES = {"low": 2.0, "medium": 5.0, "high": 8.0}
+
+
+def energy_score(energy, default=5.0):
+    """
+    The 1-10 energy score of an InputProcessor (or LLM) value: numbers
+    and numeric strings as they are, clamped to 1-10, level names at the
+    middle of their band and anything else `default`.
+    """
+    if isinstance(energy, str) and energy in ENERGY_LEVEL_SCORES:
+        return ENERGY_LEVEL_SCORES[energy]
+    try:
+        energy = float(energy)
+    except (TypeError, ValueError):
+        return default
+    if math.isnan(energy):
+        return default
+    return min(max(energy, 1.0), 10.0)
+
+
+def energy_level_name(energy):
+    """
+    Map the 1-10 energy score from InputProcessor onto the
+    low / medium / high keys of energy_mapping. Those names pass through,
+    numeric strings count as scores and anything else is "medium".
+    """
+    energy = energy_score(energy)
+    if energy <= 3:
+        return "low"
+    if energy <= 6:
+        return "medium"
+    return "high"
+
+
+def checkpoint_name(model, config):
+    """
+    Resolve a short model name ("musicgen-small") to its checkpoint id.
+    Unknown names are assumed to already be checkpoint ids or paths.
+    """
+    models = config.get("models", {})
+    model = model or models.get("default", DEFAULT_MODEL)
+    entry = models.get("available", {}).get(model)
+    return entry["checkpoint"] if entry else model
+
+
+def inference_mode(checkpoint, config):
+    """
+    Inference mode (fp32 / bf16 / int8) configured for a checkpoint id,
+    falling back to inference.default_mode.
+    """
+    models = config.get("models", {}).get("available", {})
+    for entry in models.values():
+        if entry["checkpoint"] == checkpoint and "inference_mode" in entry:
+            return entry["inference_mode"]
+    return config.get("inference", {}).get("default_mode", "fp32")
+
+
+def quality_tier(tier, config):
+    """
+    (name, settings) of a quality tier from config "tiers"; None picks
+    tiers.default. Returns (None, {}) when no tiers are configured.
+    Raises ValueError for an unknown tier.
+    """
+    tiers = config.get("tiers", {})
+    name = tier or tiers.get("default")
+    if name is None:
+        return None, {}
+
+    available = tiers.get("available", {})
+    if name not in available:
+        raise ValueError(
+            f"Unknown quality tier {name!r}, expected one of {list(available)}"
+        )
+    return name, available[name]
+
+
+def apply_tier(req, settings, overrides=None):
+    """
+    Copy of `req` with a tier's sampling settings and then explicit
+    `overrides` (OVERRIDE_FIELDS; None values are ignored) applied. The
+    tier's max_duration caps the duration either way. The tier's model
+    is picked by the caller, before routing.
+    """
+    req = dict(req)
+    overrides = overrides or {}
+
+    for field in OVERRIDE_FIELDS:
+        value = overrides.get(field)
+        if value is None:
+            value = settings.get(field)
+        if value is not None:
+            req[field] = value
+
+    if settings.get("max_duration") is not None:
+        req["duration"] = min(req["duration"], settings["max_duration"])
+    return req
+
+
+def resolve_request(req, config):
+    """
+    Fill in defaults and turn the energy level into sampling params.
+
+    Only needs the config, so callers can compute cache keys and route
+    requests without loading a model.
+    """
+    energy_level = energy_level_name(req.get("energy_level", "medium"))
+    energy_cfg = config["energy_mapping"][energy_level]
+
+    return {
+        "prompt": req["prompt"],
+        "model": checkpoint_name(req.get("model"), config),
+        "duration": req.get("duration", 30),
+        "energy_level": energy_level,
+        "mood": req.get("mood", "calm"),
+        "seed": req.get("seed"),
+        "temperature": req.get("temperature", energy_cfg["temperature"]),
+        "cfg_coef": req.get("cfg_coef", energy_cfg["cfg_coef"]),
+        # None keeps the model's generation_config default
+        "top_k": req.get("top_k", energy_cfg.get("top_k")),
+        "top_p": req.get("top_p", energy_cfg.get("top_p")),
+        # CancellationToken or None; not part of the cache key
+        "cancel": req.get("cancel")
+    }
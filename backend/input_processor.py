@@ -1,21 +1,97 @@
 import os
 import json
-try:
-    import google.generativeai as genai
-except Exception:
-    genai = None
+import time
+import asyncio
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
 try:
     from dotenv import load_dotenv
 except Exception:
     def load_dotenv():
         return None
+from backend import metrics
+from backend.lexicon_parser import default_parser
 from backend.prompt_templates import EXTRACTION_PROMPT
 
 load_dotenv()
 
+# Shared by all processors; LLM calls that outlive their deadline keep
+# running here and still fill the cache when they finish
+_llm_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="llm")
+
+
+def _import_genai():
+    # Deferred: the Gemini SDK is slow to import and not needed until an
+    # InputProcessor is actually built
+    try:
+        import google.generativeai as genai
+        return genai
+    except Exception:
+        return None
+
+
+def normalize_text(text):
+    return " ".join(text.lower().split())
+
+
+class ExtractionCache:
+    """
+    LRU cache of extracted params keyed by normalized input text, with a
+    time-to-live so that prompt or model changes eventually show through.
+    """
+
+    def __init__(self, max_entries=256, ttl_sec=3600):
+        self.max_entries = max_entries
+        self.ttl = ttl_sec
+        self._entries = OrderedDict()   # key -> (expires_at, params)
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return dict(entry[1])
+
+    def put(self, key, params):
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, dict(params))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
 class InputProcessor:
-    def __init__(self):
+    """
+    Extracts music params from free text with Gemini, falling back to the
+    lexicon parser (backend/lexicon_parser.py).
+
+    Results are cached by normalized text, and every LLM call is bounded
+    by `deadline_sec`: past it the fallback result is returned and the
+    late LLM answer only fills the cache. `model` can be any object with
+    a generate_content(prompt) method returning something with `.text`,
+    e.g. a local stub in tests.
+    """
+
+    def __init__(self, model=None, cache_size=256, cache_ttl_sec=3600,
+                 deadline_sec=3.0):
+        self.cache = ExtractionCache(cache_size, cache_ttl_sec)
+        self.deadline = deadline_sec
+        self.lexicon = default_parser()
+
+        if model is not None:
+            self.model = model
+            return
+
         api_key = os.getenv("GEMINI_API_KEY")
+        genai = _import_genai()
         if genai is None:
             print("⚠️ google.generativeai not available; using fallback parser")
             self.model = None
@@ -30,16 +106,75 @@ class InputProcessor:
     def process_input(self, user_text):
         if self.model is None:
             print("⚠️ Using fallback parser (no model)")
+            metrics.inc("fallback_parser_total", reason="no_model")
             return self._fallback_parse(user_text)
 
+        key = normalize_text(user_text)
+        cached = self.cache.get(key)
+        if cached is not None:
+            metrics.inc("extraction_cache_total", result="hit")
+            return cached
+        metrics.inc("extraction_cache_total", result="miss")
+
+        future = self._submit_llm(user_text, key)
         try:
-            prompt = EXTRACTION_PROMPT.format(user_input=user_text)
-            response = self.model.generate_content(prompt)
-            return self._validate(json.loads(response.text))
+            return future.result(timeout=self.deadline)
+        except TimeoutError:
+            print(f"⚠️ Using fallback parser (no answer within {self.deadline}s)")
+            metrics.inc("fallback_parser_total", reason="deadline")
         except Exception:
             print("⚠️ Using fallback parser (generation failed)")
+            metrics.inc("fallback_parser_total", reason="generation_failed")
+        return self._fallback_parse(user_text)
+
+    async def process_input_async(self, user_text):
+        """
+        Hedged variant for async callers: the LLM call and the fallback
+        parser run concurrently, and the LLM answer is used if it is valid
+        and arrives within the deadline, the fallback result otherwise.
+        Never blocks the event loop.
+        """
+        if self.model is None:
+            metrics.inc("fallback_parser_total", reason="no_model")
             return self._fallback_parse(user_text)
 
+        key = normalize_text(user_text)
+        cached = self.cache.get(key)
+        if cached is not None:
+            metrics.inc("extraction_cache_total", result="hit")
+            return cached
+        metrics.inc("extraction_cache_total", result="miss")
+
+        loop = asyncio.get_running_loop()
+        llm = asyncio.wrap_future(self._submit_llm(user_text, key))
+        # Failures after the deadline are expected; don't log them as unretrieved
+        llm.add_done_callback(lambda f: f.cancelled() or f.exception())
+        fallback = loop.run_in_executor(None, self._fallback_parse, user_text)
+
+        try:
+            # shield: a late LLM answer should still land in the cache
+            return await asyncio.wait_for(asyncio.shield(llm), self.deadline)
+        except asyncio.TimeoutError:
+            metrics.inc("fallback_parser_total", reason="deadline")
+        except Exception:
+            metrics.inc("fallback_parser_total", reason="generation_failed")
+        return await fallback
+
+    def _submit_llm(self, user_text, key):
+        """
+        Start the LLM extraction in the background; a valid answer is
+        cached when it arrives, whether or not anyone is still waiting.
+        """
+        def call():
+            prompt = EXTRACTION_PROMPT.format(user_input=user_text)
+            with metrics.span("gemini_call"):
+                response = self.model.generate_content(prompt)
+            params = self._validate(json.loads(response.text))
+            self.cache.put(key, params)
+            return dict(params)
+
+        return _llm_executor.submit(call)
+
     def _validate(self, data):
         defaults = {
             "mood": "calm",
@@ -56,21 +191,4 @@ class InputProcessor:
         return data
 
     def _fallback_parse(self, text):
-        text = text.lower()
-
-        mood = (
-            "energetic" if "workout" in text else
-            "happy" if "birthday" in text else
-            "sad" if "breakup" in text else
-            "focus" if "study" in text else
-            "calm"
-        )
-
-        return {
-            "mood": mood,
-            "energy": 8 if "workout" in text else 4,
-            "style": "pop" if "birthday" in text else "ambient",
-            "tempo": "fast" if "workout" in text else "medium",
-            "instruments": ["synth"],
-            "context": "fallback"
-        }
+        return self.lexicon.parse(text)
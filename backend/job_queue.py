@@ -0,0 +1,290 @@
+# backend/job_queue.py
+
+import os
+import json
+import time
+import uuid
+import logging
+import sqlite3
+import multiprocessing
+from contextlib import contextmanager
+from pathlib import Path
+
+JOBS_DB = Path("outputs/jobs.sqlite")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id              TEXT PRIMARY KEY,
+    prompt          TEXT NOT NULL,
+    options         TEXT NOT NULL DEFAULT '{}',
+    status          TEXT NOT NULL,
+    progress_tokens INTEGER NOT NULL DEFAULT 0,
+    total_tokens    INTEGER,
+    result          TEXT,
+    error           TEXT,
+    worker          TEXT,
+    created_at      REAL NOT NULL,
+    updated_at      REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS jobs_status_created ON jobs (status, created_at);
+"""
+
+
+class JobStore:
+    """
+    SQLite-backed job queue shared by the API and the worker processes.
+
+    Every call opens its own short-lived connection, so one store object
+    can be used from any thread, and jobs survive API restarts.
+    """
+
+    def __init__(self, db_path=JOBS_DB):
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(SCHEMA)
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    # --------------------------------------------------
+    # API SIDE
+    # --------------------------------------------------
+    def submit(self, prompt, options=None):
+        """
+        Queue a prompt. `options` are extra generate_music_pipeline
+        keyword arguments (seed, model, ...).
+        """
+        job_id = uuid.uuid4().hex
+        now = time.time()
+
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT INTO jobs (id, prompt, options, status, created_at, updated_at) "
+                "VALUES (?, ?, ?, 'queued', ?, ?)",
+                (job_id, prompt, json.dumps(options or {}), now, now)
+            )
+        return job_id
+
+    def get(self, job_id):
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT * FROM jobs WHERE id = ?", (job_id,)
+            ).fetchone()
+
+        if row is None:
+            return None
+
+        return _decode_job(row)
+
+    def cancel(self, job_id):
+        """
+        Cancel a job. Queued jobs are cancelled on the spot; running ones
+        are marked 'cancelling' and stopped by their worker at its next
+        progress report. Returns the new status, or None if unknown.
+        """
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute(
+                "SELECT status FROM jobs WHERE id = ?", (job_id,)
+            ).fetchone()
+
+            if row is None:
+                conn.execute("COMMIT")
+                return None
+
+            status = {"queued": "cancelled", "running": "cancelling"}.get(
+                row["status"], row["status"]
+            )
+            conn.execute(
+                "UPDATE jobs SET status = ?, updated_at = ? WHERE id = ?",
+                (status, now, job_id)
+            )
+            conn.execute("COMMIT")
+        return status
+
+    def requeue_running(self):
+        """
+        Put jobs left 'running' by workers that died back in the queue
+        (and close the ones that were being cancelled).
+        Only call this when no worker is alive, e.g. before starting a pool.
+        """
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE jobs SET status = 'cancelled', updated_at = ? "
+                "WHERE status = 'cancelling'",
+                (time.time(),)
+            )
+            cursor = conn.execute(
+                "UPDATE jobs SET status = 'queued', progress_tokens = 0, "
+                "worker = NULL, updated_at = ? WHERE status = 'running'",
+                (time.time(),)
+            )
+        return cursor.rowcount
+
+    # --------------------------------------------------
+    # WORKER SIDE
+    # --------------------------------------------------
+    def claim(self, worker_id):
+        """
+        Atomically move the oldest queued job to 'running' and return it.
+        """
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute(
+                "SELECT * FROM jobs WHERE status = 'queued' "
+                "ORDER BY created_at LIMIT 1"
+            ).fetchone()
+
+            if row is None:
+                conn.execute("COMMIT")
+                return None
+
+            conn.execute(
+                "UPDATE jobs SET status = 'running', worker = ?, updated_at = ? "
+                "WHERE id = ?",
+                (worker_id, time.time(), row["id"])
+            )
+            conn.execute("COMMIT")
+
+        return _decode_job(row)
+
+    def update_progress(self, job_id, tokens, total_tokens):
+        """
+        Record progress; returns True if the job was asked to cancel.
+        """
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE jobs SET progress_tokens = ?, total_tokens = ?, "
+                "updated_at = ? WHERE id = ?",
+                (tokens, total_tokens, time.time(), job_id)
+            )
+            row = conn.execute(
+                "SELECT status FROM jobs WHERE id = ?", (job_id,)
+            ).fetchone()
+        return row is not None and row["status"] == "cancelling"
+
+    def complete(self, job_id, result):
+        self._finish(job_id, "done", result=json.dumps(result))
+
+    def fail(self, job_id, error):
+        self._finish(job_id, "failed", error=str(error))
+
+    def mark_cancelled(self, job_id, reason, result=None):
+        self._finish(job_id, "cancelled", error=reason,
+                     result=json.dumps(result) if result else None)
+
+    def _finish(self, job_id, status, result=None, error=None):
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE jobs SET status = ?, result = ?, error = ?, "
+                "updated_at = ? WHERE id = ?",
+                (status, result, error, time.time(), job_id)
+            )
+
+
+def _decode_job(row):
+    job = dict(row)
+    job["options"] = json.loads(job["options"])
+    job["result"] = json.loads(job["result"]) if job["result"] else None
+    return job
+
+
+# --------------------------------------------------
+# WORKER PROCESSES
+# --------------------------------------------------
+def _worker_main(db_path, poll_interval, warm_models=None):
+    # Imported here so that each worker process builds its own pipeline
+    # and MusicGenerator, and the parent never has to load the model
+    from backend.main_service import generate_music_pipeline, warm_up
+    from backend.cancellation import CancellationToken, GenerationCancelled
+
+    if warm_models is not None:
+        warm_up(warm_models or None)
+
+    store = JobStore(db_path)
+    worker_id = f"{os.uname().nodename}:{os.getpid()}"
+    logging.info(f"Job worker {worker_id} ready")
+
+    while True:
+        job = store.claim(worker_id)
+        if job is None:
+            time.sleep(poll_interval)
+            continue
+
+        options = dict(job["options"])
+        timeout = options.pop("timeout_sec", None)
+        token = CancellationToken(
+            # The deadline counts from submission, not from claim
+            deadline_sec=(timeout - (time.time() - job["created_at"])
+                          if timeout else None),
+            keep_partial=options.pop("keep_partial", False)
+        )
+
+        def report(tokens, total, job_id=job["id"]):
+            if store.update_progress(job_id, tokens, total):
+                token.cancel("cancelled")
+
+        try:
+            result = generate_music_pipeline(
+                job["prompt"], progress_callback=report, cancel=token, **options
+            )
+            if result["audio"].get("partial"):
+                store.mark_cancelled(job["id"], result["audio"]["cancelled"], result)
+            else:
+                store.complete(job["id"], result)
+        except GenerationCancelled as e:
+            logging.info(f"Job {job['id']} {e.reason}")
+            store.mark_cancelled(job["id"], e.reason)
+        except Exception as e:
+            logging.error(f"Job {job['id']} failed: {e}")
+            store.fail(job["id"], e)
+
+
+class JobWorkerPool:
+    """
+    Pool of worker processes draining a JobStore.
+
+    Processes are started with the "spawn" method: forking a parent that
+    already initialised torch is unsafe.
+    """
+
+    def __init__(self, db_path=JOBS_DB, workers=1, poll_interval_sec=0.5,
+                 warm_models=None):
+        self.db_path = str(db_path)
+        self.workers = workers
+        self.poll_interval = poll_interval_sec
+        # None: no warm-up; []: warm the default model
+        self.warm_models = warm_models
+        self.processes = []
+
+    def start(self):
+        requeued = JobStore(self.db_path).requeue_running()
+        if requeued:
+            logging.info(f"Requeued {requeued} interrupted jobs")
+
+        ctx = multiprocessing.get_context("spawn")
+        for _ in range(self.workers):
+            process = ctx.Process(
+                target=_worker_main,
+                args=(self.db_path, self.poll_interval, self.warm_models),
+                daemon=True
+            )
+            process.start()
+            self.processes.append(process)
+
+    def stop(self):
+        for process in self.processes:
+            process.terminate()
+        for process in self.processes:
+            process.join(timeout=5)
+        self.processes = []
@@ -0,0 +1,195 @@
+# backend/lexicon_parser.py
+
+import re
+import json
+import threading
+from pathlib import Path
+
+LEXICON_PATH = Path("data/lexicon.json")
+
+# Fields whose value is decided by lexicon votes
+VOTED_FIELDS = ("mood", "style", "tempo", "context")
+
+TOKEN_RE = re.compile(r"\d+(?:\.\d+)?|[a-z]+")
+
+# No bare "s": "80s synthwave" is a decade, not a duration
+DURATION_UNITS = {
+    "sec": 1, "secs": 1, "second": 1, "seconds": 1,
+    "min": 60, "mins": 60, "minute": 60, "minutes": 60
+}
+BPM_UNITS = ("bpm", "bpms")
+
+_MATCHES = None   # trie key holding the (field, value) pairs of a phrase
+
+
+class LexiconParser:
+    """
+    Offline parameter extractor driven by data/lexicon.json.
+
+    Every lexicon phrase is compiled once into a word trie; parse()
+    tokenizes the input and walks it in a single left-to-right pass,
+    taking the longest phrase at each position, and reads duration
+    ("90 seconds", "2 min") and BPM ("120 bpm") expressions in the same
+    pass. Cost depends on the input length, not on the lexicon size.
+
+    Returns the same schema as the LLM extraction plus "confidence"
+    (share of the votes the chosen value got, 0.0 for defaults) and
+    "duration" / "bpm" when the text states them.
+    """
+
+    def __init__(self, lexicon):
+        self.defaults = lexicon["defaults"]
+        self.mood_energy = lexicon.get("mood_energy", {})
+        self.tempo_bpm = lexicon.get("tempo_bpm", {})
+        self.duration_range = lexicon.get("duration_range_sec", [1, 600])
+        self.bpm_range = lexicon.get("bpm_range", [30, 300])
+
+        self.trie = {}
+        self.max_phrase_words = 0
+        self.entries = 0
+
+        for field in VOTED_FIELDS + ("instruments",):
+            for value, phrases in lexicon.get(field, {}).items():
+                for phrase in phrases:
+                    self.add(phrase, field, value)
+
+        for level, phrases in lexicon.get("energy", {}).items():
+            for phrase in phrases:
+                self.add(phrase, "energy", int(level))
+
+    @classmethod
+    def from_file(cls, path=LEXICON_PATH):
+        with open(path, "r", encoding="utf-8") as f:
+            return cls(json.load(f))
+
+    def add(self, phrase, field, value):
+        words = TOKEN_RE.findall(phrase.lower())
+        node = self.trie
+        for word in words:
+            node = node.setdefault(word, {})
+        node.setdefault(_MATCHES, []).append((field, value))
+
+        self.max_phrase_words = max(self.max_phrase_words, len(words))
+        self.entries += 1
+
+    # --------------------------------------------------
+    # PARSING
+    # --------------------------------------------------
+    def parse(self, text):
+        tokens = TOKEN_RE.findall(text.lower())
+        votes = {field: {} for field in VOTED_FIELDS}
+        instruments = []
+        energy_levels = []
+        duration = bpm = None
+
+        i, n = 0, len(tokens)
+        while i < n:
+            token = tokens[i]
+
+            if token[0].isdigit() and i + 1 < n:
+                unit = tokens[i + 1]
+                if unit in BPM_UNITS:
+                    bpm = int(float(token))
+                    i += 2
+                    continue
+                if unit in DURATION_UNITS:
+                    duration = float(token) * DURATION_UNITS[unit]
+                    i += 2
+                    continue
+
+            matches, end = self._longest_match(tokens, i)
+            if matches is None:
+                i += 1
+                continue
+
+            for field, value in matches:
+                if field == "instruments":
+                    if value not in instruments:
+                        instruments.append(value)
+                elif field == "energy":
+                    energy_levels.append(value)
+                else:
+                    votes[field][value] = votes[field].get(value, 0) + 1
+            i = end
+
+        return self._build(votes, instruments, energy_levels, duration, bpm)
+
+    def _longest_match(self, tokens, start):
+        node, matches, end = self.trie, None, start
+        for j in range(start, min(len(tokens), start + self.max_phrase_words)):
+            word = tokens[j]
+            child = node.get(word)
+            if child is None and word.endswith("s"):
+                child = node.get(word[:-1])
+            if child is None:
+                break
+            node = child
+            if _MATCHES in node:
+                matches, end = node[_MATCHES], j + 1
+        return matches, end
+
+    def _build(self, votes, instruments, energy_levels, duration, bpm):
+        params = {}
+        confidence = {}
+
+        for field in VOTED_FIELDS:
+            counts = votes[field]
+            if counts:
+                # max() keeps the first value seen on ties
+                value = max(counts, key=counts.get)
+                params[field] = value
+                confidence[field] = round(counts[value] / sum(counts.values()), 2)
+            else:
+                params[field] = self.defaults[field]
+                confidence[field] = 0.0
+
+        if bpm is not None:
+            low, high = self.bpm_range
+            bpm = min(max(bpm, low), high)
+            params["bpm"] = bpm
+            params["tempo"] = self._tempo_for_bpm(bpm)
+            confidence["tempo"] = 1.0
+
+        if energy_levels:
+            params["energy"] = round(sum(energy_levels) / len(energy_levels))
+            confidence["energy"] = 1.0
+        elif confidence["mood"] > 0 and params["mood"] in self.mood_energy:
+            params["energy"] = self.mood_energy[params["mood"]]
+            confidence["energy"] = 0.5
+        else:
+            params["energy"] = self.defaults["energy"]
+            confidence["energy"] = 0.0
+
+        params["instruments"] = instruments or list(self.defaults["instruments"])
+        confidence["instruments"] = 1.0 if instruments else 0.0
+
+        if duration is not None:
+            low, high = self.duration_range
+            params["duration"] = min(max(duration, low), high)
+            confidence["duration"] = 1.0
+
+        params["confidence"] = confidence
+        params["source"] = "lexicon"
+        return params
+
+    def _tempo_for_bpm(self, bpm):
+        for tempo, (low, high) in self.tempo_bpm.items():
+            if low <= bpm < high:
+                return tempo
+        return self.defaults["tempo"]
+
+
+_default_parser = None
+_default_lock = threading.Lock()
+
+
+def default_parser():
+    """
+    Parser for data/lexicon.json, compiled on first use and shared.
+    """
+    global _default_parser
+    if _default_parser is None:
+        with _default_lock:
+            if _default_parser is None:
+                _default_parser = LexiconParser.from_file()
+    return _default_parser
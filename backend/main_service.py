@@ -1,7 +1,26 @@
+import time
 import logging
+import threading
+import importlib.util
+from pathlib import Path
+from functools import partial
+from contextlib import nullcontext
 
+from backend import metrics
+from backend.admission import AdmissionGate, estimate_cost
+from backend.audio_serving import audio_url
+from backend.cancellation import GenerationCancelled
+from backend.catalog import open_catalog
 from backend.input_processor import InputProcessor
 from backend.prompt_enhancer import PromptEnhancer
+from backend.generation_cache import GenerationCache, generation_key
+from backend.generation_params import (
+    DRAFT_MODEL, apply_tier, checkpoint_name, inference_mode, load_config,
+    quality_tier, resolve_request
+)
+from backend.model_registry import ModelRegistry
+from backend.output_store import OutputStore, output_id_from_path
+from backend.single_flight import SingleFlight
 
 # --------------------------------------------------
 # LOGGING
@@ -14,36 +33,225 @@ logging.basicConfig(
 INIT_ERROR = None
 
 # --------------------------------------------------
-# SAFE IMPORT: MusicGenerator
+# SAFE IMPORT CHECK: MusicGenerator
+# torch / transformers are only imported when the first model is loaded,
+# so importing this module (frontend, API, tests) stays cheap.
 # --------------------------------------------------
-try:
-    from backend.music_generator import MusicGenerator
-except Exception as e:
-    MusicGenerator = None
-    INIT_ERROR = str(e)
+if importlib.util.find_spec("torch") is None:
+    INIT_ERROR = "PyTorch is not installed"
 
 # --------------------------------------------------
-# SAFE INITIALIZATION
+# LAZY INITIALIZATION
 # --------------------------------------------------
-try:
-    input_processor = InputProcessor()
-    prompt_enhancer = PromptEnhancer()
-except Exception as e:
-    raise RuntimeError(f"Backend initialization failed: {e}")
+config = None
+input_processor = None
+prompt_enhancer = None
+generation_cache = None
+model_registry = None
+output_store = None
+draft_generator = None
+catalog = None
+admission_gate = None
+
+# Generations in progress in this process, by cache key
+single_flight = SingleFlight()
+
+# Filled in as the backend starts; served on GET /startup
+STARTUP_REPORT = {}
+
+_init_lock = threading.Lock()
+
+
+def init_backend():
+    """
+    Build the pipeline components on first use. Safe to call repeatedly.
+    """
+    global config, input_processor, prompt_enhancer
+    global generation_cache, model_registry, output_store, catalog
+    global admission_gate
+
+    if config is not None:
+        return
+
+    with _init_lock:
+        if config is not None:
+            return
+
+        start = time.time()
+        try:
+            loaded_config = load_config()
+            metrics.configure(**loaded_config.get("metrics", {}))
+            input_processor = InputProcessor(
+                **loaded_config.get("input_processing", {})
+            )
+            prompt_enhancer = PromptEnhancer()
+
+            cache_cfg = loaded_config.get("cache", {})
+            generation_cache = (
+                GenerationCache(
+                    root=cache_cfg.get("dir", "outputs/cache"),
+                    max_bytes=cache_cfg.get("max_bytes", 2 * 1024 ** 3)
+                )
+                if cache_cfg.get("enabled", True) else None
+            )
+
+            outputs_cfg = loaded_config.get("outputs", {})
+            output_store = OutputStore(
+                outputs_cfg.get("db_path", "outputs/outputs.sqlite")
+            )
+
+            catalog = (
+                open_catalog(loaded_config)
+                if loaded_config.get("catalog", {}).get("enabled", False) else None
+            )
+
+            # Bounds generations run on callers' threads; the API's
+            # BatchScheduler has an admission queue of its own
+            admission_cfg = loaded_config.get("admission", {})
+            admission_gate = AdmissionGate(
+                max_active=admission_cfg.get("max_active", 1),
+                **admission_cfg.get("queue", {})
+            )
+        except Exception as e:
+            raise RuntimeError(f"Backend initialization failed: {e}")
+
+        # Models are loaded lazily, on the first request that asks for them
+        if INIT_ERROR is None:
+            models_cfg = loaded_config.get("models", {})
+            model_registry = ModelRegistry(
+                _load_generator,
+                memory_budget_mb=models_cfg.get("memory_budget_mb", 8192),
+                size_estimates_mb={
+                    entry["checkpoint"]: entry.get("size_mb", 0)
+                    for entry in models_cfg.get("available", {}).values()
+                }
+            )
+
+        STARTUP_REPORT["init_sec"] = round(time.time() - start, 3)
+        config = loaded_config
+
+
+def _load_generator(checkpoint):
+    start = time.time()
+    from backend.music_generator import MusicGenerator, configure_threads
+    STARTUP_REPORT.setdefault("import_sec", round(time.time() - start, 3))
+
+    inference_cfg = config.get("inference", {})
+    configure_threads(
+        inference_cfg.get("intra_op_threads"),
+        inference_cfg.get("inter_op_threads")
+    )
+
+    start = time.time()
+    mode = inference_mode(checkpoint, config)
+    generator = MusicGenerator(checkpoint, inference_mode=mode)
+    STARTUP_REPORT.setdefault("weight_load_sec", {})[checkpoint] = round(
+        time.time() - start, 3
+    )
+    STARTUP_REPORT.setdefault("inference_mode", {})[checkpoint] = mode
+    return generator
+
+
+def warm_up(models=None) -> dict:
+    """
+    Explicit warm-up hook for servers: loads the given models (default
+    model if None) and runs one short decode on each, so the first real
+    request pays neither import, weight-load nor first-token latency.
+    """
+    start = time.time()
+    init_backend()
+
+    save_snapshots = config.get("startup", {}).get("save_snapshots", False)
+
+    for model in models or [None]:
+        generator = get_generator(model)
+        STARTUP_REPORT.setdefault("warm_up", {})[generator.model_name] = (
+            generator.warm_up()
+        )
+
+        from backend.music_generator import snapshot_path
+        if (save_snapshots and generator.inference_mode != "int8"
+                and not snapshot_path(generator.model_name).exists()):
+            logging.info(f"Saved snapshot to {generator.save_snapshot()}")
+
+    STARTUP_REPORT["ready_sec"] = round(time.time() - start, 3)
+    logging.info(f"Backend warm: {STARTUP_REPORT}")
+    return STARTUP_REPORT
+
+
+def cache_stats() -> dict:
+    init_backend()
+    return generation_cache.stats() if generation_cache else {"enabled": False}
+
+
+def admission_stats() -> dict:
+    init_backend()
+    return admission_gate.stats()
+
+
+def catalog_stats() -> dict:
+    init_backend()
+    return catalog.stats() if catalog else {"enabled": False}
+
+
+def model_stats() -> dict:
+    init_backend()
+    return model_registry.stats() if model_registry else {"loaded": {}}
+
+
+def output_history(limit: int = 20, before: str = None) -> dict:
+    """
+    Newest-first page of generated outputs from the index; pass the
+    returned "next" cursor as `before` for the following page.
+    """
+    init_backend()
+    page = output_store.history(limit=limit, before=before)
+    for item in page["items"]:
+        item["url"] = audio_url(item["file"])
+    return page
 
-if MusicGenerator:
-    try:
-        music_generator = MusicGenerator()
-    except Exception as e:
-        music_generator = None
-        INIT_ERROR = str(e)
-else:
-    music_generator = None
+
+def touch_output(file):
+    """
+    Mark an output as just played, for least-recently-used retention.
+    """
+    init_backend()
+    output_id = output_id_from_path(file)
+    if output_id is not None:
+        output_store.touch(output_id)
+
+
+def start_output_retention():
+    """
+    Start the background retention job configured under
+    outputs.retention (no-op when disabled or already running).
+    """
+    init_backend()
+    retention = config.get("outputs", {}).get("retention", {})
+    if not retention.get("enabled", True):
+        return
+
+    max_age_days = retention.get("max_age_days")
+    output_store.start_retention(
+        interval_sec=retention.get("interval_sec", 3600),
+        max_age_sec=max_age_days * 86400 if max_age_days is not None else None,
+        max_bytes=retention.get("max_bytes")
+    )
+
+
+def metrics_text() -> str:
+    init_backend()
+    return metrics.render_prometheus()
 
 # --------------------------------------------------
 # PIPELINE FUNCTION (TASK 2.3 CONTRACT)
 # --------------------------------------------------
-def generate_music_pipeline(user_input: str) -> dict:
+def generate_music_pipeline(user_input: str, seed: int = None,
+                            progress_callback=None, model: str = None,
+                            cancel=None, tier: str = None,
+                            overrides: dict = None,
+                            use_catalog: bool = None,
+                            lane: str = "interactive") -> dict:
     """
     End-to-end backend music generation pipeline.
 
@@ -51,40 +259,521 @@ def generate_music_pipeline(user_input: str) -> dict:
     - Return a dict with audio, params, prompt
     - NEVER return None
     - Raise clear exceptions on failure
+
+    `cancel` is an optional CancellationToken; a cancelled run raises
+    GenerationCancelled unless the token keeps partial audio.
+    `tier` names a quality tier and `overrides` sets individual
+    settings on top of it (see generation_request).
+    `use_catalog` (config catalog.serve when None) answers with the
+    nearest pre-rendered catalog track when one is close enough.
+    `lane` is the admission lane ("interactive" or "batch"); raises
+    QueueFull when the admission queue has no room.
     """
 
     logging.info("Music generation pipeline started")
 
-    if music_generator is None:
+    start = time.time()
+    init_backend()
+    require_generator(model)
+    params, enhanced_prompt = prepare_request(user_input)
+    if cancel is not None:
+        cancel.raise_if_cancelled()
+
+    audio_result = serve_from_catalog(
+        params, enhanced_prompt, seed=seed, model=model, tier=tier,
+        overrides=overrides, use_catalog=use_catalog
+    )
+    if audio_result is not None:
+        response = build_response(audio_result, params, enhanced_prompt)
+        record_latency({"tier": "catalog"}, time.time() - start)
+        return response
+
+    # 3️⃣ Music generation (served from cache when possible)
+    request = generation_request(
+        params, enhanced_prompt, seed, model, cancel,
+        pending=single_flight.in_flight(), tier=tier, overrides=overrides
+    )
+    audio_result = generate_audio_batch(
+        [request], progress_callback=progress_callback, lane=lane
+    )[0]
+
+    response = build_response(audio_result, params, enhanced_prompt, request)
+    record_latency(request, time.time() - start)
+    return response
+
+
+def generate_music_batch(user_inputs: list, model: str = None,
+                         tier: str = None, overrides: dict = None,
+                         lane: str = "batch") -> list:
+    """
+    Bulk variant of generate_music_pipeline.
+
+    Runs input processing and prompt enhancement per input, then decodes
+    all prompts through MusicGenerator.generate_batch.
+    """
+
+    logging.info(f"Batch pipeline started for {len(user_inputs)} inputs")
+
+    init_backend()
+    require_generator(model)
+    prepared = [prepare_request(text) for text in user_inputs]
+
+    requests = [
+        generation_request(params, enhanced_prompt, model=model,
+                           tier=tier, overrides=overrides)
+        for params, enhanced_prompt in prepared
+    ]
+    audio_results = generate_audio_batch(requests, lane=lane)
+
+    return [
+        build_response(audio_result, params, enhanced_prompt, request)
+        for audio_result, request, (params, enhanced_prompt)
+        in zip(audio_results, requests, prepared)
+    ]
+
+
+# --------------------------------------------------
+# PIPELINE STEPS
+# --------------------------------------------------
+def require_generator(model: str = None):
+    """
+    Raise unless a request for `model` can be served, by MusicGen or by
+    the draft engine (when asked for, or as the fallback; see route_model).
+    """
+    init_backend()
+    if route_model(model) != DRAFT_MODEL:
+        _require_model_registry()
+
+
+def _require_model_registry():
+    if model_registry is None:
         logging.error(f"Music generator unavailable: {INIT_ERROR}")
         raise RuntimeError(
             "Music generation is disabled. "
             "Required dependencies (PyTorch / MusicGen) are not available."
         )
 
+
+def get_generator(model: str = None):
+    """
+    MusicGenerator for a short model name or checkpoint (default if None),
+    or the DraftGenerator for DRAFT_MODEL.
+    """
+    init_backend()
+    checkpoint = checkpoint_name(model, config)
+    if checkpoint == DRAFT_MODEL:
+        return get_draft_generator()
+
+    _require_model_registry()
+
+    try:
+        return model_registry.get(checkpoint)
+    except Exception as e:
+        logging.error(f"Failed to load {checkpoint}: {e}")
+        raise RuntimeError(f"Model {checkpoint} could not be loaded: {e}")
+
+
+def get_draft_generator():
+    """
+    The shared DraftGenerator, built on first use.
+    """
+    global draft_generator
+    init_backend()
+    draft_cfg = config.get("draft", {})
+    if not draft_cfg.get("enabled", True):
+        raise RuntimeError("The draft engine is disabled")
+
+    with _init_lock:
+        if draft_generator is None:
+            from backend.draft_generator import DraftGenerator
+            draft_generator = DraftGenerator(
+                write_midi=draft_cfg.get("write_midi", True), config=config
+            )
+    return draft_generator
+
+
+def route_model(model: str = None, pending: int = 0):
+    """
+    Model name a request should run on. Requests go to the draft engine
+    when they ask for DRAFT_MODEL, when MusicGen is unavailable, or when
+    `pending` neural generations are already in flight
+    (draft.fallback_max_pending); otherwise `model` is returned as is.
+    """
+    init_backend()
+    draft_cfg = config.get("draft", {})
+    if model == DRAFT_MODEL or not draft_cfg.get("enabled", True):
+        return model
+
+    if model_registry is None and draft_cfg.get("fallback_when_unavailable", True):
+        return DRAFT_MODEL
+
+    max_pending = draft_cfg.get("fallback_max_pending")
+    if max_pending is not None and pending >= max_pending:
+        return DRAFT_MODEL
+
+    return model
+
+
+def _enhance(params):
+    # A random structure hint would give identical requests different
+    # prompts, and with them different cache and single-flight keys
+    return prompt_enhancer.enhance(
+        params, structure=prompt_enhancer.structure_for(params)
+    )[0]
+
+
+def prepare_request(user_input: str):
+    """
+    Steps 1-2 of the pipeline: returns (params, enhanced_prompt).
+    """
+    init_backend()
     # 1️⃣ Input processing
-    params = input_processor.process_input(user_input)
+    with metrics.span("input_processing"):
+        params = input_processor.process_input(user_input)
     logging.info(f"Input processed: {params}")
 
     # 2️⃣ Prompt enhancement
-    enhanced_prompt = prompt_enhancer.enhance(params, variations=1)[0]
+    with metrics.span("prompt_enhancement"):
+        enhanced_prompt = _enhance(params)
     logging.info(f"Enhanced prompt: {enhanced_prompt}")
 
-    # 3️⃣ Music generation
-    audio_result = music_generator.generate(
-        prompt=enhanced_prompt,
-        duration=params.get("duration", 30),
-        energy_level=params.get("energy", "medium"),
-        mood=params.get("mood", "calm")
+    return params, enhanced_prompt
+
+
+async def prepare_request_async(user_input: str):
+    """
+    prepare_request for the API: the LLM extraction is hedged against the
+    fallback parser without blocking the event loop.
+    """
+    init_backend()
+    with metrics.span("input_processing"):
+        params = await input_processor.process_input_async(user_input)
+    logging.info(f"Input processed: {params}")
+
+    with metrics.span("prompt_enhancement"):
+        enhanced_prompt = _enhance(params)
+    logging.info(f"Enhanced prompt: {enhanced_prompt}")
+
+    return params, enhanced_prompt
+
+
+def generation_request(params: dict, enhanced_prompt: str, seed: int = None,
+                       model: str = None, cancel=None, pending: int = 0,
+                       tier: str = None, overrides: dict = None) -> dict:
+    """
+    Build a MusicGenerator.generate_batch request from pipeline params.
+
+    `tier` picks a quality tier from config "tiers" (model, guidance,
+    sampling, max duration; the default tier for None) and `overrides`
+    replaces single settings of it (OVERRIDE_FIELDS). An explicit
+    `model` wins over the tier's. Raises ValueError for an unknown tier.
+
+    `pending` is the caller's count of neural generations in flight,
+    used by route_model to divert to the draft engine under load.
+    """
+    init_backend()
+    tier, settings = quality_tier(tier, config)
+    model = model or settings.get("model")
+
+    routed = route_model(model, pending)
+    if routed == DRAFT_MODEL and model != DRAFT_MODEL:
+        logging.info("Routing request to the draft engine")
+        metrics.inc("draft_fallbacks_total")
+
+    return apply_tier({
+        "prompt": enhanced_prompt,
+        "model": checkpoint_name(routed, config),
+        "duration": params.get("duration", 30),
+        "energy_level": params.get("energy", "medium"),
+        "mood": params.get("mood", "calm"),
+        "seed": seed,
+        "cancel": cancel,
+        # Only read by the draft engine
+        "tempo": params.get("tempo"),
+        "bpm": params.get("bpm"),
+        "instruments": params.get("instruments"),
+        "tier": tier,
+        "latency_target_sec": settings.get("latency_target_sec")
+    }, settings, overrides)
+
+
+def serve_from_catalog(params: dict, enhanced_prompt: str, seed: int = None,
+                       model: str = None, tier: str = None,
+                       overrides: dict = None, use_catalog: bool = None):
+    """
+    The nearest pre-rendered catalog track as an audio result, or None
+    to generate live. Only default requests are served: an explicit
+    seed, model, non-default tier or override asks for a specific
+    rendering that a catalog neighbour is not.
+    """
+    init_backend()
+    if use_catalog is None:
+        use_catalog = config.get("catalog", {}).get("serve", False)
+    if not use_catalog or catalog is None:
+        return None
+
+    default_tier = config.get("tiers", {}).get("default")
+    if (seed is not None or model is not None or tier not in (None, default_tier)
+            or any(value is not None for value in (overrides or {}).values())):
+        return None
+
+    with metrics.span("catalog_lookup"):
+        match = catalog.nearest(params, enhanced_prompt)
+    if match is None:
+        metrics.inc("catalog_lookups_total", result="miss")
+        return None
+
+    entry, distance = match
+    if not Path(entry["file"]).exists():
+        logging.warning(f"Catalog file missing: {entry['file']}")
+        metrics.inc("catalog_lookups_total", result="missing")
+        return None
+
+    logging.info(f"Catalog hit ({distance:.3f}): {entry['file']}")
+    metrics.inc("catalog_lookups_total", result="hit")
+    # No "id": the file belongs to the catalog, so the output store
+    # does not index it (like cache hits)
+    return {
+        "file": entry["file"],
+        "duration": entry["duration"],
+        "mood": entry["mood"],
+        "energy": entry["energy"],
+        "format": entry["format"],
+        "model": entry["model"],
+        "generation_time_sec": 0.0,
+        "catalog": True,
+        "catalog_key": entry["key"],
+        "catalog_distance": round(distance, 4)
+    }
+
+
+def cache_key(request: dict) -> str:
+    job = resolve_request(request, config)
+    return generation_key(job["model"], job, config.get("postprocess", {}))
+
+
+def request_cost(request: dict) -> float:
+    return estimate_cost(request, config)
+
+
+def lookup_cache(request: dict):
+    """
+    Return the cached audio result for a generation request, or None.
+    Drafts are never cached: rendering one costs less than a lookup is
+    worth, and they would evict MusicGen entries from the byte budget.
+    """
+    init_backend()
+    if generation_cache is None or request.get("model") == DRAFT_MODEL:
+        return None
+
+    cached = generation_cache.get(cache_key(request))
+    if cached is not None:
+        logging.info(f"Cache hit: {cached['file']}")
+    metrics.inc("cache_lookups_total",
+                result="miss" if cached is None else "hit")
+    return cached
+
+
+def generate_audio_batch(requests: list, check_cache: bool = True,
+                         progress_callback=None, wait: bool = True,
+                         coalesce: bool = True, lane: str = None) -> list:
+    """
+    Step 3 for several prepared requests in one batched model call.
+    Cached requests are answered from disk and skipped by the model;
+    callers that already looked them up pass check_cache=False.
+
+    With coalesce, a request with the same cache key as one generating
+    in another thread waits for that result instead of being decoded a
+    second time, and duplicates within `requests` share one row (see
+    SingleFlight). Callers that coalesce themselves pass coalesce=False.
+
+    With wait=False, freshly generated results keep the "write_future"
+    of MusicGenerator.generate_batch (see there) and are cached once
+    their file is written.
+
+    If a requested model cannot be loaded, its requests are answered by
+    the draft engine instead (draft.fallback_when_unavailable).
+
+    With a `lane`, each model call first waits for its turn at the
+    admission gate (raising QueueFull if it is full). Callers that
+    admit requests themselves, like the BatchScheduler, pass none.
+    """
+    init_backend()
+
+    if check_cache:
+        results = [lookup_cache(request) for request in requests]
+    else:
+        results = [None] * len(requests)
+    missing = [i for i, result in enumerate(results) if result is None]
+
+    flights = {}
+    if coalesce and config.get("coalescing", {}).get("enabled", True):
+        for i in missing:
+            flights[i] = single_flight.join(
+                cache_key(requests[i]), requests[i].get("cancel")
+            )
+        missing = [i for i in missing if flights[i][2]]
+
+    # Route each request to the model it asked for
+    by_model = {}
+    for i in missing:
+        checkpoint = checkpoint_name(requests[i].get("model"), config)
+        by_model.setdefault(checkpoint, []).append(i)
+
+    try:
+        for checkpoint, indices in by_model.items():
+            generator = _generator_or_draft(checkpoint)
+            # A leader generates under its flight's token, which only
+            # fires once every request waiting on it is gone
+            batch = [
+                dict(requests[i], cancel=flights[i][0].token)
+                if i in flights else requests[i]
+                for i in indices
+            ]
+            # Drafts cost next to nothing; they skip the admission gate
+            gate_lane = None if generator is draft_generator else lane
+            with _admitted(batch, gate_lane, [requests[i] for i in indices]), \
+                    metrics.span("generation"):
+                generated = generator.generate_batch(
+                    batch, progress_callback=progress_callback, wait=wait
+                )
+            for i, result in zip(indices, generated):
+                # Cancelled, partial and draft results are never cached
+                if (generation_cache is not None and "cancelled" not in result
+                        and result.get("model") != DRAFT_MODEL):
+                    key = cache_key(requests[i])
+                    if wait:
+                        generation_cache.put(key, result)
+                    else:
+                        result["write_future"].add_done_callback(
+                            partial(_cache_written, key, dict(result))
+                        )
+                results[i] = result
+                if i in flights:
+                    flights[i][0].future.set_result(result)
+    except BaseException as e:
+        # Never leave requests coalesced onto these flights hanging
+        for i in missing:
+            if i in flights and not flights[i][0].future.done():
+                flights[i][0].future.set_exception(
+                    e if isinstance(e, Exception)
+                    else GenerationCancelled("leader interrupted")
+                )
+        raise
+
+    for i, (_, waiter, _) in flights.items():
+        results[i] = _await_flight(requests[i], waiter, progress_callback, wait)
+
+    return results
+
+
+def stream_admission(request: dict, lane: str = "interactive", cancel=None):
+    """
+    Admission for a generation the caller runs itself (streaming).
+    Raises QueueFull right away if the gate has no room; the returned
+    callable gives the context manager that waits for the turn.
+    """
+    init_backend()
+    if request.get("model") == DRAFT_MODEL:
+        return nullcontext
+    cost = request_cost(request)
+    admission_gate.check(cost, lane)
+    return partial(admission_gate.admit, cost, lane, tokens=[cancel])
+
+
+def _admitted(batch, lane, callers):
+    """
+    Context manager holding one admission gate slot for a model call on
+    `batch` (a no-op without a lane).
+    The wait is abandoned once every request of the batch is cancelled;
+    the `callers`' own tokens are watched so their deadlines fire.
+    """
+    if lane is None:
+        return nullcontext()
+    return admission_gate.admit(
+        sum(request_cost(request) for request in batch), lane,
+        tokens=[request.get("cancel") for request in batch],
+        watch=[request.get("cancel") for request in callers]
     )
 
+
+def _generator_or_draft(checkpoint):
+    try:
+        return get_generator(checkpoint)
+    except RuntimeError:
+        draft_cfg = config.get("draft", {})
+        if (checkpoint == DRAFT_MODEL or not draft_cfg.get("enabled", True)
+                or not draft_cfg.get("fallback_when_unavailable", True)):
+            raise
+    logging.warning(f"{checkpoint} unavailable; answering with drafts")
+    metrics.inc("draft_fallbacks_total")
+    return get_draft_generator()
+
+
+def _await_flight(request, waiter, progress_callback, wait):
+    cancel = request.get("cancel")
+    try:
+        result = single_flight.wait(waiter, cancel)
+        if wait and "write_future" in result:
+            result.pop("write_future").result()
+        return result
+    except GenerationCancelled as e:
+        if cancel is not None and cancel.cancelled:
+            return {"file": None, "cancelled": e.reason}
+
+    # The flight was abandoned by its leader (e.g. interrupted), not by
+    # this request: generate it here instead
+    logging.warning("Coalesced generation was interrupted; retrying")
+    return generate_audio_batch(
+        [request], progress_callback=progress_callback, wait=wait,
+        coalesce=False
+    )[0]
+
+
+def _cache_written(key, result, future):
+    if future.exception() is None:
+        result.pop("write_future", None)
+        generation_cache.put(key, result)
+
+
+def record_latency(request: dict, seconds: float):
+    """
+    Observe a request's end-to-end latency under its quality tier and
+    count misses of the tier's latency_target_sec.
+    """
+    tier = request.get("tier") or "none"
+    metrics.observe("request_latency_seconds", seconds, tier=tier)
+
+    target = request.get("latency_target_sec")
+    if target is not None and seconds > target:
+        logging.warning(
+            f"Tier {tier} missed its {target}s latency target ({seconds:.1f}s)"
+        )
+        metrics.inc("latency_target_misses_total", tier=tier)
+
+
+def build_response(audio_result, params, enhanced_prompt, request=None):
+    if audio_result and audio_result.get("file") is None and "cancelled" in audio_result:
+        raise GenerationCancelled(audio_result["cancelled"])
+
     if not audio_result or "file" not in audio_result:
         logging.error("Invalid audio result returned from generator")
         raise RuntimeError("Music generator returned invalid output.")
 
+    # Every pipeline entry point ends here once the file is written
+    output_store.record(audio_result, params=params, prompt=enhanced_prompt)
+
     # ✅ CONTRACT-COMPLIANT RETURN
-    return {
-        "audio": audio_result,     # {"file": "...wav"}
+    audio = dict(audio_result, url=audio_url(audio_result["file"]))
+    if audio.get("midi"):
+        audio["midi_url"] = audio_url(audio["midi"])
+
+    response = {
+        # {"file": "...wav", "url": "/audio/...wav"}
+        "audio": audio,
         "params": params,
         "prompt": enhanced_prompt
     }
+    if request is not None and request.get("tier"):
+        response["tier"] = request["tier"]
+    return response
@@ -0,0 +1,197 @@
+# backend/metrics.py
+"""
+In-process pipeline metrics: timed spans, counters and histograms,
+rendered in the Prometheus text format for GET /metrics.
+
+Everything is off until configure(enabled=True) is called (main_service
+does this from the "metrics" config section). While disabled, span()
+returns a shared no-op context manager and inc() / observe() return
+immediately, so the hooks can stay in the hot paths.
+"""
+
+import json
+import time
+import bisect
+import logging
+import threading
+from collections import defaultdict
+
+PREFIX = "melodai_"
+
+# Seconds; covers sub-millisecond parsing up to multi-minute decodes
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0,
+                   2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+
+_enabled = False
+_log_spans = False
+_buckets = DEFAULT_BUCKETS
+
+_lock = threading.Lock()
+_counters = defaultdict(float)    # (name, labels) -> value
+_histograms = {}                  # (name, labels) -> [bucket counts, sum, count]
+
+
+class _NoopSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NOOP_SPAN = _NoopSpan()
+
+
+class _Span:
+    __slots__ = ("stage", "labels", "start")
+
+    def __init__(self, stage, labels):
+        self.stage = stage
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, *exc):
+        record_span(self.stage, time.perf_counter() - self.start,
+                    error=exc_type is not None, **self.labels)
+        return False
+
+
+# --------------------------------------------------
+# CONFIGURATION
+# --------------------------------------------------
+def configure(enabled=True, log_spans=False, buckets=None):
+    """
+    Turn collection on or off. With log_spans every span is also logged
+    as a one-line JSON record.
+    """
+    global _enabled, _log_spans, _buckets
+    _enabled = enabled
+    _log_spans = log_spans
+    if buckets:
+        _buckets = tuple(sorted(buckets))
+
+
+def enabled():
+    return _enabled
+
+
+def reset():
+    with _lock:
+        _counters.clear()
+        _histograms.clear()
+
+
+# --------------------------------------------------
+# HOOKS
+# --------------------------------------------------
+def span(stage, **labels):
+    """
+    Context manager timing one pipeline stage into
+    stage_duration_seconds{stage=...}.
+    """
+    if not _enabled:
+        return _NOOP_SPAN
+    return _Span(stage, labels)
+
+
+def record_span(stage, seconds, error=False, **labels):
+    """
+    Record an already measured stage duration (for stages that cannot be
+    wrapped in a with-block, e.g. the two halves of model.generate).
+    """
+    if not _enabled:
+        return
+    observe("stage_duration_seconds", seconds, stage=stage, **labels)
+    if error:
+        inc("stage_errors_total", stage=stage, **labels)
+    if _log_spans:
+        logging.info(json.dumps({
+            "span": stage, "duration_sec": round(seconds, 6),
+            "error": error, **labels
+        }))
+
+
+def inc(name, value=1, **labels):
+    if not _enabled:
+        return
+    key = (name, tuple(sorted(labels.items())))
+    with _lock:
+        _counters[key] += value
+
+
+def observe(name, value, **labels):
+    if not _enabled:
+        return
+    key = (name, tuple(sorted(labels.items())))
+    with _lock:
+        histogram = _histograms.get(key)
+        if histogram is None:
+            histogram = _histograms[key] = [[0] * len(_buckets), 0.0, 0]
+        index = bisect.bisect_left(_buckets, value)
+        if index < len(_buckets):
+            histogram[0][index] += 1
+        histogram[1] += value
+        histogram[2] += 1
+
+
+# --------------------------------------------------
+# EXPORT
+# --------------------------------------------------
+def render_prometheus():
+    """
+    All counters and histograms in the Prometheus text exposition format.
+    """
+    with _lock:
+        counters = sorted(_counters.items())
+        histograms = sorted(
+            (key, (list(buckets), total, count))
+            for key, (buckets, total, count) in _histograms.items()
+        )
+
+    lines = []
+    typed = set()
+
+    for (name, labels), value in counters:
+        metric = PREFIX + name
+        if metric not in typed:
+            lines.append(f"# TYPE {metric} counter")
+            typed.add(metric)
+        lines.append(f"{metric}{_format_labels(labels)} {_format_value(value)}")
+
+    for (name, labels), (buckets, total, count) in histograms:
+        metric = PREFIX + name
+        if metric not in typed:
+            lines.append(f"# TYPE {metric} histogram")
+            typed.add(metric)
+
+        cumulative = 0
+        for bound, bucket_count in zip(_buckets, buckets):
+            cumulative += bucket_count
+            lines.append(
+                f"{metric}_bucket{_format_labels(labels, le=bound)} {cumulative}"
+            )
+        lines.append(f"{metric}_bucket{_format_labels(labels, le='+Inf')} {count}")
+        lines.append(f"{metric}_sum{_format_labels(labels)} {_format_value(total)}")
+        lines.append(f"{metric}_count{_format_labels(labels)} {count}")
+
+    return "\n".join(lines) + "\n"
+
+
+def _format_labels(labels, le=None):
+    pairs = list(labels)
+    if le is not None:
+        pairs.append(("le", le))
+    if not pairs:
+        return ""
+
+    def escape(value):
+        return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+    return "{" + ",".join(f'{key}="{escape(value)}"' for key, value in pairs) + "}"
+
+
+def _format_value(value):
+    return repr(float(value)) if value != int(value) else str(int(value))
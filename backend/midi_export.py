@@ -0,0 +1,89 @@
+# backend/midi_export.py
+
+import os
+import uuid
+import struct
+from pathlib import Path
+
+TICKS_PER_BEAT = 480
+DRUM_CHANNEL = 9
+
+
+def write_midi(path, tracks, bpm, ticks_per_beat=TICKS_PER_BEAT):
+    """
+    Write a format-1 Standard MIDI File.
+
+    `tracks` is a list of (name, channel, program, notes); notes are
+    (start_beat, length_beats, pitch, velocity) tuples. The program
+    change is skipped on the drum channel. Like the audio encoder, the
+    file is written next to `path` and renamed into place.
+    """
+    path = Path(path)
+    chunks = [_track_chunk(_tempo_events(bpm))]
+    for name, channel, program, notes in tracks:
+        chunks.append(_track_chunk(
+            _note_events(name, channel, program, notes, ticks_per_beat)
+        ))
+
+    header = b"MThd" + struct.pack(">IHHH", 6, 1, len(chunks), ticks_per_beat)
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(f".{path.name}.{uuid.uuid4().hex}.tmp")
+    try:
+        tmp.write_bytes(header + b"".join(chunks))
+        os.replace(tmp, path)
+    finally:
+        tmp.unlink(missing_ok=True)
+    return path
+
+
+def _tempo_events(bpm):
+    # The tempo meta event holds three bytes (slower than ~3.6 BPM overflows)
+    micros_per_beat = min(int(round(60_000_000 / bpm)), 0xFFFFFF)
+    return [
+        (0, b"\xff\x51\x03" + micros_per_beat.to_bytes(3, "big")),
+        # 4/4, 24 clocks per click, 8 32nds per quarter
+        (0, b"\xff\x58\x04\x04\x02\x18\x08"),
+    ]
+
+
+def _note_events(name, channel, program, notes, ticks_per_beat):
+    label = name.encode("utf-8")
+    events = [(0, b"\xff\x03" + _varlen(len(label)) + label)]
+    if channel != DRUM_CHANNEL:
+        events.append((0, bytes([0xC0 | channel, program])))
+
+    timed = []
+    for start, length, pitch, velocity in notes:
+        on = int(round(start * ticks_per_beat))
+        off = max(on + 1, int(round((start + length) * ticks_per_beat)))
+        # Sort key puts note-offs before note-ons on the same tick, so a
+        # repeated pitch is released before it is struck again
+        timed.append((on, 1, bytes([0x90 | channel, pitch, velocity])))
+        timed.append((off, 0, bytes([0x80 | channel, pitch, 0])))
+    timed.sort(key=lambda event: event[:2])
+
+    return events + [(tick, data) for tick, _, data in timed]
+
+
+def _track_chunk(events):
+    data = bytearray()
+    last = 0
+    for tick, message in events:
+        data += _varlen(tick - last) + message
+        last = tick
+    data += b"\x00\xff\x2f\x00"     # end of track
+    return b"MTrk" + struct.pack(">I", len(data)) + bytes(data)
+
+
+def _varlen(value):
+    """
+    MIDI variable-length quantity: 7 bits per byte, high bit set on all
+    but the last byte.
+    """
+    out = [value & 0x7F]
+    value >>= 7
+    while value:
+        out.append(0x80 | (value & 0x7F))
+        value >>= 7
+    return bytes(reversed(out))
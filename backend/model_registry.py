@@ -0,0 +1,111 @@
+# backend/model_registry.py
+
+import gc
+import logging
+import threading
+from collections import OrderedDict
+
+
+def model_size_mb(generator):
+    """
+    Resident size of a loaded generator's weights and buffers in MB.
+    """
+    model = generator.model
+    tensors = list(model.parameters()) + list(model.buffers())
+
+    # Dynamically quantized Linear layers keep their weights packed,
+    # outside parameters()
+    for module in model.modules():
+        packed = getattr(module, "_packed_params", None)
+        if hasattr(packed, "_weight_bias"):
+            tensors.extend(t for t in packed._weight_bias() if t is not None)
+
+    return sum(t.numel() * t.element_size() for t in tensors) / 1024 ** 2
+
+
+class ModelRegistry:
+    """
+    Lazily loaded, memory-budgeted set of MusicGenerator instances.
+
+    Models are loaded on first use and kept resident while their combined
+    size fits in `memory_budget_mb`. Before a new checkpoint is loaded the
+    least recently used models are evicted to make room for its expected
+    size (from the config), so loading never has to hold everything at once.
+    """
+
+    def __init__(self, factory, memory_budget_mb=8192, size_estimates_mb=None):
+        self.factory = factory
+        self.memory_budget_mb = memory_budget_mb
+        self.size_estimates_mb = size_estimates_mb or {}
+
+        self._lock = threading.Lock()
+        self._load_locks = {}
+        self._models = OrderedDict()   # checkpoint -> (generator, size_mb)
+
+        self.loads = 0
+        self.evictions = 0
+
+    def get(self, checkpoint):
+        """
+        Return the generator for `checkpoint`, loading it if needed.
+        """
+        with self._lock:
+            if checkpoint in self._models:
+                self._models.move_to_end(checkpoint)
+                return self._models[checkpoint][0]
+            load_lock = self._load_locks.setdefault(checkpoint, threading.Lock())
+
+        # One loader per checkpoint; other callers wait for it
+        with load_lock:
+            with self._lock:
+                if checkpoint in self._models:
+                    self._models.move_to_end(checkpoint)
+                    return self._models[checkpoint][0]
+                self._evict_for(self.size_estimates_mb.get(checkpoint, 0))
+
+            logging.info(f"Loading model {checkpoint}")
+            generator = self.factory(checkpoint)
+            size_mb = model_size_mb(generator)
+
+            with self._lock:
+                self._models[checkpoint] = (generator, size_mb)
+                self.loads += 1
+                self._evict_for(0, keep=checkpoint)
+
+        return generator
+
+    def loaded(self):
+        with self._lock:
+            return {name: round(size, 1) for name, (_, size) in self._models.items()}
+
+    def stats(self):
+        loaded = self.loaded()
+        return {
+            "loaded": loaded,
+            "resident_mb": round(sum(loaded.values()), 1),
+            "memory_budget_mb": self.memory_budget_mb,
+            "loads": self.loads,
+            "evictions": self.evictions
+        }
+
+    def _evict_for(self, incoming_mb, keep=None):
+        """
+        Evict LRU models until `incoming_mb` more fits in the budget.
+        Must be called with self._lock held.
+        """
+        def resident():
+            return sum(size for _, size in self._models.values())
+
+        evicted = False
+        while self._models and resident() + incoming_mb > self.memory_budget_mb:
+            victim = next(iter(self._models))
+            if victim == keep:
+                break
+            self._models.pop(victim)
+            self.evictions += 1
+            evicted = True
+            logging.info(f"Evicted model {victim}")
+
+        if evicted:
+            # Let the freed weights go before the next checkpoint is allocated
+            gc.collect()
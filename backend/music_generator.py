@@ -10,21 +10,195 @@ if torch is None:
     raise RuntimeError("PyTorch is not installed...")
 
 
+import math
 import time
 import json
+import threading
+import contextlib
 import numpy as np
 import soundfile as sf
 from pathlib import Path
-from transformers import MusicgenForConditionalGeneration, AutoProcessor
+from transformers import (
+    MusicgenForConditionalGeneration,
+    AutoProcessor,
+    LogitsProcessor,
+    LogitsProcessorList,
+    StoppingCriteria,
+    StoppingCriteriaList,
+)
+from backend import metrics
+from backend.audio_postprocess import AudioPostProcessor, resample
+from backend.audio_streamer import AudioChunkStreamer, StreamFinished
+from backend.encoder_cache import EncoderOutputCache
+from backend.generation_params import resolve_request
+from backend.output_store import new_output_stem
 
 # ---------------- Paths ----------------
 CONFIG_PATH = Path("config/generation_params.json")
 OUTPUT_DIR = Path("outputs/samples")
-OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
+SNAPSHOT_DIR = Path("models")
+
+# musicgen-* defaults; each MusicGenerator reads the real values from the
+# model's EnCodec config
+TOKENS_PER_SECOND = 50
+SAMPLE_RATE = 32000
+
+# fp32: full precision; bf16: bfloat16 autocast around generate;
+# int8: dynamic int8 quantization of the decoder's Linear layers (CPU only)
+INFERENCE_MODES = ("fp32", "bf16", "int8")
+
+
+class ProgressCriteria(StoppingCriteria):
+    """
+    Never stops generation; reports (tokens_generated, total_tokens) to
+    `callback` every `every` decoding steps.
+    """
+
+    def __init__(self, callback, total_tokens, every=25):
+        self.callback = callback
+        self.total_tokens = total_tokens
+        self.every = every
+        self.tokens_generated = 0
+
+    def __call__(self, input_ids, scores, **kwargs):
+        self.tokens_generated += 1
+        if (self.tokens_generated % self.every == 0
+                or self.tokens_generated == self.total_tokens):
+            self.callback(self.tokens_generated, self.total_tokens)
+        return torch.zeros(input_ids.shape[0], dtype=torch.bool,
+                           device=input_ids.device)
+
+
+class LastStepClock(StoppingCriteria):
+    """
+    Never stops generation; remembers when the last decoding step ran,
+    which splits model.generate into token decoding and EnCodec decoding.
+    """
+
+    def __init__(self):
+        self.last_step = None
+
+    def __call__(self, input_ids, scores, **kwargs):
+        self.last_step = time.perf_counter()
+        return torch.zeros(input_ids.shape[0], dtype=torch.bool,
+                           device=input_ids.device)
+
+
+class AllCancelled(Exception):
+    """Raised by CancelCriteria to leave model.generate early."""
+
+
+class CancelCriteria(StoppingCriteria):
+    """
+    Checks each row's CancellationToken every decoding step and leaves
+    generation once all of them have fired. A row cancelled earlier keeps
+    decoding with the rest of its batch (generate cannot drop rows), but
+    records how much audio it had when it was cancelled, so its partial
+    output can be cut there.
+
+    Stopping by return value would make MusicGen undo its codebook delay
+    pattern on a sequence it was not built for, so the criterion raises
+    AllCancelled instead and keeps the tokens in `input_ids`.
+    """
+
+    def __init__(self, tokens, offset_sec, frame_rate, delay_frames):
+        self.tokens = tokens
+        self.offset_sec = offset_sec
+        self.frame_rate = frame_rate
+        self.delay_frames = delay_frames
+        self.steps = 0
+        self.input_ids = None
+
+    def __call__(self, input_ids, scores, **kwargs):
+        self.steps += 1
+        self.input_ids = input_ids
+        rendered_sec = (self.offset_sec
+                        + max(0, self.steps - self.delay_frames) / self.frame_rate)
+
+        stop = True
+        for token in self.tokens:
+            if token is not None and token.cancelled:
+                token.mark_stopped(rendered_sec)
+            else:
+                stop = False
+
+        if stop:
+            raise AllCancelled()
+        return torch.zeros(input_ids.shape[0], dtype=torch.bool,
+                           device=input_ids.device)
+
+
+class RowwiseSamplingLogitsProcessor(LogitsProcessor):
+    """
+    Per-row temperature and CFG for batched generation.
+
+    HF applies a single guidance scale / temperature to the whole batch.
+    This processor runs before HF's own CFG step and rescales the
+    conditional logits of each row so that the final mix equals
+    uncond + (cond - uncond) * row_scale, then divides by the row
+    temperature (CFG is linear, so the order does not matter).
+    """
+
+    def __init__(self, temperatures, guidance_scales, base_guidance):
+        self.temperatures = torch.tensor(temperatures, dtype=torch.float32)
+        self.guidance_ratio = (
+            torch.tensor(guidance_scales, dtype=torch.float32) / base_guidance
+            if base_guidance > 1 else None
+        )
+
+    def __call__(self, input_ids, scores):
+        # rows are laid out as (batch * num_codebooks)
+        codebooks = input_ids.shape[0] // len(self.temperatures)
+        temps = self.temperatures.to(scores.device).repeat_interleave(codebooks)
+
+        if scores.shape[0] == 2 * input_ids.shape[0]:
+            cond, uncond = scores.split(input_ids.shape[0], dim=0)
+            if self.guidance_ratio is not None:
+                ratio = self.guidance_ratio.to(scores.device).repeat_interleave(codebooks)
+                cond = uncond + (cond - uncond) * ratio[:, None]
+            scores = torch.cat([cond, uncond], dim=0)
+            temps = temps.repeat(2)
+
+        return scores / temps[:, None]
+
+
+def configure_threads(intra_op_threads=None, inter_op_threads=None):
+    """
+    Set torch's intra-op and inter-op thread pools. None keeps torch's
+    default. The inter-op pool can only be sized before torch first uses
+    it, so later calls only change the intra-op pool.
+    """
+    if intra_op_threads:
+        torch.set_num_threads(intra_op_threads)
+
+    if inter_op_threads and torch.get_num_interop_threads() != inter_op_threads:
+        try:
+            torch.set_num_interop_threads(inter_op_threads)
+        except RuntimeError:
+            print("⚠️ Inter-op threads already in use; keeping "
+                  f"{torch.get_num_interop_threads()}")
+
+
+def snapshot_path(model_name):
+    """
+    Local safetensors snapshot of a checkpoint, see MusicGenerator.save_snapshot.
+    """
+    return SNAPSHOT_DIR / model_name.replace("/", "--")
+
+
+def _sampling_kwargs(job):
+    """
+    top_k / top_p for model.generate; unset ones keep the model's
+    generation_config defaults.
+    """
+    return {
+        field: job[field] for field in ("top_k", "top_p")
+        if job.get(field) is not None
+    }
 
 
 class MusicGenerator:
-    def __init__(self, model_name="facebook/musicgen-small"):
+    def __init__(self, model_name="facebook/musicgen-small", inference_mode="fp32"):
         # ✅ HARD GUARD — FAIL ONLY WHEN CLASS IS USED
         if torch is None:
             raise RuntimeError(
@@ -34,62 +208,712 @@ class MusicGenerator:
             )
 
         self.device = "cuda" if torch.cuda.is_available() else "cpu"
+        self.model_name = model_name
+
+        # Fast path: a local snapshot skips the hub round-trips entirely
+        source, load_kwargs = model_name, {}
+        if (snapshot_path(model_name) / "config.json").exists():
+            source = snapshot_path(model_name)
+            load_kwargs["local_files_only"] = True
 
         print("Loading MusicGen model...")
-        self.processor = AutoProcessor.from_pretrained(model_name)
-        self.model = MusicgenForConditionalGeneration.from_pretrained(model_name)
+        self.processor = AutoProcessor.from_pretrained(source, **load_kwargs)
+        # safetensors weights are memory-mapped and materialised directly
+        # in the target dtype, without a random-init pass first
+        self.model = MusicgenForConditionalGeneration.from_pretrained(
+            source,
+            torch_dtype=torch.float32,
+            low_cpu_mem_usage=True,
+            **load_kwargs
+        )
         self.model.to(self.device)
         self.model.eval()
+        self._apply_inference_mode(inference_mode)
 
         with open(CONFIG_PATH, "r") as f:
             self.config = json.load(f)
+        self._init_pipeline()
 
         print("MusicGenerator ready")
 
-    def generate(self, prompt, duration=30, energy_level="medium", mood="calm"):
-        start_time = time.time()
+    @classmethod
+    def from_model(cls, model, processor, model_name, inference_mode="fp32",
+                   config=None):
+        """
+        Wrap an already built model and processor, e.g. a small random
+        model for benchmarks, skipping from_pretrained.
+        """
+        generator = cls.__new__(cls)
+        generator.device = str(model.device)
+        generator.model_name = model_name
+        generator.model = model.eval()
+        generator.processor = processor
+
+        if config is None:
+            with open(CONFIG_PATH, "r") as f:
+                config = json.load(f)
+        generator.config = config
+
+        generator._apply_inference_mode(inference_mode)
+        generator._init_pipeline()
+        return generator
 
-        energy_cfg = self.config["energy_mapping"][energy_level]
-        temperature = energy_cfg["temperature"]
-        cfg_coef = energy_cfg["cfg_coef"]
+    def _init_pipeline(self):
+        audio_cfg = self.model.config.audio_encoder
+        self.sample_rate = audio_cfg.sampling_rate
+        self.frame_rate = audio_cfg.frame_rate
+
+        cache_cfg = dict(self.config.get("encoder_cache", {}))
+        self.encoder_cache = (
+            EncoderOutputCache(**cache_cfg)
+            if cache_cfg.pop("enabled", True) else None
+        )
+
+        self.postprocessor = AudioPostProcessor(
+            self.sample_rate, **self.config.get("postprocess", {})
+        )
+
+    def _apply_inference_mode(self, inference_mode):
+        if inference_mode not in INFERENCE_MODES:
+            raise ValueError(
+                f"Unknown inference mode {inference_mode!r}, "
+                f"expected one of {INFERENCE_MODES}"
+            )
+
+        if inference_mode == "int8" and self.device != "cpu":
+            print("⚠️ int8 dynamic quantization is CPU only; using fp32")
+            inference_mode = "fp32"
+
+        if inference_mode == "int8":
+            # Only the decoder: it runs once per token and dominates the
+            # cost. T5 runs once per prompt and EnCodec is conv-heavy.
+            torch.ao.quantization.quantize_dynamic(
+                self.model.decoder, {torch.nn.Linear},
+                dtype=torch.qint8, inplace=True
+            )
+
+        self.inference_mode = inference_mode
+
+    def _autocast(self):
+        if self.inference_mode == "bf16":
+            return torch.autocast(device_type=self.device, dtype=torch.bfloat16)
+        return contextlib.nullcontext()
+
+    def save_snapshot(self):
+        """
+        Write the loaded checkpoint as a local safetensors snapshot, used
+        by later loads of the same model name.
+        """
+        if self.inference_mode == "int8":
+            raise RuntimeError("Snapshots must be saved from unquantized weights")
+        path = snapshot_path(self.model_name)
+        self.model.save_pretrained(path, safe_serialization=True)
+        self.processor.save_pretrained(path)
+        return path
+
+    def warm_up(self, max_new_tokens=10):
+        """
+        Run one tiny decode so kernels, allocator pools and lazy init are
+        done before the first real request. Returns its latencies.
+        """
+        first_step = {}
+        start = time.time()
+
+        def on_step(tokens, total):
+            first_step.setdefault("at", time.time())
 
         inputs = self.processor(
-            text=[prompt],
+            text=["warm up"],
             return_tensors="pt",
             padding=True
         ).to(self.device)
 
-        with torch.no_grad():
-            audio = self.model.generate(
+        with torch.no_grad(), self._autocast():
+            self.model.generate(
                 **inputs,
-                max_new_tokens=duration * 50,
-                temperature=temperature,
-                guidance_scale=cfg_coef
+                max_new_tokens=max_new_tokens,
+                do_sample=True,
+                stopping_criteria=StoppingCriteriaList([
+                    ProgressCriteria(on_step, max_new_tokens, every=1)
+                ])
             )
 
-        # ✅ Extract mono channel safely
-        audio_np = audio[0, 0].cpu().numpy().astype(np.float32)
+        return {
+            "first_token_sec": round(first_step["at"] - start, 3),
+            "decode_sec": round(time.time() - start, 3)
+        }
+
+    def generate(self, prompt, duration=30, energy_level="medium", mood="calm"):
+        return self.generate_batch([{
+            "prompt": prompt,
+            "duration": duration,
+            "energy_level": energy_level,
+            "mood": mood
+        }])[0]
 
-        # ✅ Normalize
-        peak = np.max(np.abs(audio_np))
-        if peak > 0:
-            audio_np /= peak
+    def generate_batch(self, requests, progress_callback=None, wait=True,
+                       keep_audio=False):
+        """
+        Generate several prompts with as few model.generate calls as possible.
 
-        file_path = OUTPUT_DIR / f"{mood}_{energy_level}_{int(time.time())}.wav"
+        Each request is a dict with "prompt" and optional "duration",
+        "energy_level", "mood", "seed", "temperature", "cfg_coef",
+        "top_k" and "top_p" overrides.
+        Returns one result dict per request, in the same order.
+        progress_callback(tokens_generated, total_tokens) is called
+        periodically during each model call.
 
-        # ✅ Safe WAV write
-        sf.write(
-            file=str(file_path),
-            data=audio_np,
-            samplerate=32000,
-            subtype="PCM_16"
+        Files are encoded in the background while later groups decode.
+        With wait=False the call returns as soon as decoding is done and
+        each result carries a "write_future" that resolves once its file
+        exists; the caller must wait on it before using the file.
+
+        A request may carry a CancellationToken as "cancel". Cancelled
+        requests come back as {"cancelled": reason, "file": None, ...}
+        without a write_future, or, if the token keeps partial audio, as
+        a normal result cut at the cancellation point and marked
+        "partial". The model call stops as soon as every row in it is
+        cancelled.
+
+        With keep_audio, each result also holds the raw decoded "audio"
+        (float32 at the model rate, before post-processing), e.g. to feed
+        continue_audio later.
+        """
+        jobs = [self.resolve_request(req) for req in requests]
+        results = [None] * len(jobs)
+
+        for group in self._group_jobs(jobs):
+            for index, result in self._generate_group(
+                group, progress_callback=progress_callback, keep_audio=keep_audio
+            ):
+                results[index] = result
+
+        if wait:
+            for result in results:
+                future = result.pop("write_future", None)
+                if future is not None:
+                    future.result()
+
+        return results
+
+    def resolve_request(self, req):
+        return resolve_request(dict(req, model=self.model_name), self.config)
+
+    def _group_jobs(self, jobs):
+        """
+        Split jobs into model calls.
+
+        Temperature and CFG are handled per row, so only jobs that need
+        CFG are kept apart from those that don't (mixing them would double
+        the decode batch for everyone), and groups are capped at
+        max_batch_size. top_k / top_p apply to a whole model.generate
+        call, so jobs only share one when those match. Every row decodes
+        the longest duration of its call, so jobs are also grouped by
+        duration bucket (batching.duration_bucket_sec, as in the
+        BatchScheduler). Seeded jobs run on their own so that the sampled
+        output does not depend on what else was in the batch.
+        """
+        batching = self.config.get("batching", {})
+        max_batch = batching.get("max_batch_size", 8)
+        bucket_sec = batching.get("duration_bucket_sec", 10)
+        groups = {}
+
+        for index, job in enumerate(jobs):
+            key = (job["cfg_coef"] > 1, job["top_k"], job["top_p"],
+                   math.ceil(job["duration"] / bucket_sec),
+                   index if job["seed"] is not None else None)
+            groups.setdefault(key, []).append((index, job))
+
+        for members in groups.values():
+            for i in range(0, len(members), max_batch):
+                yield members[i:i + max_batch]
+
+    def _generate_group(self, group, progress_callback=None, keep_audio=False):
+        start_time = time.time()
+
+        # Requests cancelled while queued are answered without decoding
+        live = []
+        for index, job in group:
+            if job["cancel"] is not None and job["cancel"].cancelled:
+                yield index, self._cancelled_result(job, len(group))
+            else:
+                live.append((index, job))
+        if not live:
+            return
+
+        jobs = [job for _, job in live]
+
+        if jobs[0]["seed"] is not None:
+            torch.manual_seed(jobs[0]["seed"])
+
+        audio = self._render(
+            jobs,
+            max(job["duration"] for job in jobs),
+            progress_callback=progress_callback
         )
 
+        generation_time = round(time.time() - start_time, 2)
+
+        # Shorter requests are trimmed by their length, cancelled ones
+        # where they were stopped
+        kept = []
+        for row, (index, job) in enumerate(live):
+            seconds = job["duration"]
+            token = job["cancel"]
+            if token is not None and token.stopped_at_sec is not None:
+                seconds = min(seconds, token.stopped_at_sec,
+                              audio.shape[1] / self.sample_rate)
+                if not token.keep_partial or seconds <= 0:
+                    yield index, self._cancelled_result(job, len(group))
+                    continue
+            kept.append((row, index, job, seconds))
+
+        if not kept:
+            return
+
+        # The whole group is post-processed as one array
+        writes = self._write_batch(
+            audio[[row for row, _, _, _ in kept]],
+            [min(int(seconds * self.sample_rate), audio.shape[1])
+             for _, _, _, seconds in kept],
+            [job for _, _, job, _ in kept],
+            [""] * len(kept)
+        )
+
+        for (row, index, job, seconds), (output_id, file_path, future) in zip(kept, writes):
+            result = {
+                "id": output_id,
+                "file": str(file_path),
+                "duration": job["duration"],
+                "mood": job["mood"],
+                "energy": job["energy_level"],
+                "format": self.postprocessor.format,
+                "sample_rate": self.postprocessor.output_sample_rate,
+                "generation_time_sec": generation_time,
+                "batch_size": len(group),
+                "model": self.model_name.split("/")[-1],
+                "write_future": future
+            }
+            if seconds < job["duration"]:
+                result.update(duration=round(seconds, 2), partial=True,
+                              cancelled=job["cancel"].reason)
+            if keep_audio:
+                result["audio"] = audio[row, :int(seconds * self.sample_rate)].copy()
+            yield index, result
+
+    def _cancelled_result(self, job, batch_size):
+        return {
+            "file": None,
+            "cancelled": job["cancel"].reason,
+            "mood": job["mood"],
+            "energy": job["energy_level"],
+            "batch_size": batch_size,
+            "model": self.model_name.split("/")[-1]
+        }
+
+    def extend(self, prompt, audio_path, extend_duration=30,
+               energy_level="medium", mood="calm"):
+        """
+        Continue an existing track by `extend_duration` seconds and write
+        the full (original + continuation) track to a new file. The
+        original's fade-out tail is dropped before it becomes the prompt.
+        """
+        base_audio, sample_rate = sf.read(str(audio_path), dtype="float32",
+                                          always_2d=True)
+        prefix, _ = resample(base_audio.mean(axis=1)[None, :], [len(base_audio)],
+                             sample_rate, self.sample_rate)
+
+        # The file is post-processed: without its fade-out, the model
+        # would continue from (and the track would keep) a fade to silence
+        fade_out = int(self.postprocessor.fade_out_sec * self.sample_rate)
+        prefix = prefix[:, :max(prefix.shape[1] - fade_out, 0)]
+
+        result = self.continue_audio(
+            {"prompt": prompt, "energy_level": energy_level, "mood": mood},
+            prefix[0], extend_duration
+        )
+        result["extended_from"] = str(audio_path)
+        return result
+
+    def continue_audio(self, request, audio, extend_duration, suffix="_extended"):
+        """
+        Continue `audio` (mono float32 at the model sample rate, before
+        post-processing) by `extend_duration` seconds and write the full
+        track. `request` is a generate_batch request dict; its duration is
+        ignored.
+        """
+        start_time = time.time()
+        job = self.resolve_request(dict(request, duration=extend_duration))
+
+        rendered = self._render([job], extend_duration, prefix=audio[None, :])
+        output_id, file_path = self._write_audio(rendered[0], job, suffix)
+
         return {
+            "id": output_id,
             "file": str(file_path),
-            "duration": duration,
-            "mood": mood,
-            "energy": energy_level,
+            "duration": round(rendered.shape[1] / self.sample_rate, 2),
+            "mood": job["mood"],
+            "energy": job["energy_level"],
             "generation_time_sec": round(time.time() - start_time, 2),
-            "model": "musicgen-small"
+            "model": self.model_name.split("/")[-1]
         }
+
+    def _render(self, jobs, duration, prefix=None, progress_callback=None):
+        """
+        Generate `duration` seconds of audio per job as a (batch, samples)
+        array, appended to `prefix` (batch, samples) if given.
+
+        Long tracks are built from windows of at most long_form.window_sec:
+        each window after the first is conditioned on the last context_sec
+        of audio through MusicGen's audio-prompt continuation, and joined
+        with a short crossfade. Attention length, KV cache and per-step
+        cost therefore stay bounded whatever the total duration.
+        """
+        long_form = self.config.get("long_form", {})
+        window = long_form.get("window_sec", 30)
+        context = long_form.get("context_sec", 10)
+        crossfade = int(long_form.get("crossfade_sec", 0.5) * self.sample_rate)
+
+        total_tokens = int(duration * self.frame_rate)
+        done = 0
+
+        def window_progress(offset):
+            if progress_callback is None:
+                return None
+            return lambda tokens, _: progress_callback(
+                min(offset + tokens, total_tokens), total_tokens
+            )
+
+        if prefix is None:
+            step = min(duration, window)
+            audio = self._decode(jobs, step, progress_callback=window_progress(0))
+            done = step
+        else:
+            audio = prefix
+
+        while done < duration and not self._all_cancelled(jobs):
+            step = min(window - context, duration - done)
+
+            # Whole frames only, so the re-decoded prompt lines up exactly
+            samples_per_frame = int(self.sample_rate // self.frame_rate)
+            prompt_samples = min(int(context * self.sample_rate), audio.shape[1])
+            prompt_samples -= prompt_samples % samples_per_frame
+            audio_prompt = audio[:, audio.shape[1] - prompt_samples:]
+
+            continuation = self._decode(
+                jobs, step,
+                audio_prompt=audio_prompt,
+                progress_callback=window_progress(int(done * self.frame_rate)),
+                offset_sec=done
+            )
+            if continuation.shape[1] <= audio_prompt.shape[1]:
+                # Cancelled before any new audio
+                break
+            audio = self._stitch(audio, continuation,
+                                 audio_prompt.shape[1], crossfade)
+            done += step
+
+        return audio
+
+    @staticmethod
+    def _all_cancelled(jobs):
+        return all(job.get("cancel") is not None and job["cancel"].cancelled
+                   for job in jobs)
+
+    def _text_conditioning(self, prompts, guidance_scale):
+        """
+        model.generate kwargs with precomputed T5 states for `prompts`, so
+        generate skips the text encoder. States come from the encoder
+        cache where possible; only the missing prompts are tokenized and
+        encoded (as one batch).
+        """
+        if self.encoder_cache is None:
+            with metrics.span("tokenization"):
+                return self.processor(
+                    text=prompts, return_tensors="pt", padding=True
+                ).to(self.device)
+
+        keys = {p: (self.model_name, self.inference_mode, p) for p in prompts}
+        states = {p: self.encoder_cache.get(keys[p]) for p in set(prompts)}
+        missing = [p for p in states if states[p] is None]
+
+        if missing:
+            with metrics.span("tokenization"):
+                inputs = self.processor(
+                    text=missing, return_tensors="pt", padding=True
+                ).to(self.device)
+            with torch.no_grad(), self._autocast(), metrics.span("text_encoding"):
+                hidden = self.model.text_encoder(
+                    input_ids=inputs["input_ids"],
+                    attention_mask=inputs["attention_mask"]
+                ).last_hidden_state
+
+            # T5 pads on the right, and padding does not change the states
+            # of real tokens, so each prompt is stored unpadded
+            for row, prompt in enumerate(missing):
+                length = int(inputs["attention_mask"][row].sum())
+                states[prompt] = hidden[row, :length].float().cpu()
+                self.encoder_cache.put(keys[prompt], states[prompt])
+
+        length = max(states[p].shape[0] for p in prompts)
+        hidden = torch.zeros(len(prompts), length, states[prompts[0]].shape[-1])
+        attention_mask = torch.zeros(len(prompts), length, dtype=torch.long)
+        for row, prompt in enumerate(prompts):
+            tokens = states[prompt].shape[0]
+            hidden[row, :tokens] = states[prompt]
+            attention_mask[row, :tokens] = 1
+
+        # generate only adds the unconditional (all-zero) half for CFG when
+        # it runs the encoder itself
+        if guidance_scale > 1:
+            hidden = torch.cat([hidden, torch.zeros_like(hidden)])
+            attention_mask = torch.cat([attention_mask, torch.zeros_like(attention_mask)])
+
+        return {
+            # Only sets the batch size; never encoded
+            "input_ids": torch.zeros(len(prompts), 1, dtype=torch.long,
+                                     device=self.device),
+            "attention_mask": attention_mask.to(self.device),
+            "encoder_outputs": (hidden.to(self.device),)
+        }
+
+    def _decode(self, jobs, seconds, audio_prompt=None, progress_callback=None,
+                offset_sec=0.0):
+        """
+        One model.generate call for `jobs`; returns (batch, samples) float32.
+        `offset_sec` is how much of the track earlier calls already
+        rendered, for recording where cancelled rows stopped.
+        """
+        base_guidance = max(job["cfg_coef"] for job in jobs)
+
+        inputs = self._text_conditioning(
+            [job["prompt"] for job in jobs], base_guidance
+        )
+
+        if audio_prompt is not None:
+            inputs["input_values"] = torch.from_numpy(
+                np.ascontiguousarray(audio_prompt[:, None, :])
+            ).to(self.device)
+
+        logits_processor = LogitsProcessorList([
+            RowwiseSamplingLogitsProcessor(
+                temperatures=[job["temperature"] for job in jobs],
+                guidance_scales=[job["cfg_coef"] for job in jobs],
+                base_guidance=base_guidance
+            )
+        ])
+
+        max_new_tokens = self._max_new_tokens(seconds)
+
+        stopping_criteria = StoppingCriteriaList()
+        if progress_callback is not None:
+            stopping_criteria.append(
+                ProgressCriteria(progress_callback, max_new_tokens)
+            )
+
+        cancel = None
+        tokens = [job.get("cancel") for job in jobs]
+        if any(token is not None for token in tokens):
+            cancel = CancelCriteria(
+                tokens, offset_sec, self.frame_rate,
+                delay_frames=self.model.decoder.num_codebooks - 1
+            )
+            stopping_criteria.append(cancel)
+
+        clock = None
+        if metrics.enabled():
+            clock = LastStepClock()
+            stopping_criteria.append(clock)
+        start = time.perf_counter()
+
+        try:
+            with torch.no_grad(), self._autocast():
+                audio = self.model.generate(
+                    **inputs,
+                    max_new_tokens=max_new_tokens,
+                    do_sample=True,
+                    guidance_scale=base_guidance if base_guidance > 1 else 1.0,
+                    logits_processor=logits_processor,
+                    stopping_criteria=stopping_criteria,
+                    **_sampling_kwargs(jobs[0])
+                )
+        except AllCancelled:
+            if not any(token is not None and token.keep_partial for token in tokens):
+                return np.zeros((len(jobs), 0), dtype=np.float32)
+            return self._decode_partial(cancel.input_ids, len(jobs))
+
+        if clock is not None and clock.last_step is not None:
+            metrics.record_span("token_decoding", clock.last_step - start)
+            metrics.record_span("encodec_decoding",
+                                time.perf_counter() - clock.last_step)
+            metrics.inc("tokens_generated_total", len(jobs) * max_new_tokens,
+                        model=self.model_name)
+
+        # ✅ Extract mono channel
+        return audio[:, 0].float().cpu().numpy()
+
+    def _decode_partial(self, input_ids, batch_size):
+        """
+        EnCodec-decode the complete frames of an interrupted generate call
+        (same layout as its normal output, audio prompt included).
+        """
+        num_codebooks = self.model.decoder.num_codebooks
+        ids = input_ids.reshape(batch_size, num_codebooks, -1)
+
+        # Position 0 holds BOS; codebook k is delayed by k steps
+        frames = max(0, ids.shape[-1] - num_codebooks)
+        if frames == 0:
+            return np.zeros((batch_size, 0), dtype=np.float32)
+
+        codes = torch.stack(
+            [ids[:, k, k + 1:frames + k + 1] for k in range(num_codebooks)], dim=1
+        )
+        with torch.no_grad():
+            audio = self.model.audio_encoder.decode(
+                codes[None], audio_scales=[None] * batch_size
+            ).audio_values
+        return audio[:, 0].float().cpu().numpy()
+
+    @staticmethod
+    def _stitch(audio, continuation, prompt_samples, crossfade):
+        """
+        Append a continuation whose first `prompt_samples` re-decode the
+        tail of `audio`, crossfading into the re-decoded tail first.
+        """
+        crossfade = min(crossfade, prompt_samples, audio.shape[1])
+        if crossfade > 0:
+            ramp = np.linspace(0.0, 1.0, crossfade, dtype=np.float32)
+            tail = continuation[:, prompt_samples - crossfade:prompt_samples]
+            audio = np.concatenate([
+                audio[:, :-crossfade],
+                audio[:, -crossfade:] * (1 - ramp) + tail * ramp
+            ], axis=1)
+
+        return np.concatenate([audio, continuation[:, prompt_samples:]], axis=1)
+
+    def _max_new_tokens(self, seconds):
+        # The codebook delay pattern costs num_codebooks - 1 frames per call
+        return int(seconds * self.frame_rate) + self.model.decoder.num_codebooks - 1
+
+    def generate_stream(self, prompt, duration=30, energy_level="medium",
+                        mood="calm", chunk_sec=1.5, output_file=None, cancel=None,
+                        **sampling):
+        """
+        Yield float32 audio chunks of roughly `chunk_sec` seconds while the
+        model is still decoding.
+
+        Like _render, tracks longer than long_form.window_sec are decoded
+        window by window, each window prompted with the last context_sec
+        of the one before (as codes, so nothing is re-encoded), which keeps
+        attention length and KV cache bounded whatever the duration.
+
+        Chunks are clipped rather than peak-normalized, because the track
+        peak is unknown until the end. If `output_file` is given the chunks
+        are also appended to that WAV as they arrive. A fired `cancel`
+        token ends the stream early, after the audio decoded so far.
+        `sampling` takes the same temperature / cfg_coef / top_k / top_p
+        overrides as generate_batch requests.
+        """
+        job = self.resolve_request(dict(
+            sampling,
+            prompt=prompt,
+            duration=duration,
+            energy_level=energy_level,
+            mood=mood
+        ))
+        long_form = self.config.get("long_form", {})
+        window = long_form.get("window_sec", 30)
+        context = long_form.get("context_sec", 10)
+
+        streamer = AudioChunkStreamer(
+            self.model, chunk_frames=max(1, int(chunk_sec * self.frame_rate))
+        )
+
+        inputs = self._text_conditioning([job["prompt"]], job["cfg_coef"])
+
+        def generate_window(offset_sec, seconds, prompt_codes):
+            streamer.start_window(self._max_new_tokens(seconds), prompt_codes,
+                                  final=offset_sec + seconds >= job["duration"])
+
+            stopping_criteria = StoppingCriteriaList([streamer])
+            if cancel is not None:
+                stopping_criteria.append(CancelCriteria(
+                    [cancel], offset_sec, self.frame_rate,
+                    delay_frames=self.model.decoder.num_codebooks - 1
+                ))
+
+            window_inputs = dict(inputs)
+            if prompt_codes is not None:
+                window_inputs["decoder_input_ids"] = prompt_codes.to(self.device)
+
+            try:
+                with torch.no_grad(), self._autocast():
+                    self.model.generate(
+                        **window_inputs,
+                        max_new_tokens=self._max_new_tokens(seconds),
+                        do_sample=True,
+                        temperature=job["temperature"],
+                        guidance_scale=job["cfg_coef"] if job["cfg_coef"] > 1 else 1.0,
+                        stopping_criteria=stopping_criteria,
+                        **_sampling_kwargs(job)
+                    )
+            except StreamFinished:
+                pass
+
+        def run():
+            done, prompt_codes = 0, None
+            try:
+                while done < job["duration"]:
+                    step = min(window if prompt_codes is None else window - context,
+                               job["duration"] - done)
+                    generate_window(done, step, prompt_codes)
+                    done += step
+
+                    frames = streamer.complete_frames()
+                    prompt_codes = streamer.frame_codes(
+                        max(0, frames - int(context * self.frame_rate)), frames
+                    )
+            except AllCancelled:
+                pass
+            except Exception as e:
+                streamer.fail(e)
+                return
+            streamer.end()
+
+        threading.Thread(target=run, daemon=True).start()
+
+        if output_file is None:
+            yield from streamer
+            return
+
+        with sf.SoundFile(str(output_file), mode="w", samplerate=self.sample_rate,
+                          channels=1, subtype="PCM_16") as wav:
+            for chunk in streamer:
+                wav.write(chunk)
+                yield chunk
+
+    def _write_batch(self, audio, lengths, jobs, suffixes):
+        """
+        Post-process a (batch, samples) array in one pass and queue each
+        row for encoding under a unique sharded path.
+        Returns one (output_id, path, future) per row.
+        """
+        audio, lengths = self.postprocessor.process(audio, lengths)
+
+        writes = []
+        for row, (job, suffix) in enumerate(zip(jobs, suffixes)):
+            output_id, stem = new_output_stem(
+                OUTPUT_DIR, f"{job['mood']}_{job['energy_level']}{suffix}"
+            )
+            file_path, future = self.postprocessor.submit(
+                audio[row, :lengths[row]], stem
+            )
+            writes.append((output_id, file_path, future))
+        return writes
+
+    def _write_audio(self, audio_np, job, suffix=""):
+        output_id, file_path, future = self._write_batch(
+            audio_np[None, :], [len(audio_np)], [job], [suffix]
+        )[0]
+        future.result()
+        return output_id, file_path
@@ -1,52 +1,161 @@
 # backend/music_variations.py
 
 import uuid
+from collections import OrderedDict
+
+# Previews whose raw audio is kept for render_preview
+MAX_STORED_PREVIEWS = 64
 
 class MusicVariationEngine:
-    def __init__(self, music_generator):
+    def __init__(self, music_generator, max_previews=MAX_STORED_PREVIEWS):
         if music_generator is None:
             raise RuntimeError("MusicGenerator unavailable")
         self.music_generator = music_generator
+        self.max_previews = max_previews
+        self._previews = OrderedDict()
 
     def generate_variations(self, base_prompt, base_params, num_variations=3):
         """
         Generate multiple musical variations by tweaking parameters.
         Returns list of audio result dicts.
         """
-        variations = []
-
-        for i in range(num_variations):
-            varied_params = base_params.copy()
-
-            # Parameter variations
-            varied_params["temperature"] = min(
-                1.5, base_params.get("temperature", 1.0) + (i * 0.15)
-            )
-            varied_params["energy"] = ["low", "medium", "high"][i % 3]
+        variations, requests = self._variation_requests(
+            base_prompt, base_params, num_variations
+        )
 
-            audio = self.music_generator.generate(
-                prompt=base_prompt,
-                duration=base_params.get("duration", 30),
-                energy_level=varied_params["energy"],
-                mood=base_params.get("mood", "calm")
-            )
+        # All variations are decoded together in one batched call
+        audios = self.music_generator.generate_batch(requests)
 
+        results = []
+        for audio, varied_params in zip(audios, variations):
             if not audio or "file" not in audio:
                 raise RuntimeError("Variation generation failed")
 
-            variations.append({
+            results.append({
                 "id": str(uuid.uuid4()),
                 "audio": audio,
                 "params": varied_params
             })
 
-        return variations
+        return results
+
+    def generate_previews(self, base_prompt, base_params, num_variations=3,
+                          preview_sec=5):
+        """
+        Phase one of preview-then-render: the same variations as
+        generate_variations, but only the first `preview_sec` seconds of
+        each, decoded in one batch. Pass the chosen result's id to
+        render_preview for the full track.
+        """
+        variations, requests = self._variation_requests(
+            base_prompt, base_params, num_variations
+        )
+        previews = [
+            dict(request, duration=min(preview_sec, request["duration"]))
+            for request in requests
+        ]
+
+        audios = self.music_generator.generate_batch(previews, keep_audio=True)
+
+        results = []
+        for audio, request, varied_params in zip(audios, requests, variations):
+            if not audio or "file" not in audio:
+                raise RuntimeError("Preview generation failed")
+
+            preview_id = str(uuid.uuid4())
+            self._store_preview(preview_id, {
+                "audio": audio.pop("audio"),
+                "request": request,
+                "params": varied_params,
+                "result": audio
+            })
+            results.append({
+                "id": preview_id,
+                "audio": audio,
+                "params": varied_params,
+                "preview": True,
+                "full_duration": request["duration"]
+            })
+
+        return results
+
+    def render_preview(self, preview_id):
+        """
+        Phase two: continue the chosen preview to its full duration.
+
+        The preview's raw decoded audio (before normalization and fades)
+        is the prefix, so only the remaining seconds are generated and the
+        full track opens with the music the user picked.
+        """
+        preview = self._previews.get(preview_id)
+        if preview is None:
+            raise KeyError(f"Unknown or expired preview {preview_id}")
+        # Least recently used previews are evicted first
+        self._previews.move_to_end(preview_id)
+
+        request = preview["request"]
+        rendered = len(preview["audio"]) / self.music_generator.sample_rate
+        remaining = request["duration"] - rendered
+
+        if remaining <= 0:
+            audio = preview["result"]
+        else:
+            audio = self.music_generator.continue_audio(
+                request, preview["audio"], remaining, suffix=""
+            )
+            if not audio or "file" not in audio:
+                raise RuntimeError("Preview render failed")
+
+        return {
+            "id": preview_id,
+            "audio": audio,
+            "params": preview["params"]
+        }
 
     def extend_music(self, prompt, base_audio_path, extend_duration=30):
         """
         Extend existing music.
-        NOTE: Placeholder for MusicGen continuation
+        Continues the track through MusicGen audio-prompt continuation.
         """
-        raise RuntimeError(
-            "Music extension requires MusicGen continuation support (GPU only)"
+        audio = self.music_generator.extend(
+            prompt=prompt,
+            audio_path=base_audio_path,
+            extend_duration=extend_duration
         )
+
+        if not audio or "file" not in audio:
+            raise RuntimeError("Music extension failed")
+
+        return audio
+
+    # --------------------------------------------------
+    # INTERNALS
+    # --------------------------------------------------
+    def _variation_requests(self, base_prompt, base_params, num_variations):
+        variations = []
+        requests = []
+
+        for i in range(num_variations):
+            varied_params = base_params.copy()
+
+            # Parameter variations
+            varied_params["temperature"] = min(
+                1.5, base_params.get("temperature", 1.0) + (i * 0.15)
+            )
+            varied_params["energy"] = ["low", "medium", "high"][i % 3]
+
+            variations.append(varied_params)
+            requests.append({
+                "prompt": base_prompt,
+                "duration": base_params.get("duration", 30),
+                "energy_level": varied_params["energy"],
+                "mood": base_params.get("mood", "calm"),
+                "temperature": varied_params["temperature"]
+            })
+
+        return variations, requests
+
+    def _store_preview(self, preview_id, preview):
+        self._previews[preview_id] = preview
+        while len(self._previews) > self.max_previews:
+            self._previews.popitem(last=False)
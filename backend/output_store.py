@@ -0,0 +1,278 @@
+# backend/output_store.py
+
+import json
+import time
+import uuid
+import logging
+import sqlite3
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+
+SAMPLES_DIR = Path("outputs/samples")
+OUTPUTS_DB = Path("outputs/outputs.sqlite")
+
+# Leftover partial writes older than this are removed by collect()
+STALE_TMP_SEC = 3600
+
+# accessed_at is only rewritten when it is older than this, so range
+# requests from one playback do not each cost a write
+TOUCH_INTERVAL_SEC = 60
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS outputs (
+    id                  TEXT PRIMARY KEY,
+    file                TEXT NOT NULL UNIQUE,
+    prompt              TEXT,
+    params              TEXT NOT NULL DEFAULT '{}',
+    model               TEXT,
+    mood                TEXT,
+    energy              TEXT,
+    duration            REAL,
+    format              TEXT,
+    generation_time_sec REAL,
+    size_bytes          INTEGER NOT NULL,
+    created_at          REAL NOT NULL,
+    accessed_at         REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS outputs_created ON outputs (created_at, id);
+CREATE INDEX IF NOT EXISTS outputs_accessed ON outputs (accessed_at);
+"""
+
+
+def new_output_stem(root, label):
+    """
+    Unique path (without extension) for a new output:
+    <root>/<id[:2]>/<label>_<id>. Returns (output_id, stem).
+
+    The two-hex-digit shard keeps directories small, and the random id
+    means concurrent requests can never pick the same name.
+    """
+    output_id = uuid.uuid4().hex
+    return output_id, Path(root) / output_id[:2] / f"{label}_{output_id}"
+
+
+def output_id_from_path(path):
+    """
+    Inverse of new_output_stem for a written file (None if the name does
+    not carry an id, e.g. a generation cache entry).
+    """
+    candidate = Path(path).stem.rsplit("_", 1)[-1]
+    return candidate if len(candidate) == 32 else None
+
+
+class OutputStore:
+    """
+    SQLite index of generated audio files, with retention.
+
+    The audio itself stays where MusicGenerator wrote it; each row holds
+    its path plus the prompt, parsed params, model, timings and size.
+    Like JobStore, every call opens its own short-lived connection, so
+    the store can be shared across threads and processes.
+    """
+
+    def __init__(self, db_path=OUTPUTS_DB, root=SAMPLES_DIR):
+        self.db_path = Path(db_path)
+        self.root = Path(root)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(SCHEMA)
+
+        self._retention_thread = None
+        self._stop = threading.Event()
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    # --------------------------------------------------
+    # INDEX
+    # --------------------------------------------------
+    def record(self, result, params=None, prompt=None):
+        """
+        Index a freshly generated result (a generate_batch result dict
+        whose file has been written). Cache hits are not indexed: their
+        file belongs to the GenerationCache.
+        """
+        if "id" not in result or result.get("cached"):
+            return False
+
+        try:
+            size = Path(result["file"]).stat().st_size
+        except OSError:
+            return False
+
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR IGNORE INTO outputs (id, file, prompt, params, model, "
+                "mood, energy, duration, format, generation_time_sec, size_bytes, "
+                "created_at, accessed_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    result["id"], result["file"], prompt,
+                    json.dumps(params or {}), result.get("model"),
+                    result.get("mood"), str(result.get("energy")),
+                    result.get("duration"), result.get("format"),
+                    result.get("generation_time_sec"), size, now, now
+                )
+            )
+        return True
+
+    def get(self, output_id):
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT * FROM outputs WHERE id = ?", (output_id,)
+            ).fetchone()
+        return _decode_output(row) if row is not None else None
+
+    def history(self, limit=20, before=None):
+        """
+        Newest-first page of outputs.
+
+        `before` is the "next" cursor of the previous page (None for the
+        first page). Pages are read by keyset on (created_at, id), so
+        deep pages cost the same as the first one.
+        Returns {"items": [...], "next": cursor or None}.
+        """
+        query = "SELECT * FROM outputs"
+        args = []
+        if before:
+            # Raises ValueError for a malformed cursor
+            created_at, output_id = before.split(":", 1)
+            query += " WHERE (created_at, id) < (?, ?)"
+            args += [float(created_at), output_id]
+        query += " ORDER BY created_at DESC, id DESC LIMIT ?"
+        args.append(limit + 1)
+
+        with self._connect() as conn:
+            rows = conn.execute(query, args).fetchall()
+
+        items = [_decode_output(row) for row in rows[:limit]]
+        next_cursor = None
+        if len(rows) > limit:
+            last = rows[limit - 1]
+            next_cursor = f"{last['created_at']!r}:{last['id']}"
+        return {"items": items, "next": next_cursor}
+
+    def touch(self, output_id):
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE outputs SET accessed_at = ? "
+                "WHERE id = ? AND accessed_at < ?",
+                (now, output_id, now - TOUCH_INTERVAL_SEC)
+            )
+
+    def stats(self):
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT COUNT(*) AS outputs, COALESCE(SUM(size_bytes), 0) AS bytes "
+                "FROM outputs"
+            ).fetchone()
+        return dict(row)
+
+    # --------------------------------------------------
+    # RETENTION
+    # --------------------------------------------------
+    def collect(self, max_age_sec=None, max_bytes=None):
+        """
+        Delete outputs created more than `max_age_sec` ago, then the least
+        recently accessed ones until the total is under `max_bytes`.
+        Files are removed before their rows; if a run dies in between,
+        the leftover rows still match and are dropped by the next run.
+        """
+        now = time.time()
+        doomed = []
+
+        with self._connect() as conn:
+            if max_age_sec is not None:
+                doomed += conn.execute(
+                    "SELECT id, file, size_bytes FROM outputs WHERE created_at < ?",
+                    (now - max_age_sec,)
+                ).fetchall()
+
+            if max_bytes is not None:
+                total = conn.execute(
+                    "SELECT COALESCE(SUM(size_bytes), 0) FROM outputs"
+                ).fetchone()[0]
+                total -= sum(row["size_bytes"] for row in doomed)
+                already = {row["id"] for row in doomed}
+
+                for row in conn.execute(
+                    "SELECT id, file, size_bytes FROM outputs ORDER BY accessed_at"
+                ):
+                    if total <= max_bytes:
+                        break
+                    if row["id"] not in already:
+                        doomed.append(row)
+                        total -= row["size_bytes"]
+
+        for row in doomed:
+            Path(row["file"]).unlink(missing_ok=True)
+            # Draft outputs come with a MIDI file of the same name
+            Path(row["file"]).with_suffix(".mid").unlink(missing_ok=True)
+
+        with self._connect() as conn:
+            conn.executemany(
+                "DELETE FROM outputs WHERE id = ?", [(row["id"],) for row in doomed]
+            )
+
+        stale = self._remove_stale_tmp(now)
+        return {
+            "removed": len(doomed),
+            "removed_bytes": sum(row["size_bytes"] for row in doomed),
+            "stale_tmp_removed": stale
+        }
+
+    def start_retention(self, interval_sec=3600, max_age_sec=None, max_bytes=None):
+        """
+        Run collect() every `interval_sec` on a daemon thread. No-op if
+        already running.
+        """
+        if self._retention_thread is not None:
+            return
+
+        def loop():
+            while not self._stop.wait(interval_sec):
+                try:
+                    removed = self.collect(max_age_sec, max_bytes)
+                    if removed["removed"] or removed["stale_tmp_removed"]:
+                        logging.info(f"Output retention: {removed}")
+                except Exception as e:
+                    logging.error(f"Output retention failed: {e}")
+
+        self._retention_thread = threading.Thread(
+            target=loop, name="output-retention", daemon=True
+        )
+        self._retention_thread.start()
+
+    def stop_retention(self):
+        if self._retention_thread is not None:
+            self._stop.set()
+            self._retention_thread.join()
+            self._retention_thread = None
+            self._stop.clear()
+
+    def _remove_stale_tmp(self, now):
+        removed = 0
+        for tmp in self.root.glob("*/.*.tmp"):
+            try:
+                if tmp.stat().st_mtime < now - STALE_TMP_SEC:
+                    tmp.unlink()
+                    removed += 1
+            except OSError:
+                pass
+        return removed
+
+
+def _decode_output(row):
+    output = dict(row)
+    output["params"] = json.loads(output["params"])
+    return output
@@ -1,5 +1,6 @@
 import json
 import random
+import hashlib
 from pathlib import Path
 
 TEMPLATE_PATH = Path("data/mood_templates.json")
@@ -18,14 +19,15 @@ class PromptEnhancer:
             "smooth progression without sharp transitions"
         ]
 
-    def enhance(self, params, variations=1):
+    def enhance(self, params, variations=1, structure=None):
         """
-        Generate multiple enhanced music prompts with guaranteed uniqueness
+        Generate multiple enhanced music prompts with guaranteed uniqueness.
+        A fixed `structure` hint gives one reproducible prompt instead.
         """
         prompts = []
 
         # Ensure we don't request more variations than available structures
-        structure_pool = random.sample(
+        structure_pool = [structure] if structure else random.sample(
             self.structures,
             k=min(variations, len(self.structures))
         )
@@ -37,6 +39,17 @@ class PromptEnhancer:
 
         return prompts
 
+    def structure_for(self, params):
+        """
+        The structure hint for `params`, picked from a hash of them: the
+        same input always gives the same prompt, so repeated requests
+        share cache entries and in-flight generations.
+        """
+        digest = hashlib.sha1(
+            json.dumps(params, sort_keys=True, default=str).encode("utf-8")
+        ).digest()
+        return self.structures[int.from_bytes(digest[:4], "big") % len(self.structures)]
+
     def _build_prompt(self, params, structure_hint):
         mood = params.get("mood", "calm")
         tempo = params.get("tempo", "medium")
@@ -48,7 +61,9 @@ class PromptEnhancer:
             mood, self.mood_templates["calm"]
         )
 
-        bpm = 120 if tempo == "fast" else 90 if tempo == "medium" else 60
+        bpm = params.get("bpm") or (
+            120 if tempo == "fast" else 90 if tempo == "medium" else 60
+        )
 
         description = base_template.format(tempo=bpm)
 
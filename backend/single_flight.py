@@ -0,0 +1,142 @@
+# backend/single_flight.py
+
+import threading
+from concurrent.futures import Future, InvalidStateError
+
+from backend import metrics
+from backend.cancellation import CancellationToken, GenerationCancelled
+
+
+class Flight:
+    """
+    One in-progress generation shared by every request with its key.
+
+    The leader runs the generation with `token` as the request's
+    "cancel" and resolves `future` with the result dict (or exception).
+    """
+
+    def __init__(self, key):
+        self.key = key
+        self.future = Future()
+        # Fires only once every waiter has gone away
+        self.token = CancellationToken()
+        self.waiters = 0
+
+
+class SingleFlight:
+    """
+    Coalesces identical in-flight generations.
+
+    join() attaches a request to the flight running for its key (its
+    generation cache key), or starts one and makes the caller the leader.
+    Each waiter gets its own future with a copy of the shared result.
+    A waiter whose CancellationToken fires is released on its own; the
+    shared computation is only cancelled when no waiter is left, and the
+    key is then free for a fresh flight. Waiters that keep partial audio
+    stay attached and receive the partial result.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._flights = {}
+
+    def join(self, key, cancel=None):
+        """
+        Returns (flight, waiter_future, is_leader).
+        """
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = Flight(key)
+                self._flights[key] = flight
+                flight.future.add_done_callback(
+                    lambda _, flight=flight: self._forget(flight)
+                )
+            flight.waiters += 1
+
+        if not leader:
+            metrics.inc("coalesced_requests_total")
+
+        waiter = Future()
+        flight.future.add_done_callback(lambda done: _relay(done, waiter))
+
+        left = []   # set once this waiter stopped counting
+        def leave(reason):
+            self._leave(flight, left, reason)
+
+        waiter.add_done_callback(
+            lambda done: done.cancelled() and leave("cancelled")
+        )
+
+        if cancel is not None:
+            if cancel.keep_partial:
+                flight.token.keep_partial = True
+                cancel.add_callback(lambda token: leave(token.reason))
+            else:
+                cancel.add_callback(
+                    lambda token: _fail(waiter, token) and leave(token.reason)
+                )
+
+        return flight, waiter, leader
+
+    def wait(self, waiter, cancel=None):
+        """
+        Block until `waiter` resolves, firing `cancel` at its deadline.
+        """
+        while True:
+            # Reading `cancelled` fires a token whose deadline passed
+            timeout = None
+            if cancel is not None and not cancel.cancelled:
+                timeout = cancel.remaining()
+            try:
+                return waiter.result(timeout=timeout)
+            except TimeoutError:
+                continue
+
+    def in_flight(self):
+        with self._lock:
+            return len(self._flights)
+
+    # --------------------------------------------------
+    # INTERNALS
+    # --------------------------------------------------
+    def _leave(self, flight, left, reason):
+        with self._lock:
+            if left:
+                return
+            left.append(True)
+            flight.waiters -= 1
+            abandoned = flight.waiters == 0 and not flight.future.done()
+            if abandoned and self._flights.get(flight.key) is flight:
+                del self._flights[flight.key]
+
+        if abandoned:
+            flight.token.cancel(reason)
+
+    def _forget(self, flight):
+        with self._lock:
+            if self._flights.get(flight.key) is flight:
+                del self._flights[flight.key]
+
+
+def _relay(done, waiter):
+    try:
+        if done.exception() is not None:
+            waiter.set_exception(done.exception())
+        else:
+            waiter.set_result(dict(done.result()))
+    except InvalidStateError:
+        # The waiter was released or cancelled first
+        pass
+
+
+def _fail(waiter, token):
+    """
+    Release a waiter with GenerationCancelled; False if already resolved.
+    """
+    try:
+        waiter.set_exception(GenerationCancelled(token.reason))
+    except InvalidStateError:
+        return False
+    return True
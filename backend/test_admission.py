@@ -0,0 +1,44 @@
+import time
+
+from backend.admission import AdmissionQueue, QueueFull
+from backend.cancellation import CancellationToken
+
+print("✅ test_admission.py started")
+
+# Shortest job first, batch lane behind interactive of the same cost
+queue = AdmissionQueue(max_queued=4, aging_rate=0.0)
+for name, cost, lane in [("long", 120, "interactive"), ("batch", 30, "batch"),
+                         ("short", 10, "interactive"), ("mid", 30, "interactive")]:
+    queue.push(name, cost, lane)
+order = [queue.take()[0].item for _ in range(4)]
+print("Order:", order)
+assert order == ["short", "mid", "long", "batch"]
+
+# Bounded: full queue rejects with a Retry-After estimate
+queue = AdmissionQueue(max_queued=2, max_queued_cost=100)
+queue.push("a", 30)
+queue.push("b", 30)
+try:
+    queue.push("c", 10)
+    raise AssertionError("expected QueueFull")
+except QueueFull as e:
+    print("Retry after:", e.retry_after)
+    assert e.retry_after >= 1
+
+# Entries whose deadline passed make room instead of being rejected
+queue = AdmissionQueue(max_queued=1)
+token = CancellationToken(deadline_sec=0.01)
+queue.push("late", 30, tokens=[token])
+time.sleep(0.02)
+queue.push("fresh", 30)
+assert [entry.item for entry in queue.take(2, group_key=lambda item: 0)] == ["fresh"]
+assert queue.dropped == 1
+
+# Aging: a long request overtakes newer short ones after waiting
+queue = AdmissionQueue(aging_rate=1000.0)
+queue.push("long", 100)
+time.sleep(0.2)
+queue.push("short", 1)
+assert queue.peek().item == "long"
+
+print("\n✅ Test execution completed")
@@ -0,0 +1,78 @@
+import asyncio
+import threading
+
+from backend.batch_scheduler import BatchScheduler
+from backend.cancellation import CancellationToken, GenerationCancelled
+
+print("✅ test_batch_scheduler.py started")
+
+batches = []
+release = threading.Event()
+
+
+def run_batch(requests):
+    # Blocks until released, so later submissions queue up behind it
+    release.wait(timeout=5)
+    batches.append([request["prompt"] for request in requests])
+    return [{"file": f"{request['prompt']}.wav"} for request in requests]
+
+
+def request(prompt, duration=30, model="musicgen-small", **extra):
+    return dict(prompt=prompt, duration=duration, model=model, **extra)
+
+
+async def main():
+    scheduler = BatchScheduler(
+        run_batch, window_ms=50, max_batch_size=4, duration_bucket_sec=10,
+        key_fn=lambda r: (r["model"], r["prompt"], r["duration"])
+    )
+    await scheduler.start()
+
+    # Grouped by model and duration bucket, never padded to a longer track
+    release.set()
+    results = await asyncio.gather(*(
+        scheduler.submit(r) for r in [
+            request("short-a", 5), request("long-a", 120), request("short-b", 8),
+            request("long-b", 115), request("other-model", 5, model="musicgen-medium")
+        ]
+    ))
+    assert [r["file"] for r in results] == [
+        "short-a.wav", "long-a.wav", "short-b.wav", "long-b.wav", "other-model.wav"
+    ]
+    print("Batches:", batches)
+    assert sorted(sorted(batch) for batch in batches) == [
+        ["long-a", "long-b"], ["other-model"], ["short-a", "short-b"]
+    ]
+
+    # Identical requests in flight together share one generation
+    batches.clear()
+    results = await asyncio.gather(*(scheduler.submit(request("same")) for _ in range(3)))
+    assert batches == [["same"]] and all(r["file"] == "same.wav" for r in results)
+    assert scheduler.single_flight.in_flight() == 0
+
+    # A request cancelled while queued is answered without being decoded
+    batches.clear()
+    release.clear()
+    busy = asyncio.create_task(scheduler.submit(request("busy")))
+    await asyncio.sleep(0.1)
+    token = CancellationToken()
+    queued = asyncio.create_task(scheduler.submit(request("queued", cancel=token)))
+    await asyncio.sleep(0.1)
+    token.cancel("client disconnected")
+    try:
+        await queued
+        raise AssertionError("expected GenerationCancelled")
+    except GenerationCancelled:
+        pass
+    release.set()
+    await busy
+    await asyncio.sleep(0.1)
+    assert batches == [["busy"]]
+
+    print("Stats:", scheduler.stats())
+    await scheduler.stop()
+
+
+asyncio.run(main())
+
+print("\n✅ Test execution completed")
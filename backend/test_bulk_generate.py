@@ -0,0 +1,54 @@
+import json
+import tempfile
+from pathlib import Path
+
+from backend.bulk_generate import Manifest, item_id, read_requests
+
+print("✅ test_bulk_generate.py started")
+
+with tempfile.TemporaryDirectory() as tmp:
+    requests = Path(tmp) / "requests.jsonl"
+    requests.write_text(
+        json.dumps({"id": "ambient/01", "prompt": "calm piano"}) + "\n"
+        + "\n"
+        + "not json\n"
+        + json.dumps({"prompt": "upbeat guitar", "tier": "preview"}) + "\n"
+        + json.dumps({"id": "no-prompt"}) + "\n"
+    )
+    parsed = list(read_requests(requests))
+    assert [line_no for line_no, _, _ in parsed] == [1, 3, 4, 5]
+    assert [error is None for _, _, error in parsed] == [True, False, True, False]
+    assert item_id(1, parsed[0][1]) == "ambient_01-1"
+    assert item_id(4, parsed[2][1]) == "line-4"
+
+    # Repeated ids (also after sanitizing) still name different files
+    requests.write_text(
+        json.dumps({"id": "ambient/01", "prompt": "calm piano"}) + "\n"
+        + json.dumps({"id": "ambient_01", "prompt": "sad strings"}) + "\n"
+        + json.dumps({"id": "ambient/01", "prompt": "fast drums"}) + "\n"
+        + json.dumps({"id": "line", "prompt": "warm synth"}) + "\n"
+        + json.dumps({"prompt": "warm synth"}) + "\n"
+    )
+    names = [item_id(line_no, request) for line_no, request, _ in read_requests(requests)]
+    print("Names:", names)
+    assert len(set(names)) == len(names)
+
+    # Done items survive a restart; failed ones and a torn line do not count
+    path = Path(tmp) / "out" / "results.jsonl"
+    manifest = Manifest(path)
+    manifest.append({"line": 1, "id": "ambient_01", "status": "done"})
+    manifest.append({"line": 4, "id": "line-4", "status": "failed", "error": "x"})
+    manifest.close()
+    with open(path, "ab") as f:
+        f.write(b'{"line": 4, "status": "do')
+
+    manifest = Manifest(path)
+    assert manifest.is_completed(1) and not manifest.is_completed(4)
+    manifest.append({"line": 4, "id": "line-4", "status": "done"})
+    manifest.close()
+    manifest = Manifest(path)
+    assert manifest.completed_count == 2
+    manifest.close()
+    print("Manifest lines:", len(path.read_text().splitlines()))
+
+print("\n✅ Test execution completed")
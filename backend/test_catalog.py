@@ -0,0 +1,52 @@
+import time
+import tempfile
+from pathlib import Path
+
+import numpy as np
+
+from backend.catalog import Catalog, catalog_grid, entry_key, prompt_embedding
+
+print("✅ test_catalog.py started")
+
+grid = {
+    "tempos": ["slow", "fast"], "energies": [2, 8], "styles": ["ambient"],
+    "instruments": [["piano"], ["synth"]], "durations": [30]
+}
+points = catalog_grid(grid, ["calm", "happy"])
+assert len(points) == 2 * 2 * 2 * 2
+assert len({entry_key(p) for p in points}) == len(points)
+
+# Stable across processes, unit length, similar prompts are closer
+a = prompt_embedding("calm piano. Style: ambient")
+assert np.allclose(a, prompt_embedding("calm piano. Style: ambient"))
+assert abs(np.linalg.norm(a) - 1) < 1e-6
+assert a @ prompt_embedding("calm piano. Style: lofi") > a @ prompt_embedding("fast metal drums")
+
+with tempfile.TemporaryDirectory() as tmp:
+    catalog = Catalog(db_path=Path(tmp) / "catalog.sqlite", root=Path(tmp) / "tracks")
+    for i, params in enumerate(points):
+        source = Path(tmp) / f"{i}.wav"
+        source.write_bytes(b"RIFF")
+        prompt = f"{params['mood']} {params['tempo']} {params['instruments'][0]}"
+        catalog.add(params, prompt, {"file": str(source), "format": "wav"})
+    assert len(catalog.keys()) == len(points)
+
+    query = {"mood": "happy", "tempo": "fast", "energy": 7, "style": "ambient",
+             "instruments": ["piano"], "duration": 30}
+    start = time.time()
+    entry, distance = catalog.nearest(query, "happy fast piano")
+    print(f"Nearest in {(time.time() - start) * 1000:.2f}ms, distance {distance:.3f}")
+    assert (entry["mood"], entry["tempo"], entry["energy"]) == ("happy", "fast", 8)
+    assert Path(entry["file"]).exists()
+
+    # LLM output may give energy as a level name or not at all
+    entry, _ = catalog.nearest(dict(query, energy="high"), "happy fast piano")
+    assert entry["energy"] == 8
+    assert catalog.nearest(dict(query, energy=None), "happy fast piano") is not None
+    assert catalog.nearest(dict(query, duration="long"), "happy fast piano") is None
+
+    # Too far from anything, or no track of that length: generate live
+    assert catalog.nearest(dict(query, mood="sad", style="rock"), "sad rock") is None
+    assert catalog.nearest(dict(query, duration=120), "happy fast piano") is None
+
+print("\n✅ Test execution completed")
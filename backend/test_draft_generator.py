@@ -0,0 +1,69 @@
+import time
+import tempfile
+from pathlib import Path
+
+import numpy as np
+
+from backend.draft_generator import DraftGenerator
+from backend.generation_params import energy_level_name
+from backend.midi_export import write_midi
+
+print("✅ test_draft_generator.py started")
+
+generator = DraftGenerator(write_midi=False)
+
+request = {
+    "prompt": "upbeat guitar with drums",
+    "duration": 30,
+    "energy_level": "high",
+    "mood": "energetic",
+    "seed": 7,
+    "instruments": ["guitar", "drums", "synth"]
+}
+
+# Same seed, same arrangement
+arrangement = generator.arrange(request)
+assert arrangement == generator.arrange(request)
+assert set(arrangement["parts"]) == {"melody", "chords", "bass", "drums"}
+assert arrangement["parts"]["melody"][0] == "guitar"
+print("BPM:", arrangement["bpm"])
+
+# Nothing starts after the requested duration
+beats = request["duration"] * arrangement["bpm"] / 60
+for _, notes in arrangement["parts"].values():
+    assert all(start < beats for start, _, _, _ in notes)
+
+start = time.time()
+audio = generator.render(arrangement)
+elapsed = time.time() - start
+assert len(audio) == request["duration"] * generator.sample_rate
+assert np.isfinite(audio).all() and np.abs(audio).max() > 0
+print(f"Rendered {request['duration']}s in {elapsed:.3f}s")
+
+# An unexpected tempo from the LLM falls back instead of failing
+assert generator.arrange(dict(request, tempo="moderato"))["bpm"] > 0
+
+# Energy given as a numeric string or an unknown word still arranges
+assert energy_level_name("8") == "high" and energy_level_name("loud") == "medium"
+assert generator.arrange(dict(request, energy_level="loud"))["bpm"] > 0
+
+# Extreme parsed BPMs are clamped
+assert generator.arrange(dict(request, bpm=3))["bpm"] == 30
+assert generator.arrange(dict(request, bpm=60000))["bpm"] == 300
+
+# Low energy: no drums unless asked for
+calm = generator.arrange(dict(request, energy_level="low", instruments=["piano"]))
+assert "drums" not in calm["parts"]
+
+with tempfile.TemporaryDirectory() as tmp:
+    tracks = [(role, channel, 0, notes) for channel, (role, (_, notes))
+              in enumerate(arrangement["parts"].items())]
+    path = write_midi(Path(tmp) / "draft.mid", tracks, arrangement["bpm"])
+    data = path.read_bytes()
+    assert data[:4] == b"MThd" and data.count(b"MTrk") == len(tracks) + 1
+    print("MIDI bytes:", len(data))
+
+    # The writer itself never overflows the three-byte tempo field
+    write_midi(Path(tmp) / "slow.mid", tracks, 1)
+
+print("\n✅ Test execution completed")
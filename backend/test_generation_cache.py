@@ -0,0 +1,82 @@
+import tempfile
+from pathlib import Path
+
+from backend import main_service
+from backend.generation_cache import GenerationCache, generation_key
+from backend.generation_params import load_config
+
+print("✅ test_generation_cache.py started")
+
+job = {
+    "prompt": "soft, peaceful, slow tempo. Style: ambient.",
+    "duration": 30,
+    "temperature": 0.7,
+    "cfg_coef": 2.5,
+    "seed": None,
+    "mood": "calm"
+}
+
+key = generation_key("facebook/musicgen-small", job)
+assert key == generation_key("facebook/musicgen-small", dict(job, mood="focus"))
+assert key != generation_key("facebook/musicgen-medium", job)
+
+# Output format and loudness are part of the key; encoder threads are not
+postprocess = {"format": "wav", "target_lufs": -14.0, "encode_workers": 2}
+wav_key = generation_key("facebook/musicgen-small", job, postprocess)
+assert wav_key != generation_key("facebook/musicgen-small", job,
+                                 dict(postprocess, format="flac"))
+assert wav_key != generation_key("facebook/musicgen-small", job,
+                                 dict(postprocess, target_lufs=-16.0))
+assert wav_key == generation_key("facebook/musicgen-small", job,
+                                 dict(postprocess, encode_workers=4))
+print("Key:", key)
+
+with tempfile.TemporaryDirectory() as tmp:
+    tmp = Path(tmp)
+    cache = GenerationCache(root=tmp / "cache", max_bytes=2500)
+
+    for i in range(3):
+        audio = tmp / f"track_{i}.wav"
+        audio.write_bytes(b"x" * 1000)
+        cache.put(f"{i:02d}" * 32, {"file": str(audio), "duration": 30})
+
+    # Budget only fits two entries: the oldest one was evicted
+    assert cache.get("00" * 32) is None
+    hit = cache.get("01" * 32)
+    assert hit["cached"] and Path(hit["file"]).read_bytes() == b"x" * 1000
+
+    print("Stats:", cache.stats())
+
+    # A second instance on the same root (another process) sees the
+    # entries written by the first, and both share the byte budget
+    other = GenerationCache(root=tmp / "cache", max_bytes=2500)
+    audio = tmp / "track_3.wav"
+    audio.write_bytes(b"y" * 1000)
+    other.put("03" * 32, {"file": str(audio), "duration": 30})
+    assert cache.get("03" * 32)["cached"]
+    assert cache.get("02" * 32) is None   # least recently used of all three
+
+# Through the pipeline: the same input twice gives the same prompt and key,
+# so the repeat is a cache hit
+with tempfile.TemporaryDirectory() as tmp:
+    tmp = Path(tmp)
+    settings = dict(load_config(), cache={"dir": str(tmp / "cache")},
+                    outputs={"db_path": str(tmp / "outputs.sqlite")},
+                    catalog={"enabled": False})
+    main_service.load_config = lambda: settings
+    main_service.init_backend()
+
+    def pipeline_request():
+        params, prompt = main_service.prepare_request("calm study music")
+        return main_service.generation_request(params, prompt, model="musicgen-small")
+
+    audio = tmp / "study.wav"
+    audio.write_bytes(b"z" * 1000)
+    main_service.generation_cache.put(
+        main_service.cache_key(pipeline_request()), {"file": str(audio), "duration": 30}
+    )
+    for _ in range(5):
+        hit = main_service.generation_cache.get(main_service.cache_key(pipeline_request()))
+        assert hit is not None and hit["cached"]
+
+print("\n✅ Test execution completed")
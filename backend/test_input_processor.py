@@ -21,3 +21,54 @@ for text in tests:
     print("Output:", result)
 
 print("\n✅ Test execution completed")
+
+# --------------------------------------------------
+# Stub model: cache, deadline and hedged fallback
+# --------------------------------------------------
+import json
+import time
+import asyncio
+
+
+class StubResponse:
+    def __init__(self, text):
+        self.text = text
+
+
+class StubModel:
+    def __init__(self, delay=0.0, fail=False):
+        self.delay = delay
+        self.fail = fail
+        self.calls = 0
+
+    def generate_content(self, prompt):
+        self.calls += 1
+        time.sleep(self.delay)
+        if self.fail:
+            raise RuntimeError("stub failure")
+        return StubResponse(json.dumps({"mood": "romantic", "energy": 3}))
+
+
+stub = StubModel()
+processor = InputProcessor(model=stub, deadline_sec=0.5)
+assert processor.process_input("Dinner  Music")["mood"] == "romantic"
+assert processor.process_input("dinner music")["mood"] == "romantic"
+assert stub.calls == 1, "normalized text should hit the cache"
+print("✅ Extraction cache")
+
+slow = StubModel(delay=0.5)
+processor = InputProcessor(model=slow, deadline_sec=0.1)
+start = time.time()
+result = processor.process_input("music for my workout")
+assert time.time() - start < 0.4 and result["source"] == "lexicon"
+time.sleep(0.6)
+assert processor.process_input("music for my workout")["mood"] == "romantic"
+print("✅ Deadline falls back, late answer is cached")
+
+processor = InputProcessor(model=StubModel(fail=True), deadline_sec=1.0)
+start = time.time()
+result = asyncio.run(processor.process_input_async("sad breakup song"))
+assert time.time() - start < 0.5 and result["mood"] == "sad"
+processor = InputProcessor(model=StubModel(delay=0.05), deadline_sec=1.0)
+assert asyncio.run(processor.process_input_async("x"))["mood"] == "romantic"
+print("✅ Hedged async extraction")
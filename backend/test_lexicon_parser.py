@@ -0,0 +1,41 @@
+from backend.lexicon_parser import LexiconParser, default_parser
+
+print("✅ test_lexicon_parser.py started")
+
+parser = default_parser()
+print("Lexicon entries:", parser.entries)
+
+result = parser.parse("I need energetic music for my workout")
+assert result["mood"] == "energetic" and result["context"] == "workout"
+assert result["tempo"] == "fast" and result["energy"] == 8
+
+result = parser.parse(
+    "2 minute lo-fi hip hop beat with piano and soft drums at 85 BPM"
+)
+assert result["duration"] == 120 and result["bpm"] == 85
+assert result["tempo"] == "medium" and result["style"] == "lofi"
+assert result["instruments"] == ["drums", "piano"]
+assert result["confidence"]["duration"] == 1.0
+
+# Stated BPMs are clamped like durations
+assert parser.parse("slow ambient piano at 3 bpm")["bpm"] == 30
+assert parser.parse("techno at 60000 bpm")["bpm"] == 300
+
+# Decades are not durations; plurals fall back to the singular entry
+result = parser.parse("80s synthwave with trumpets")
+assert "duration" not in result and result["style"] == "electronic"
+assert result["instruments"] == ["brass"]
+
+result = parser.parse("")
+assert result["mood"] == "calm" and result["confidence"]["mood"] == 0.0
+assert set(result) >= {"mood", "energy", "style", "tempo", "instruments", "context"}
+
+# Longest phrase wins over its prefix
+custom = LexiconParser({
+    "defaults": parser.defaults,
+    "mood": {"sad": ["break"], "happy": ["break dance"]}
+})
+assert custom.parse("some break dance music")["mood"] == "happy"
+assert custom.parse("take a break")["mood"] == "sad"
+
+print("✅ Lexicon parser tests passed")
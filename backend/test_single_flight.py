@@ -0,0 +1,69 @@
+import tempfile
+import threading
+from pathlib import Path
+
+from backend import main_service
+from backend.cancellation import CancellationToken, GenerationCancelled
+from backend.generation_params import load_config
+from backend.single_flight import SingleFlight
+
+print("✅ test_single_flight.py started")
+
+# Concurrent joins on one key: one leader, every waiter gets its own copy
+flights = SingleFlight()
+joined = [flights.join("key") for _ in range(3)]
+assert [leader for _, _, leader in joined] == [True, False, False]
+assert len({id(flight) for flight, _, _ in joined}) == 1 and flights.in_flight() == 1
+
+flight = joined[0][0]
+flight.future.set_result({"file": "a.wav"})
+results = [waiter.result(timeout=1) for _, waiter, _ in joined]
+assert results == [{"file": "a.wav"}] * 3 and results[0] is not results[1]
+assert flights.in_flight() == 0
+assert flights.join("key")[2]   # finished flights free their key
+
+# A waiter that leaves is released alone; the flight is only cancelled
+# once every waiter has gone
+flights = SingleFlight()
+tokens = [CancellationToken(), CancellationToken()]
+joined = [flights.join("key", token) for token in tokens]
+flight = joined[0][0]
+
+tokens[0].cancel("client disconnected")
+try:
+    joined[0][1].result(timeout=1)
+    raise AssertionError("expected GenerationCancelled")
+except GenerationCancelled as e:
+    assert e.reason == "client disconnected"
+assert not flight.token.cancelled
+
+tokens[1].cancel("client disconnected")
+assert flight.token.cancelled and flights.in_flight() == 0
+
+# Through the pipeline: identical inputs arriving together share a flight
+with tempfile.TemporaryDirectory() as tmp:
+    tmp = Path(tmp)
+    settings = dict(load_config(), cache={"enabled": False},
+                    outputs={"db_path": str(tmp / "outputs.sqlite")},
+                    catalog={"enabled": False})
+    main_service.load_config = lambda: settings
+    main_service.init_backend()
+
+    flights = SingleFlight()
+    leaders = []
+
+    def submit():
+        params, prompt = main_service.prepare_request("calm study music for focus")
+        request = main_service.generation_request(params, prompt, seed=7,
+                                                  model="musicgen-small")
+        leaders.append(flights.join(main_service.cache_key(request))[2])
+
+    threads = [threading.Thread(target=submit) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    print("Leaders:", leaders.count(True), "of", len(leaders))
+    assert leaders.count(True) == 1 and flights.in_flight() == 1
+
+print("\n✅ Test execution completed")
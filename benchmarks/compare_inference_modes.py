@@ -0,0 +1,157 @@
+# benchmarks/compare_inference_modes.py
+"""
+Compare MusicGenerator inference modes (fp32 / bf16 / int8) on CPU.
+
+    python -m benchmarks.compare_inference_modes --model facebook/musicgen-small
+
+Each mode is measured in its own process so that peak RSS is not shared
+between modes. fp32 is always run as the reference for the similarity score.
+"""
+
+import json
+import time
+import argparse
+import resource
+import multiprocessing
+
+import numpy as np
+
+DEFAULT_PROMPT = "calm lo-fi piano with soft drums"
+
+
+# --------------------------------------------------
+# METRICS
+# --------------------------------------------------
+def spectral_similarity(reference, audio, n_fft=2048):
+    """
+    Correlation of the average log-magnitude spectra of two clips
+    (1.0 = same spectral balance).
+
+    Sampled tokens diverge between precisions after a few steps, so the
+    waveforms themselves are not comparable; the long-term spectrum still
+    shows whether a mode drifts in timbre or adds noise.
+    """
+    ref = _mean_log_spectrum(reference, n_fft)
+    out = _mean_log_spectrum(audio, n_fft)
+    ref, out = ref - ref.mean(), out - out.mean()
+    denom = np.linalg.norm(ref) * np.linalg.norm(out)
+    return float(ref @ out / denom) if denom > 0 else 0.0
+
+
+def _mean_log_spectrum(audio, n_fft):
+    frames = max(1, len(audio) // n_fft)
+    audio = np.pad(audio, (0, max(0, frames * n_fft - len(audio))))
+    windows = audio[:frames * n_fft].reshape(frames, n_fft) * np.hanning(n_fft)
+    magnitude = np.abs(np.fft.rfft(windows, axis=1)).mean(axis=0)
+    return 20 * np.log10(magnitude + 1e-8)
+
+
+def peak_rss_mb():
+    # ru_maxrss is in KB on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+# --------------------------------------------------
+# MEASUREMENT
+# --------------------------------------------------
+def measure(generator, prompt=DEFAULT_PROMPT, duration=10, seed=0):
+    """
+    Warm up, then time one seeded decode. Returns (metrics, audio).
+    """
+    import torch
+    from backend.model_registry import model_size_mb
+    from backend.music_generator import TOKENS_PER_SECOND
+
+    generator.warm_up()
+
+    job = generator.resolve_request({"prompt": prompt, "duration": duration})
+    torch.manual_seed(seed)
+
+    start = time.time()
+    audio = generator._decode([job], duration)[0]
+    elapsed = time.time() - start
+
+    metrics = {
+        "mode": generator.inference_mode,
+        "decode_sec": round(elapsed, 3),
+        "tokens_per_sec": round(duration * TOKENS_PER_SECOND / elapsed, 1),
+        "real_time_factor": round(elapsed / duration, 3),
+        "model_mb": round(model_size_mb(generator), 1),
+        "peak_rss_mb": round(peak_rss_mb(), 1)
+    }
+    return metrics, audio
+
+
+def _run_mode(checkpoint, mode, options, results):
+    from backend.music_generator import MusicGenerator, configure_threads
+
+    configure_threads(options["intra_op_threads"], options["inter_op_threads"])
+    generator = MusicGenerator(checkpoint, inference_mode=mode)
+    results.put(measure(generator, options["prompt"], options["duration"],
+                        options["seed"]))
+
+
+def compare(checkpoint, modes, options):
+    """
+    Measure each mode in a fresh process; returns one metrics dict per mode.
+    """
+    ctx = multiprocessing.get_context("spawn")
+    modes = ["fp32"] + [mode for mode in modes if mode != "fp32"]
+    reports, reference = [], None
+
+    for mode in modes:
+        results = ctx.Queue()
+        process = ctx.Process(target=_run_mode,
+                              args=(checkpoint, mode, options, results))
+        process.start()
+        metrics, audio = results.get()
+        process.join()
+
+        if reference is None:
+            reference = audio
+        metrics["similarity_to_fp32"] = round(spectral_similarity(reference, audio), 4)
+        metrics["speedup_vs_fp32"] = round(
+            reports[0]["decode_sec"] / metrics["decode_sec"], 2
+        ) if reports else 1.0
+        reports.append(metrics)
+
+    return reports
+
+
+def print_table(reports):
+    columns = ["mode", "tokens_per_sec", "real_time_factor", "speedup_vs_fp32",
+               "model_mb", "peak_rss_mb", "similarity_to_fp32"]
+    print("  ".join(f"{c:>18}" for c in columns))
+    for report in reports:
+        print("  ".join(f"{str(report[c]):>18}" for c in columns))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--model", default="facebook/musicgen-small")
+    parser.add_argument("--modes", nargs="+", default=["fp32", "bf16", "int8"])
+    parser.add_argument("--prompt", default=DEFAULT_PROMPT)
+    parser.add_argument("--duration", type=float, default=10)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--intra-op-threads", type=int)
+    parser.add_argument("--inter-op-threads", type=int)
+    parser.add_argument("--output", help="write the report as JSON")
+    args = parser.parse_args()
+
+    options = {
+        "prompt": args.prompt,
+        "duration": args.duration,
+        "seed": args.seed,
+        "intra_op_threads": args.intra_op_threads,
+        "inter_op_threads": args.inter_op_threads
+    }
+    reports = compare(args.model, args.modes, options)
+    print_table(reports)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"model": args.model, **options, "modes": reports}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+# benchmarks/lexicon_benchmark.py
+"""
+Throughput of the lexicon fallback parser.
+
+    python -m benchmarks.lexicon_benchmark --output lexicon.json
+
+Parses a fixed set of prompts against the shipped data/lexicon.json and
+against the same lexicon padded with synthetic phrases, to show that
+per-parse cost does not grow with the lexicon size.
+"""
+
+import json
+import time
+import random
+import string
+import argparse
+
+import numpy as np
+
+from backend.lexicon_parser import LEXICON_PATH, LexiconParser
+
+PROMPTS = [
+    "I need energetic music for my workout",
+    "Something calming for meditation",
+    "Happy birthday party music",
+    "Sad breakup song",
+    "Focus music for studying",
+    "2 minute lo-fi hip hop beat with piano and soft drums at 85 BPM for studying",
+    "epic cinematic trailer music with intense strings, brass and choir, 90 seconds",
+    "romantic jazz for a candlelight dinner with saxophone and upright bass",
+    "a long, slowly evolving ambient soundscape for sleeping, very soft, "
+    "no drums, warm pads and distant bells, around 60 bpm, 5 minutes"
+]
+
+
+def synthetic_lexicon(base, extra_entries, seed=0):
+    """
+    `base` plus `extra_entries` random one- to three-word phrases spread
+    over the existing field values.
+    """
+    rng = random.Random(seed)
+    lexicon = json.loads(json.dumps(base))
+    fields = [(field, value) for field in ("mood", "style", "instruments", "context")
+              for value in lexicon[field]]
+
+    for _ in range(extra_entries):
+        field, value = rng.choice(fields)
+        phrase = " ".join(
+            "".join(rng.choices(string.ascii_lowercase, k=rng.randint(3, 9)))
+            for _ in range(rng.randint(1, 3))
+        )
+        lexicon[field][value].append(phrase)
+
+    return lexicon
+
+
+def measure(parser, rounds):
+    timings = []
+    for _ in range(rounds):
+        for prompt in PROMPTS:
+            start = time.perf_counter()
+            parser.parse(prompt)
+            timings.append(time.perf_counter() - start)
+
+    timings = np.array(timings) * 1e6
+    return {
+        "p50_us": round(float(np.percentile(timings, 50)), 2),
+        "p95_us": round(float(np.percentile(timings, 95)), 2),
+        "parses_per_sec": round(len(timings) / (timings.sum() / 1e6))
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[0, 1000, 10000, 100000],
+                        help="synthetic entries added to the shipped lexicon")
+    parser.add_argument("--rounds", type=int, default=2000)
+    parser.add_argument("--output", help="write the report as JSON")
+    args = parser.parse_args()
+
+    with open(LEXICON_PATH, "r", encoding="utf-8") as f:
+        base = json.load(f)
+
+    results = []
+    for extra in args.sizes:
+        start = time.perf_counter()
+        lexicon_parser = LexiconParser(synthetic_lexicon(base, extra))
+        compile_ms = (time.perf_counter() - start) * 1000
+
+        result = dict(
+            entries=lexicon_parser.entries,
+            compile_ms=round(compile_ms, 2),
+            **measure(lexicon_parser, args.rounds)
+        )
+        print(
+            f"{result['entries']:>7} entries: p50 {result['p50_us']} us, "
+            f"p95 {result['p95_us']} us, {result['parses_per_sec']} parses/s "
+            f"(compiled in {result['compile_ms']} ms)"
+        )
+        results.append(result)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"prompts": len(PROMPTS), "rounds": args.rounds,
+                       "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
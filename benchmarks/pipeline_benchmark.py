@@ -0,0 +1,406 @@
+# benchmarks/pipeline_benchmark.py
+"""
+Offline benchmark of the generation pipeline.
+
+    python -m benchmarks.pipeline_benchmark --output bench.json
+    python -m benchmarks.pipeline_benchmark --checkpoint models/facebook--musicgen-small
+    python -m benchmarks.pipeline_benchmark --baseline old.json --output new.json
+
+Without --checkpoint a tiny random MusicGen (benchmarks/tiny_model.py) is
+used: its numbers are for comparing commits on the same machine, not for
+estimating real model speed. The hub is never contacted.
+"""
+
+import os
+
+os.environ.setdefault("HF_HUB_OFFLINE", "1")
+
+import io
+import json
+import time
+import argparse
+import resource
+import platform
+import itertools
+import threading
+import subprocess
+import contextlib
+import tempfile
+from collections import defaultdict
+from datetime import datetime, timezone
+
+import numpy as np
+import torch
+
+from backend import music_generator
+from backend.input_processor import InputProcessor
+from backend.prompt_enhancer import PromptEnhancer
+from benchmarks.tiny_model import tiny_generator
+
+STAGES = ("prepare", "text_encode", "token_decode", "audio_decode", "write")
+
+USER_INPUTS = [
+    "calm music for studying late at night",
+    "upbeat track for a morning workout",
+    "happy birthday party background music",
+    "sad piano after a breakup"
+]
+
+
+# --------------------------------------------------
+# INSTRUMENTATION
+# --------------------------------------------------
+class StageTimer:
+    """
+    Records (start, end) intervals per pipeline stage, either around a
+    block or around every call of a model method, plus the resident memory
+    at each boundary (stages shorter than the RssSampler interval would
+    otherwise have no memory reading).
+    """
+
+    def __init__(self):
+        self.intervals = defaultdict(list)
+        self.rss_mb = defaultdict(float)
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        self._record_rss(name)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.intervals[name].append((start, time.perf_counter()))
+            self._record_rss(name)
+
+    def _record_rss(self, name):
+        self.rss_mb[name] = max(self.rss_mb[name], current_rss_mb())
+
+    @contextlib.contextmanager
+    def wrap(self, obj, attr, name):
+        original = getattr(obj, attr)
+
+        def timed(*args, **kwargs):
+            with self.stage(name):
+                return original(*args, **kwargs)
+
+        setattr(obj, attr, timed)
+        try:
+            yield
+        finally:
+            delattr(obj, attr)
+
+    def total(self, name):
+        return sum(end - start for start, end in self.intervals[name])
+
+    def first_end(self, name):
+        return self.intervals[name][0][1] if self.intervals[name] else None
+
+
+class RssSampler:
+    """
+    Samples resident memory every few ms in a background thread, so the
+    peak inside any stage interval can be looked up afterwards.
+    """
+
+    def __init__(self, interval_sec=0.005):
+        self.interval = interval_sec
+        self.samples = []
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.samples.append((time.perf_counter(), current_rss_mb()))
+            time.sleep(self.interval)
+
+    def peak(self, intervals):
+        values = [
+            rss for t, rss in self.samples
+            if any(start <= t <= end for start, end in intervals)
+        ]
+        return max(values, default=0.0)
+
+
+def current_rss_mb():
+    try:
+        with open("/proc/self/statm") as f:
+            pages = int(f.read().split()[1])
+        return pages * resource.getpagesize() / 1024 ** 2
+    except OSError:
+        # Not Linux: only the process-wide peak is available (KB on Linux,
+        # bytes on macOS)
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / 1024 ** 2 if platform.system() == "Darwin" else peak / 1024
+
+
+# --------------------------------------------------
+# ONE RUN
+# --------------------------------------------------
+def build_prepare():
+    """
+    Input processing + prompt enhancement, forced onto the offline parser.
+    """
+    with contextlib.redirect_stdout(io.StringIO()):
+        input_processor = InputProcessor()
+    input_processor.model = None
+    prompt_enhancer = PromptEnhancer()
+
+    def prepare(text):
+        with contextlib.redirect_stdout(io.StringIO()):
+            params = input_processor.process_input(text)
+        return prompt_enhancer.enhance(
+            params, structure=prompt_enhancer.structure_for(params)
+        )[0]
+
+    return prepare
+
+
+def run_once(generator, prepare, duration, batch_size, guidance_scale):
+    model = generator.model
+    timer = StageTimer()
+    start = time.perf_counter()
+
+    with timer.stage("prepare"):
+        prompts = [prepare(USER_INPUTS[i % len(USER_INPUTS)])
+                   for i in range(batch_size)]
+
+    jobs = [
+        generator.resolve_request({
+            "prompt": prompt, "duration": duration, "cfg_coef": guidance_scale
+        })
+        for prompt in prompts
+    ]
+
+    with timer.stage("generate"), \
+            timer.wrap(model.text_encoder, "forward", "text_encode"), \
+            timer.wrap(model.decoder, "forward", "decoder_step"), \
+            timer.wrap(model.audio_encoder, "decode", "audio_decode"):
+        audio = generator._decode(jobs, duration)
+
+    with timer.stage("write"):
+        for row, job in enumerate(jobs):
+            generator._write_audio(audio[row].copy(), job, f"_{row}")
+
+    end_to_end = time.perf_counter() - start
+    generate_sec = timer.total("generate")
+
+    stage_sec = {
+        "prepare": timer.total("prepare"),
+        "text_encode": timer.total("text_encode"),
+        "token_decode": (generate_sec - timer.total("text_encode")
+                         - timer.total("audio_decode")),
+        "audio_decode": timer.total("audio_decode"),
+        "write": timer.total("write")
+    }
+
+    # token_decode is measured as the whole generate call minus the
+    # wrapped encoder/decoder stages
+    timer_stage = dict(zip(STAGES, STAGES), token_decode="generate")
+
+    return {
+        "end_to_end": end_to_end,
+        "generate": generate_sec,
+        "time_to_first_token": timer.first_end("decoder_step") - start,
+        "stages": stage_sec,
+        "intervals": {
+            stage: timer.intervals[name] for stage, name in timer_stage.items()
+        },
+        "rss_mb": {
+            stage: timer.rss_mb[name] for stage, name in timer_stage.items()
+        }
+    }
+
+
+# --------------------------------------------------
+# SWEEP
+# --------------------------------------------------
+def percentiles(values):
+    return {
+        "p50": round(float(np.percentile(values, 50)), 4),
+        "p95": round(float(np.percentile(values, 95)), 4)
+    }
+
+
+def benchmark_setting(generator, prepare, duration, batch_size, threads,
+                      guidance_scale, repeats):
+    torch.set_num_threads(threads)
+
+    # Untimed warm-up: first calls pay allocator and kernel selection costs
+    run_once(generator, prepare, duration, batch_size, guidance_scale)
+
+    with RssSampler() as sampler:
+        runs = [
+            run_once(generator, prepare, duration, batch_size, guidance_scale)
+            for _ in range(repeats)
+        ]
+
+    tokens = batch_size * duration * music_generator.TOKENS_PER_SECOND
+    latency = percentiles([run["end_to_end"] for run in runs])
+
+    return {
+        "duration": duration,
+        "batch_size": batch_size,
+        "threads": threads,
+        "guidance_scale": guidance_scale,
+        "tokens_per_sec": round(
+            tokens / float(np.median([run["generate"] for run in runs])), 1
+        ),
+        "real_time_factor": round(latency["p50"] / duration, 4),
+        "time_to_first_token_sec": percentiles(
+            [run["time_to_first_token"] for run in runs]
+        ),
+        "latency_sec": latency,
+        "stages": {
+            stage: dict(
+                percentiles([run["stages"][stage] for run in runs]),
+                peak_rss_mb=round(max(
+                    sampler.peak([
+                        interval for run in runs
+                        for interval in run["intervals"][stage]
+                    ]),
+                    *(run["rss_mb"][stage] for run in runs)
+                ), 1)
+            )
+            for stage in STAGES
+        }
+    }
+
+
+def run_sweep(generator, durations, batch_sizes, threads, guidance_scales,
+              repeats=3):
+    prepare = build_prepare()
+    results = []
+
+    # Keep benchmark audio out of outputs/samples
+    with tempfile.TemporaryDirectory() as tmp:
+        output_dir = music_generator.OUTPUT_DIR
+        music_generator.OUTPUT_DIR = music_generator.Path(tmp)
+        try:
+            for duration, batch_size, n_threads, guidance in itertools.product(
+                    durations, batch_sizes, threads, guidance_scales):
+                result = benchmark_setting(generator, prepare, duration,
+                                           batch_size, n_threads, guidance,
+                                           repeats)
+                print(
+                    f"duration={duration}s batch={batch_size} "
+                    f"threads={n_threads} cfg={guidance}: "
+                    f"{result['tokens_per_sec']} tok/s, "
+                    f"p50 {result['latency_sec']['p50']}s, "
+                    f"RTF {result['real_time_factor']}"
+                )
+                results.append(result)
+        finally:
+            music_generator.OUTPUT_DIR = output_dir
+
+    return results
+
+
+# --------------------------------------------------
+# REPORTING
+# --------------------------------------------------
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def setting_key(result):
+    return (result["duration"], result["batch_size"], result["threads"],
+            result["guidance_scale"])
+
+
+def compare_to_baseline(report, baseline):
+    """
+    Print the relative change in p50 latency and tokens/sec for every
+    setting present in both reports.
+    """
+    previous = {setting_key(r): r for r in baseline["results"]}
+    print(f"\nvs {baseline.get('commit') or 'baseline'}:")
+
+    for result in report["results"]:
+        old = previous.get(setting_key(result))
+        if old is None:
+            continue
+        latency = result["latency_sec"]["p50"] / old["latency_sec"]["p50"] - 1
+        throughput = result["tokens_per_sec"] / old["tokens_per_sec"] - 1
+        print(
+            "duration={}s batch={} threads={} cfg={}: ".format(*setting_key(result))
+            + f"p50 latency {latency:+.1%}, tokens/sec {throughput:+.1%}"
+        )
+
+
+def load_generator(checkpoint, inference_mode, encoder_cache=False):
+    if checkpoint is None:
+        generator = tiny_generator(inference_mode)
+    else:
+        generator = music_generator.MusicGenerator(
+            checkpoint, inference_mode=inference_mode
+        )
+    if not encoder_cache:
+        # Repeated runs of the same prompts would never reach the text
+        # encoder, and text_encode would report zeros
+        generator.encoder_cache = None
+    return generator
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--checkpoint",
+                        help="local checkpoint dir or cached model id "
+                             "(default: tiny random model)")
+    parser.add_argument("--inference-mode", default="fp32")
+    parser.add_argument("--durations", type=float, nargs="+", default=[2, 5])
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 4])
+    parser.add_argument("--threads", type=int, nargs="+",
+                        default=sorted({1, os.cpu_count() or 1}))
+    parser.add_argument("--guidance-scales", type=float, nargs="+",
+                        default=[1.0, 3.0])
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--encoder-cache", action="store_true",
+                        help="keep the T5 output cache on (text_encode then "
+                             "only times misses; hits are in the report)")
+    parser.add_argument("--output", help="write the report as JSON")
+    parser.add_argument("--baseline", help="earlier JSON report to compare with")
+    args = parser.parse_args()
+
+    generator = load_generator(args.checkpoint, args.inference_mode,
+                               args.encoder_cache)
+
+    report = {
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "commit": git_commit(),
+        "model": generator.model_name,
+        "inference_mode": generator.inference_mode,
+        "torch": torch.__version__,
+        "cpu_count": os.cpu_count(),
+        "repeats": args.repeats,
+        "results": run_sweep(generator, args.durations, args.batch_sizes,
+                             args.threads, args.guidance_scales, args.repeats),
+        "encoder_cache": (
+            generator.encoder_cache.stats() if generator.encoder_cache else None
+        )
+    }
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            compare_to_baseline(report, json.load(f))
+
+
+if __name__ == "__main__":
+    main()
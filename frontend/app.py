@@ -13,12 +13,18 @@ if PROJECT_ROOT not in sys.path:
     sys.path.insert(0, PROJECT_ROOT)
 
 try:
-    from backend.main_service import generate_music_pipeline
+    from backend.main_service import (
+        generate_music_pipeline, output_history, start_output_retention
+    )
     BACKEND_AVAILABLE = True
 except Exception as e:
     BACKEND_AVAILABLE = False
     BACKEND_ERROR = str(e)
 
+# Audio is played from the API's /audio route, so the browser streams
+# and seeks the file itself instead of Streamlit re-sending its bytes
+API_URL = os.environ.get("MELODAI_API_URL", "http://localhost:8000").rstrip("/")
+
 # ==================================================
 # PAGE CONFIG
 # ==================================================
@@ -46,6 +52,10 @@ if "generation_prompt" not in st.session_state:
 if "generation_error" not in st.session_state:
     st.session_state.generation_error = None
 
+# Cursors of the history pages visited so far; the last one is shown
+if "history_cursors" not in st.session_state:
+    st.session_state.history_cursors = [None]
+
 # ==================================================
 # HEADER
 # ==================================================
@@ -59,23 +69,85 @@ st.divider()
 # ==================================================
 st.sidebar.header("🎛️ Generation Settings")
 
+tier = st.sidebar.selectbox(
+    "Quality Tier",
+    ["standard", "preview", "studio"],
+    help="preview: fast draft without guidance; studio: larger model, full cost"
+)
 duration = st.sidebar.slider("Duration (seconds)", 10, 120, 30)
 temperature = st.sidebar.slider("Creativity (Temperature)", 0.5, 1.5, 1.0)
 model = st.sidebar.selectbox(
     "Model",
-    ["musicgen-small", "musicgen-medium", "musicgen-large"]
+    [None, "musicgen-small", "musicgen-medium", "musicgen-large", "draft"],
+    format_func=lambda name: name or "Tier default",
+    help="draft: instant symbolic sketch with a MIDI export, no neural model"
+)
+use_catalog = st.sidebar.checkbox(
+    "Serve from catalog",
+    value=True,
+    help="Instantly return a close pre-rendered track when one exists "
+         "(default tier and model only)"
 )
 
 st.sidebar.divider()
 st.sidebar.subheader("⚙ Advanced Parameters")
 
+manual = st.sidebar.checkbox(
+    "Override tier settings",
+    help="Use the duration, creativity and sliders below instead of the "
+         "tier's settings and the duration found in the prompt"
+)
 top_k = st.sidebar.slider("Top-K", 10, 250, 50)
 top_p = st.sidebar.slider("Top-P", 0.10, 1.00, 0.90)
 cfg = st.sidebar.slider("CFG Coefficient", 1.00, 10.00, 3.00)
 
+overrides = {
+    "duration": duration,
+    "temperature": temperature,
+    "top_k": top_k,
+    "top_p": top_p,
+    "cfg_coef": cfg
+} if manual else None
+
 st.sidebar.divider()
 st.sidebar.subheader("🕘 Generation History")
-st.sidebar.info("History will be added in later tasks")
+
+HISTORY_PAGE_SIZE = 10
+
+if BACKEND_AVAILABLE:
+    try:
+        start_output_retention()
+        history = output_history(
+            limit=HISTORY_PAGE_SIZE,
+            before=st.session_state.history_cursors[-1]
+        )
+    except Exception as e:
+        history = None
+        st.sidebar.error(f"History unavailable: {e}")
+
+    if history and history["items"]:
+        for item in history["items"]:
+            created = time.strftime("%b %d %H:%M", time.localtime(item["created_at"]))
+            label = f"{item['mood']} · {item['duration']:g}s · {created}"
+            if st.sidebar.button(label, key=f"history_{item['id']}",
+                                 help=item["prompt"]):
+                st.session_state.current_audio = {
+                    "file": item["file"], "url": item["url"]
+                }
+                st.session_state.generation_params = item["params"]
+                st.session_state.generation_prompt = item["prompt"]
+
+        newer, older = st.sidebar.columns(2)
+        if len(st.session_state.history_cursors) > 1 and newer.button("⬅ Newer"):
+            st.session_state.history_cursors.pop()
+            st.rerun()
+        if history["next"] and older.button("Older ➡"):
+            st.session_state.history_cursors.append(history["next"])
+            st.rerun()
+    elif history is not None:
+        st.sidebar.info("No generations yet")
+else:
+    st.sidebar.info("History needs the backend")
 
 # ==================================================
 # MAIN INPUT INTERFACE
@@ -161,7 +233,16 @@ for i, ex in enumerate(examples):
 # ==================================================
 st.divider()
 
-if st.button("🎶 Generate Music", type="primary"):
+generate_col, cancel_col = st.columns([3, 1])
+generate_clicked = generate_col.button("🎶 Generate Music", type="primary")
+
+# A click reruns the script; Streamlit raises in the running script at its
+# next st call, which is the progress update made from inside
+# model.generate, so decoding stops within one progress interval
+if cancel_col.button("🛑 Cancel Generation"):
+    st.warning("Generation cancelled by user.")
+
+if generate_clicked:
     if not BACKEND_AVAILABLE:
         st.error("Backend is not available. Please check setup.")
     elif not user_input or len(user_input) < 10:
@@ -178,13 +259,22 @@ if st.button("🎶 Generate Music", type="primary"):
             status.info("🎼 Generating music...")
             progress.progress(60)
 
+            def on_progress(tokens, total):
+                progress.progress(60 + int(35 * tokens / total))
+
             with st.spinner("Creating your music..."):
-                result = generate_music_pipeline(user_input)
+                result = generate_music_pipeline(
+                    user_input, model=model, tier=tier, overrides=overrides,
+                    use_catalog=use_catalog, progress_callback=on_progress
+                )
 
             progress.progress(100)
-            status.success("✅ Music generated successfully!")
+            if result["audio"].get("catalog"):
+                status.success("✅ Served a matching track from the catalog!")
+            else:
+                status.success("✅ Music generated successfully!")
 
-            st.session_state.current_audio = result["audio"]["file"]
+            st.session_state.current_audio = result["audio"]
             st.session_state.generation_params = result["params"]
             st.session_state.generation_prompt = result["prompt"]
             st.session_state.generation_error = None
@@ -198,10 +288,19 @@ if st.button("🎶 Generate Music", type="primary"):
 # ==================================================
 st.subheader("🎧 Generated Output")
 
-audio_path = st.session_state.current_audio
+audio = st.session_state.current_audio
+
+if audio and os.path.exists(audio["file"]):
+    if audio.get("url"):
+        st.audio(API_URL + audio["url"])
+    else:
+        st.audio(audio["file"])
 
-if audio_path and os.path.exists(audio_path):
-    st.audio(audio_path)
+    if audio.get("midi") and os.path.exists(audio["midi"]):
+        with open(audio["midi"], "rb") as f:
+            st.download_button("⬇️ Download MIDI", f.read(),
+                               file_name=os.path.basename(audio["midi"]),
+                               mime="audio/midi")
 
     with st.expander("📄 Generation Details"):
         st.markdown("**Enhanced Prompt**")
@@ -227,10 +326,3 @@ if st.session_state.generation_error:
         st.session_state.user_input = "Calm piano music for studying"
         st.session_state.generation_error = None
         st.rerun()
-
-# ==================================================
-# STEP 7: CANCEL GENERATION (UX SAFE)
-# ==================================================
-if st.button("🛑 Cancel Generation"):
-    st.warning("Generation cancelled by user.")
-    st.stop()